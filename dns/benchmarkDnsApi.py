@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	benchmarkDnsApi.py - Offline benchmark & regression
+#   checks for manageGandiZone & manageDesecZone, run
+#   against the local mock API (mockDnsApi.py)
+#
+#   Every operation is measured for the requests it
+#   makes, wall time & peak (Python) memory at each
+#   account size, then compared against a saved baseline
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Baseline checks & results table shared with benchmarkWgEnroll (See nixkitBench.py)
+#
+#   - sizes: Account sizes (zones or rrsets) to run at
+#   - ops: Only run operations matching these names
+#   - baseline: Results file to compare against/save to
+#   - save: Store this run as the new baseline
+#
+#   Exits 1 if any operation regressed against the baseline
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+
+from datetime import datetime, timezone
+
+# In case for some reason requests isn't installed
+try:
+    import requests
+except ModuleNotFoundError:
+    sys.stderr.write("Error: Requests module not available (Run: pip3 install requests)\n")
+    sys.exit(100)
+
+# Shared benchmark helpers live at the top of the tree
+NIXKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NIXKIT_DIR not in sys.path:
+    sys.path.insert(1, NIXKIT_DIR)
+from nixkitBench import nixkitBenchmark
+
+from mockDnsApi import start_mock_process
+from zoneSnapshot import zoneSnapshotStore
+from manageDesecZone import manageDesecZone
+from manageGandiZone import manageGandiZone
+
+class benchmarkDnsApi(nixkitBenchmark):
+
+    # Presets
+    api_key = "benchmark"
+    bench_zone = "zone00000.example"
+    baseline_path = "~/.cache/nixkit/bench/dnsApi.json"
+    result_columns = (("Requests", "requests", 9), ("Wall (s)", "wall_s", 10), ("Peak (KiB)", "peak_kib", 12))
+    baseline_fields = (("requests", " req"), ("wall_s", "s"))
+
+    def __init__(self, sizes, op_filter=False, mock_opts=False, measure_memory=True):
+        self.sizes = sizes
+        self.mock_opts = mock_opts or {}
+        self.measure_memory = measure_memory
+        self.real_home = os.environ.get("HOME", "")
+
+        # name: (mock options for size n, setup, operation)
+        self.operations = {
+            "desec:list-zone": (lambda n: {"domains": n}, None, \
+                lambda: manageDesecZone("list-zone", None, self.api_key)),
+            "desec:list-record": (lambda n: {"domains": 1, "rrsets": n}, None, \
+                lambda: manageDesecZone("list-record", self.bench_zone, self.api_key)),
+            "desec:snapshot": (lambda n: {"domains": n}, None, \
+                lambda: manageDesecZone("snapshot", None, self.api_key)),
+            "desec:snapshot-incremental": (lambda n: {"domains": n}, \
+                lambda: manageDesecZone("snapshot", None, self.api_key), \
+                lambda: manageDesecZone("snapshot", None, self.api_key)),
+            "desec:add-record-template": (lambda n: {"domains": 1}, self.write_template, \
+                lambda: manageDesecZone("add-record", self.bench_zone, self.api_key, self.template_path)),
+            "gandi:list": (lambda n: {"domains": n}, None, \
+                lambda: manageGandiZone(self.api_key, "json").list_zone(None)),
+            "gandi:info": (lambda n: {"domains": n}, None, \
+                lambda: manageGandiZone(self.api_key, "json").query_zone_information(self.bench_zone)),
+            "gandi:query": (lambda n: {"domains": n}, None, \
+                lambda: manageGandiZone(self.api_key, "json").query_zone_availability("bench.example")),
+            "gandi:register-dry-run": (lambda n: {"domains": n}, self.write_owner_template, \
+                lambda: manageGandiZone(self.api_key, "json").register_zone("bench.example")),
+            "gandi:snapshot": (lambda n: {"domains": n}, None, \
+                lambda: manageGandiZone(self.api_key, "json").snapshot_zone(None)),
+        }
+        if op_filter:
+            self.operations = {op_name: op for op_name, op in self.operations.items() \
+                if any(re.search(op_re, op_name) for op_re in op_filter)}
+
+    def run(self):
+        results = {}
+        for size in self.sizes:
+            for op_name, (mock_conf, op_setup, op_run) in self.operations.items():
+                result_key = op_name + "@" + str(size)
+                sys.stderr.write("Running " + result_key + "\n")
+                self.template_size = size
+                results[result_key] = self.run_operation(dict(self.mock_opts, **mock_conf(size)), \
+                    op_setup, op_run)
+        return {"created": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(), \
+            "mock": self.mock_opts, "results": results}
+
+    # Each operation gets its own mock & scratch home so runs don't leak into each other
+    def run_operation(self, mock_conf, op_setup, op_run):
+        result = {"status": "ok"}
+        mock_proc, mock_url = start_mock_process(**mock_conf)
+        try:
+            self.point_clients_at(mock_url)
+            result["status"] = self.timed_pass(mock_url, op_setup, op_run, result)
+            if self.measure_memory and result["status"] == "ok":
+                result["peak_kib"] = self.memory_pass(op_setup, op_run)
+        finally:
+            mock_proc.terminate()
+            mock_proc.join()
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+            os.environ["HOME"] = self.real_home
+        return result
+
+    def timed_pass(self, mock_url, op_setup, op_run, result):
+        self.new_scratch()
+        status = self.call_quietly(op_setup)
+        if status != "ok":
+            return "setup " + status
+        requests.post(mock_url + "/__reset")
+
+        start_time = time.perf_counter()
+        status = self.call_quietly(op_run)
+        result["wall_s"] = round(time.perf_counter() - start_time, 4)
+
+        mock_stats = requests.get(mock_url + "/__stats").json()
+        result["requests"] = mock_stats["requests"]
+        result["throttled"] = mock_stats["throttled"]
+        result["bytes"] = mock_stats["bytes"]
+        return status
+
+    # Separate from the timed pass as tracemalloc slows everything it watches
+    def memory_pass(self, op_setup, op_run):
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        self.new_scratch()
+        self.call_quietly(op_setup)
+        return self.peak_memory(op_run)
+
+    @staticmethod
+    def point_clients_at(mock_url):
+        manageDesecZone.desec_endpoint = mock_url + "/api/v1"
+        manageGandiZone.gandiEndpoint = mock_url + "/v5"
+        os.environ["NIXKIT_RATELIMIT"] = "off"  # Limits are for the real APIs, not the mock
+
+    def new_scratch(self):
+        self.scratch_dir = tempfile.mkdtemp(prefix="nixkit-bench-")
+        os.environ["HOME"] = self.scratch_dir
+        zoneSnapshotStore.store_root = os.path.join(self.scratch_dir, "zones")
+        self.template_path = os.path.join(self.scratch_dir, "template.json")
+
+    def write_template(self):
+        with open(self.template_path, "w") as template_fh:
+            json.dump([{"subname": "bench%05d" % rr_idx, "type": "TXT", "ttl": 3600, \
+                "records": ["\"v=bench <<DOMAIN>>\""]} for rr_idx in range(self.template_size)], template_fh)
+
+    def write_owner_template(self):
+        os.makedirs(os.path.join(self.scratch_dir, ".config"))
+        with open(os.path.join(self.scratch_dir, ".config", "gandi_owner.conf"), "w") as owner_fh:
+            json.dump({"type": "individual", "country": "AU", "given": "Bench", "family": "Mark", \
+                "email": "bench@example.com", "streetaddr": "1 Bench St"}, owner_fh)
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    BDA_ARGV = argparse.ArgumentParser( \
+        description="Benchmark the DNS API tools against a local mock API")
+    BDA_ARGV.add_argument('--sizes', default="10,1000,10000", \
+        help='Comma separated account sizes (zones or rrsets)')
+    BDA_ARGV.add_argument('--ops', help='Comma separated patterns of operations to run')
+    BDA_ARGV.add_argument('--latency', type=float, default=0.0, help='Mock seconds added per request')
+    BDA_ARGV.add_argument('--throttle-every', type=int, default=0, \
+        help='Mock answers every Nth request with HTTP 429')
+    BDA_ARGV.add_argument('--retry-after', type=int, default=0, help='Retry-After sent with a 429')
+    BDA_ARGV.add_argument('--baseline', default=benchmarkDnsApi.baseline_path, \
+        help='Baseline results file')
+    BDA_ARGV.add_argument('--save', action="store_true", help='Save this run as the new baseline')
+    BDA_ARGV.add_argument('--no-memory', dest="memory", action="store_false", \
+        help='Skip the peak memory pass')
+    BDA_ARGV.add_argument('--json', '-j', dest="ofmt", action="store_const", const="json", \
+        help='Return results in JSON')
+
+    BDA_ARGV = BDA_ARGV.parse_args()
+    BDA_OBJ = benchmarkDnsApi([int(size) for size in BDA_ARGV.sizes.split(",")], \
+        BDA_ARGV.ops.split(",") if BDA_ARGV.ops else False, \
+        {"latency": BDA_ARGV.latency, "throttle_every": BDA_ARGV.throttle_every, \
+        "retry_after": BDA_ARGV.retry_after}, BDA_ARGV.memory)
+
+    BDA_BASELINE = BDA_OBJ.load_baseline(BDA_ARGV.baseline)
+
+    BDA_RESULTS = BDA_OBJ.run()
+    if BDA_ARGV.ofmt == "json":
+        print(json.dumps(BDA_RESULTS, indent=4))
+    else:
+        sys.stdout.write(BDA_OBJ.format_results(BDA_RESULTS, BDA_BASELINE))
+
+    BDA_REGRESSIONS = BDA_OBJ.compare(BDA_BASELINE, BDA_RESULTS)
+    for BDA_REGRESSION in BDA_REGRESSIONS:
+        sys.stderr.write("Regression :: " + BDA_REGRESSION + "\n")
+
+    if BDA_ARGV.save:
+        sys.stderr.write("Baseline saved to " + BDA_OBJ.save_baseline(BDA_ARGV.baseline, BDA_RESULTS) + "\n")
+
+    if BDA_REGRESSIONS:
+        sys.exit(1)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	dnsInventory.py - A local, indexed inventory of every
+#   domain across Gandi (Registrar & LiveDNS) and deSEC
+#   (Hosting), for questions about all of them at once
+#   without touching either API
+#
+#   Kept as an SQLite database that the 'snapshot' action
+#   of manageDesecZone & manageGandiZone fill in as they
+#   go - Only zones whose records changed are rewritten &
+#   only registrations Gandi reports as updated are
+#   fetched again
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.1
+#
+#	    1.0 - Initial
+#	    1.1 - Hostnames in record values stored & matched without
+#	          the trailing dot, in lower case
+#
+#   - action: domain | records | expiring | nameserver | stats
+#   - query: domain: the domain to describe
+#           records: the value to find (Exact, or a glob
+#               pattern with '*' - Hostnames match with or
+#               without the trailing dot)
+#           expiring: days ahead (Default: 30)
+#           nameserver: the nameserver to find domains on
+#   - type: Limit a records search to one record type
+#   - zone: Limit a records search to one zone
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+from datetime import datetime, timedelta, timezone
+from zoneSnapshot import zoneSnapshotStore
+
+class dnsInventory:
+
+    # Presets
+    db_path = "~/.cache/nixkit/dns-inventory.db"
+    schema_version = 2
+    date_format = "%Y-%m-%dT%H:%M:%SZ"  # Stored in UTC, so dates compare as text
+
+    # Record types whose value holds a hostname -> Which field of the value it is
+    host_fields = {"CNAME": 0, "NS": 0, "DNAME": 0, "PTR": 0, "MX": 1, "SRV": 3}
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS zones (fqdn TEXT NOT NULL, provider TEXT NOT NULL, touched TEXT, " \
+            "digest TEXT, rrsets INTEGER, refreshed INTEGER, PRIMARY KEY (fqdn, provider))",
+        "CREATE TABLE IF NOT EXISTS records (fqdn TEXT NOT NULL, provider TEXT NOT NULL, subname TEXT, " \
+            "type TEXT NOT NULL, ttl INTEGER, value TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS records_zone ON records (fqdn, provider)",
+        "CREATE INDEX IF NOT EXISTS records_type_value ON records (type, value)",
+        "CREATE INDEX IF NOT EXISTS records_value ON records (value)",
+        "CREATE TABLE IF NOT EXISTS registrations (fqdn TEXT PRIMARY KEY, registrar TEXT NOT NULL, " \
+            "status TEXT, expires TEXT, autorenew INTEGER, updated TEXT, refreshed INTEGER)",
+        "CREATE INDEX IF NOT EXISTS registrations_expires ON registrations (expires)",
+        # source: 'registrar' (Delegation) or the hosting provider (The zone's apex NS records)
+        "CREATE TABLE IF NOT EXISTS nameservers (fqdn TEXT NOT NULL, source TEXT NOT NULL, " \
+            "nameserver TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS nameservers_ns ON nameservers (nameserver)",
+        "CREATE INDEX IF NOT EXISTS nameservers_fqdn ON nameservers (fqdn, source)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    def __init__(self, db_path=False):
+        if db_path:
+            self.db_path = db_path
+        self.db_file = os.path.expanduser(self.db_path)
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self.db = sqlite3.connect(self.db_file)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            for statement in self.schema:
+                self.db.execute(statement)
+            self.db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', ?)", \
+                (self.schema_version,))
+            db_version = int(self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+            if db_version < 2:
+                # 1.0 stored hostnames as the provider returned them (Trailing dot & case)
+                self.db.executemany("UPDATE records SET value = ? WHERE rowid = ?", \
+                    [(self.normalize_value(record_row["type"], record_row["value"]), record_row["rowid"]) \
+                    for record_row in self.db.execute("SELECT rowid, type, value FROM records WHERE type IN (" + \
+                    ", ".join("?" * len(self.host_fields)) + ")", list(self.host_fields)).fetchall()])
+            if db_version < self.schema_version:
+                self.db.execute("UPDATE meta SET value = ? WHERE key = 'version'", (self.schema_version,))
+
+    def close(self):
+        self.db.close()
+
+    #   Hosted zones
+    # Providers without a change stamp (touched=False) always refresh - Their records
+    #   are only rewritten when the digest differs though
+    def needs_refresh(self, provider, fqdn, touched):
+        zone_row = self.db.execute("SELECT touched FROM zones WHERE fqdn = ? AND provider = ?", \
+            (fqdn, provider)).fetchone()
+        return not zone_row or not touched or zone_row["touched"] != touched
+
+    # Records a zone's rrsets (Any provider's shape, see zoneSnapshotStore.normalize_rrsets)
+    #   Returns True if its records changed
+    def save_zone(self, provider, fqdn, rrsets, touched=False):
+        rrsets = zoneSnapshotStore.normalize_rrsets(rrsets)
+        digest = zoneSnapshotStore.digest_rrsets(rrsets)
+        zone_row = self.db.execute("SELECT digest FROM zones WHERE fqdn = ? AND provider = ?", \
+            (fqdn, provider)).fetchone()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO zones (fqdn, provider, touched, digest, rrsets, refreshed) " \
+                "VALUES (?, ?, ?, ?, ?, ?)", (fqdn, provider, touched or "", digest, len(rrsets), int(time.time())))
+            if zone_row and zone_row["digest"] == digest:
+                return False
+            self.db.execute("DELETE FROM records WHERE fqdn = ? AND provider = ?", (fqdn, provider))
+            self.db.executemany("INSERT INTO records (fqdn, provider, subname, type, ttl, value) " \
+                "VALUES (?, ?, ?, ?, ?, ?)", [(fqdn, provider, subname, rtype, ttl, \
+                self.normalize_value(rtype, record)) for subname, rtype, ttl, records in rrsets for record in records])
+            self.db.execute("DELETE FROM nameservers WHERE fqdn = ? AND source = ?", (fqdn, provider))
+            self.db.executemany("INSERT INTO nameservers (fqdn, source, nameserver) VALUES (?, ?, ?)", \
+                [(fqdn, provider, self.normalize_host(record)) for subname, rtype, ttl, records in rrsets \
+                if rtype == "NS" and not subname for record in records])
+        return True
+
+    # Drops a provider's zones that are no longer listed upstream
+    def forget_zones(self, provider, live_zones):
+        stale_zones = [zone_row["fqdn"] for zone_row in \
+            self.db.execute("SELECT fqdn FROM zones WHERE provider = ?", (provider,)) \
+            if zone_row["fqdn"] not in live_zones]
+        with self.db:
+            for fqdn in stale_zones:
+                self.db.execute("DELETE FROM zones WHERE fqdn = ? AND provider = ?", (fqdn, provider))
+                self.db.execute("DELETE FROM records WHERE fqdn = ? AND provider = ?", (fqdn, provider))
+                self.db.execute("DELETE FROM nameservers WHERE fqdn = ? AND source = ?", (fqdn, provider))
+        return stale_zones
+
+    #   Registrations
+    # Compared with the registrar's 'updated' stamp - Only changed domains are re-fetched
+    def registration_stale(self, fqdn, updated):
+        reg_row = self.db.execute("SELECT updated FROM registrations WHERE fqdn = ?", (fqdn,)).fetchone()
+        return not reg_row or not updated or reg_row["updated"] != updated
+
+    def save_registration(self, fqdn, registrar, status, expires, autorenew, updated, nameservers=None):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO registrations (fqdn, registrar, status, expires, autorenew, " \
+                "updated, refreshed) VALUES (?, ?, ?, ?, ?, ?, ?)", (fqdn, registrar, ",".join(status or []), \
+                self.normalize_date(expires), None if autorenew is None else int(bool(autorenew)), \
+                updated or "", int(time.time())))
+            if nameservers is not None:
+                self.db.execute("DELETE FROM nameservers WHERE fqdn = ? AND source = 'registrar'", (fqdn,))
+                self.db.executemany("INSERT INTO nameservers (fqdn, source, nameserver) " \
+                    "VALUES (?, 'registrar', ?)", [(fqdn, self.normalize_host(ns)) for ns in nameservers])
+
+    def forget_registrations(self, registrar, live_domains):
+        stale_domains = [reg_row["fqdn"] for reg_row in \
+            self.db.execute("SELECT fqdn FROM registrations WHERE registrar = ?", (registrar,)) \
+            if reg_row["fqdn"] not in live_domains]
+        with self.db:
+            for fqdn in stale_domains:
+                self.db.execute("DELETE FROM registrations WHERE fqdn = ?", (fqdn,))
+                self.db.execute("DELETE FROM nameservers WHERE fqdn = ? AND source = 'registrar'", (fqdn,))
+        return stale_domains
+
+    #   Queries
+    # Where a domain is registered & hosted, its delegation & records
+    def domain(self, fqdn):
+        fqdn = self.normalize_host(fqdn)
+        reg_row = self.db.execute("SELECT * FROM registrations WHERE fqdn = ?", (fqdn,)).fetchone()
+        zone_rows = self.db.execute("SELECT provider, touched, rrsets, refreshed FROM zones WHERE fqdn = ? " \
+            "ORDER BY provider", (fqdn,)).fetchall()
+        if not reg_row and not zone_rows:
+            return None
+        nameservers = {}
+        for ns_row in self.db.execute("SELECT source, nameserver FROM nameservers WHERE fqdn = ? " \
+            "ORDER BY source, nameserver", (fqdn,)):
+            nameservers.setdefault(ns_row["source"], []).append(ns_row["nameserver"])
+        return {"fqdn": fqdn, "registration": dict(reg_row) if reg_row else None, \
+            "zones": [dict(zone_row) for zone_row in zone_rows], "nameservers": nameservers, \
+            "records": [dict(record_row) for record_row in self.db.execute("SELECT provider, subname, type, ttl, " \
+            "value FROM records WHERE fqdn = ? ORDER BY provider, subname, type, value", (fqdn,))]}
+
+    # Records by value (Exact, or a glob pattern with '*'/'?'), type and/or zone - Without
+    #   a type, a value is also tried as each kind of hostname value
+    def find_records(self, value=False, rr_type=False, fqdn=False):
+        conditions, params = [], []
+        if value:
+            if rr_type:
+                values = [self.normalize_value(rr_type.upper(), value)]
+            else:
+                values = sorted({value} | {self.normalize_value(rtype, value) for rtype in self.host_fields})
+            if any(char in value for char in "*?["):
+                conditions.append("(" + " OR ".join(["value GLOB ?"] * len(values)) + ")")
+            else:
+                conditions.append("value IN (" + ", ".join("?" * len(values)) + ")")
+            params.extend(values)
+        if rr_type:
+            conditions.append("type = ?")
+            params.append(rr_type.upper())
+        if fqdn:
+            conditions.append("fqdn = ?")
+            params.append(self.normalize_host(fqdn))
+        record_rows = self.db.execute("SELECT fqdn, provider, subname, type, ttl, value FROM records" + \
+            (" WHERE " + " AND ".join(conditions) if conditions else "") + \
+            " ORDER BY fqdn, provider, subname, type", params)
+        for record_row in record_rows:
+            yield dict(record_row)
+
+    # Registrations expiring within 'days' (Already expired included), soonest first
+    def expiring(self, days=30):
+        cutoff = (datetime.now(timezone.utc) + timedelta(days=days)).strftime(self.date_format)
+        for reg_row in self.db.execute("SELECT fqdn, registrar, expires, autorenew, status FROM registrations " \
+            "WHERE expires != '' AND expires <= ? ORDER BY expires", (cutoff,)):
+            yield dict(reg_row)
+
+    # Domains delegated to (Or whose zone lists) a nameserver
+    def by_nameserver(self, nameserver):
+        for ns_row in self.db.execute("SELECT fqdn, group_concat(source) AS sources FROM nameservers " \
+            "WHERE nameserver = ? GROUP BY fqdn ORDER BY fqdn", (self.normalize_host(nameserver),)):
+            yield {"fqdn": ns_row["fqdn"], "sources": ns_row["sources"].split(",")}
+
+    def stats(self):
+        return {
+            "registrations": self.db.execute("SELECT count(*) FROM registrations").fetchone()[0],
+            "zones": dict(self.db.execute("SELECT provider, count(*) FROM zones GROUP BY provider").fetchall()),
+            "records": self.db.execute("SELECT count(*) FROM records").fetchone()[0],
+            "refreshed": dict(self.db.execute("SELECT provider, datetime(max(refreshed), 'unixepoch') " \
+                "FROM zones GROUP BY provider").fetchall()),
+        }
+
+    # Utility functions
+    @staticmethod
+    def normalize_host(hostname):
+        return hostname.strip().lower().rstrip(".")
+
+    # The hostname within a record value (ie. '10 MX1.example.com.' -> '10 mx1.example.com')
+    #   '.' is kept as-is - A null MX or SRV target
+    @classmethod
+    def normalize_value(cls, rtype, value):
+        host_field = cls.host_fields.get(rtype)
+        if host_field is None:
+            return value
+        fields = value.split()
+        if len(fields) <= host_field or fields[host_field] == ".":
+            return value
+        fields[host_field] = cls.normalize_host(fields[host_field])
+        return " ".join(fields)
+
+    # Registrar dates (ie. 2030-01-01T00:00:00Z, 2030-01-01T00:00:00+02:00) as UTC text
+    @classmethod
+    def normalize_date(cls, date_text):
+        if not date_text:
+            return ""
+        try:
+            parsed = datetime.fromisoformat(date_text.replace("Z", "+00:00"))
+        except ValueError:
+            return date_text
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc).strftime(cls.date_format)
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    DNI_ARGV = argparse.ArgumentParser( \
+        description="Query the local DNS inventory (Filled by the 'snapshot' action of both DNS tools)")
+
+    DNI_ARGV.add_argument('action', help="Available actions: [domain | records | expiring | nameserver | stats]")
+    DNI_ARGV.add_argument('query', nargs='?', \
+        help="domain: the domain - records: a value or glob pattern - expiring: days ahead (Default: 30) " \
+            "- nameserver: the nameserver")
+    DNI_ARGV.add_argument('--type', dest="rr_type", help='Limit a records search to one record type')
+    DNI_ARGV.add_argument('--zone', help='Limit a records search to one zone')
+    DNI_ARGV.add_argument('--db', help='Inventory database (Default: ~/.cache/nixkit/dns-inventory.db)')
+    DNI_ARGV.add_argument('--json', '-j', help='Return results in JSON', dest="ofmt", \
+        action="store_const", const="json", default="text")
+    DNI_ARGV.add_argument('--ndjson', help='Stream results as NDJSON (One record per line)', dest="ofmt", \
+        action="store_const", const="ndjson")
+
+    DNI_ARGV = DNI_ARGV.parse_args()
+    try:
+        DNI_OBJ = dnsInventory(DNI_ARGV.db)
+    except (sqlite3.Error, EnvironmentError) as err:
+        sys.stderr.write("Unable to open the DNS inventory: " + str(err) + "\n")
+        sys.exit(2)
+
+    try:
+        if DNI_ARGV.action == "domain":
+            if not DNI_ARGV.query:
+                sys.stderr.write("Error: No domain provided\n")
+                sys.exit(1)
+            DNI_RESULT = DNI_OBJ.domain(DNI_ARGV.query)
+            if not DNI_RESULT:
+                sys.stderr.write("'" + DNI_ARGV.query + "' isn't in the inventory (Run: snapshot)\n")
+                sys.exit(1)
+            if DNI_ARGV.ofmt != "text":
+                sys.stdout.write(json.dumps(DNI_RESULT, indent=4 if DNI_ARGV.ofmt == "json" else None, \
+                    separators=None if DNI_ARGV.ofmt == "json" else (",", ":")) + "\n")
+            else:
+                DNI_REG = DNI_RESULT["registration"]
+                sys.stdout.write(DNI_RESULT["fqdn"] + "\n")
+                if DNI_REG:
+                    sys.stdout.write("\tRegistrar: " + DNI_REG["registrar"] + " :: Expires: " + \
+                        (DNI_REG["expires"] or "unknown") + " :: Auto-Renew: " + \
+                        {1: "Yes", 0: "No"}.get(DNI_REG["autorenew"], "unknown") + "\n")
+                else:
+                    sys.stdout.write("\tRegistrar: Not registered through Gandi\n")
+                for DNI_ZONE in DNI_RESULT["zones"]:
+                    sys.stdout.write("\tHosted: " + DNI_ZONE["provider"] + " :: " + str(DNI_ZONE["rrsets"]) + \
+                        " rrset(s) :: Refreshed: " + datetime.fromtimestamp(DNI_ZONE["refreshed"], \
+                        timezone.utc).strftime("%Y-%m-%d %H:%M UTC") + "\n")
+                for DNI_SOURCE, DNI_NS in DNI_RESULT["nameservers"].items():
+                    sys.stdout.write("\tNameservers (" + DNI_SOURCE + "): " + ", ".join(DNI_NS) + "\n")
+                for DNI_RECORD in DNI_RESULT["records"]:
+                    sys.stdout.write("\t\t" + (DNI_RECORD["subname"] or "@") + " " + str(DNI_RECORD["ttl"]) + " " + \
+                        DNI_RECORD["type"] + " " + DNI_RECORD["value"] + " (" + DNI_RECORD["provider"] + ")\n")
+            sys.exit(0)
+
+        if DNI_ARGV.action == "records":
+            if not (DNI_ARGV.query or DNI_ARGV.rr_type or DNI_ARGV.zone):
+                sys.stderr.write("Error: Give a value, --type and/or --zone\n")
+                sys.exit(1)
+            DNI_ROWS = DNI_OBJ.find_records(DNI_ARGV.query, DNI_ARGV.rr_type, DNI_ARGV.zone)
+            DNI_LINE = lambda row: row["fqdn"] + " :: " + (row["subname"] or "@") + " :: Type: " + row["type"] + \
+                " :: " + row["value"] + " (" + row["provider"] + ")"
+        elif DNI_ARGV.action == "expiring":
+            try:
+                DNI_ROWS = DNI_OBJ.expiring(int(DNI_ARGV.query or 30))
+            except ValueError:
+                sys.stderr.write("Error: Days must be a number\n")
+                sys.exit(1)
+            DNI_LINE = lambda row: row["fqdn"] + " :: Expires: " + row["expires"] + " :: Auto-Renew: " + \
+                {1: "Yes", 0: "No"}.get(row["autorenew"], "unknown")
+        elif DNI_ARGV.action == "nameserver":
+            if not DNI_ARGV.query:
+                sys.stderr.write("Error: No nameserver provided\n")
+                sys.exit(1)
+            DNI_ROWS = DNI_OBJ.by_nameserver(DNI_ARGV.query)
+            DNI_LINE = lambda row: row["fqdn"] + " :: " + ", ".join(row["sources"])
+        elif DNI_ARGV.action == "stats":
+            DNI_ROWS = [DNI_OBJ.stats()]
+            DNI_LINE = lambda row: "\n".join(key + ": " + json.dumps(value) for key, value in row.items())
+        else:
+            sys.stderr.write("Unknown action '" + DNI_ARGV.action + "'\n")
+            sys.exit(1)
+
+        # Rows are written as they come off the cursor
+        DNI_FOUND = 0
+        if DNI_ARGV.ofmt == "json":
+            DNI_ROWS = list(DNI_ROWS)
+            DNI_FOUND = len(DNI_ROWS)
+            sys.stdout.write(json.dumps(DNI_ROWS, indent=4) + "\n")
+        else:
+            for DNI_ROW in DNI_ROWS:
+                DNI_FOUND += 1
+                sys.stdout.write((DNI_LINE(DNI_ROW) if DNI_ARGV.ofmt == "text" else \
+                    json.dumps(DNI_ROW, separators=(",", ":"))) + "\n")
+        if not DNI_FOUND:
+            sys.stderr.write("Nothing found\n")
+            sys.exit(1)
+    except BrokenPipeError:
+        sys.exit(0)                 # Reader went away (ie. | head)
+    except sqlite3.Error as err:
+        sys.stderr.write("DNS inventory query failed: " + str(err) + "\n")
+        sys.exit(2)
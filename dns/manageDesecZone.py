@@ -9,13 +9,29 @@
 #	    Date: 03-Aug-2022        Version: 1.0
 #
 #	    1.0 - Migration + major refactor
+#	    1.1 - Local zone snapshots, diffs & BIND export
+#	    1.2 - Calls smoothed through the shared rate limiter
+#	    1.3 - Cursor pagination for large collections
+#	    1.4 - Failures raised as desecError (No exits outside the CLI),
+#	          optional shared HTTP session (See runJobs.py)
+#	    1.5 - Streaming NDJSON output, diagnostics on stderr with --json/--ndjson
+#	    1.6 - --profile timing of config, rate limiting, HTTP & rendering (See nixkitProfile.py)
+#	    1.7 - Snapshots also fill the cross-provider DNS inventory (See dnsInventory.py)
+#	    1.8 - Templates checked & compiled locally before any request, fixes the
+#	          <<DOMAIN>> substitution of add-record (See zoneTemplate.py)
 #
-#   - action: list | add-zone | del-zone | add-record | del-record
+#   - action: list-zone | add-zone | delete-zone | add-record
+#           | list-record | delete-record | snapshot
+#           | list-snapshot | diff-snapshot | export-bind | audit
 #           The action to be executed
 #   - zone: The zone to perform the action on
+#           (audit: the record value pattern to search for)
 #   - key: API key used to authenticate the action
 #   - template: A JSON file containing the record(s) to be
 #           added or removed from the zone
+#   - from/to: Snapshot IDs (or unique prefixes) to compare,
+#           'to' defaults to the live zone
+#   - type: Limit an audit to a single record type
 #
 #	Lint score: 7.55/10
 #
@@ -23,10 +39,23 @@
 
 # Standard libraries
 import os
+import re
 import sys
 import json
 import argparse
 
+# Shared instrumentation (--profile) lives at the top of the tree
+NIXKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NIXKIT_DIR not in sys.path:
+    sys.path.insert(1, NIXKIT_DIR)
+from nixkitProfile import profiler
+
+from urllib.parse import urlsplit, parse_qs
+from zoneSnapshot import zoneSnapshotStore
+from zoneTemplate import zoneTemplate, templateError
+from dnsInventory import dnsInventory
+from rateLimiter import tokenBucketLimiter
+
 # In case for some reason requests isn't installed
 try:
     import requests
@@ -34,6 +63,13 @@ except ModuleNotFoundError:
     sys.stderr.write("Error: Requests module not available (Run: pip3 install requests)\n")
     exit(100)
 
+# Raised in place of exiting, so the class can be used in-process
+#   - exit_code: What the CLI exits with
+class desecError(Exception):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
+
 class manageDesecZone:
 
     # Theme colors
@@ -47,14 +83,15 @@ class manageDesecZone:
     date_format = ""
     desec_endpoint = "https://desec.io/api/v1"
     api_headers = {"Content-Type": "application/json"}
-    template_token = "<<DOMAIN>>"
+    max_retries = 3                     # Retries after an HTTP 429 (Throttled)
     api_params = {}
     api_body = {}
 
     # Actions
+    local_actions = ("list-snapshot", "export-bind", "audit")
 
-
-    def __init__(self, action, dns_zone, api_key=False, json_template=False, output=False):
+    def __init__(self, action, dns_zone, api_key=False, json_template=False, output=False, \
+        snap_from=False, snap_to=False, rr_type=False, http_session=False):
 
         valid_actions = {
             "add-zone": self.add_zone,
@@ -62,173 +99,395 @@ class manageDesecZone:
             "delete-zone": self.delete_zone,
             "add-record": self.add_record,
             "list-record": self.list_record,
-            "delete-record": self.delete_record
+            "delete-record": self.delete_record,
+            "snapshot": self.snapshot_zone,
+            "list-snapshot": self.list_snapshot,
+            "diff-snapshot": self.diff_snapshot,
+            "export-bind": self.export_bind,
+            "audit": self.audit_records
         }
 
+        # Per-instance request state (Class-level dicts are shared between instances)
+        self.api_headers = dict(self.api_headers)
+        self.api_body = {}
+
+        # Keeps connections (And their TLS sessions) open between calls - Can be shared
+        #   by many instances in one process
+        self.http_session = http_session or requests.Session()
+
+        # Shared with every other deSEC process on this host
+        self.rate_limiter = tokenBucketLimiter("desec")
+
+        # Snapshot options
+        self.snap_from = snap_from
+        self.snap_to = snap_to
+        self.rr_type = rr_type
+
         if output:
             self.output_type = output
-        print("Outputting results as " + self.output_type)
+        self.print_status("Outputting results as " + self.output_type)
 
-        # Find & set API key
+        # Find & set API key (Snapshot reads are answered locally & don't need one)
         if not api_key:
             api_key=self.find_api_token()
-            if not api_key:
-                print("No API key set or found - Exiting")
-                exit()
-        print("API key set as" + api_key)
-        self.api_headers["Authorization"]="token " + api_key
-
-        try:
-            if "list-record" == action:
-                if not valid_actions[action](dns_zone):
-                    print("Operation failed")
-            elif "add-record" == action or "delete-record" == action:
-                if not json_template:
-                    print("No template file provided")
-                if not valid_actions[action](dns_zone, json_template):
-                    print("Operation failed")
-            elif "list-zone" == action:
-                if not valid_actions[action]():
-                    print("Operation failed")
-            else:
-                if not valid_actions[action](dns_zone):
-                    print("Operation failed")
-        except KeyError:
-            sys.stderr.write("Unknown action '" + action + "'\n")
-            sys.exit(1)
+            if not api_key and action not in self.local_actions:
+                raise desecError("No API key set or found", 2)
+        if api_key:
+            self.print_status("API key set")
+            self.api_headers["Authorization"]="token " + api_key
+
+        if action not in valid_actions:
+            raise desecError("Unknown action '" + action + "'")
+
+        # Result of the action (Falsy if it failed)
+        if "add-record" == action or "delete-record" == action:
+            if not json_template:
+                self.print_status("No template file provided")
+            self.result = valid_actions[action](dns_zone, json_template)
+        elif "list-zone" == action:
+            self.result = valid_actions[action]()
+        else:
+            self.result = valid_actions[action](dns_zone)
+        if not self.result:
+            self.print_status("Operation failed")
 
     #   Zone functions
     def add_zone(self, zone):
-        self.desec_endpoint+="/domains/"
         self.api_body['name'] = zone
 
-        print("Adding new zone " + zone)
+        self.print_status("Adding new zone " + zone)
 
-        req_add_zone = requests.post(self.desec_endpoint, \
-        headers=self.api_headers, data=json.dumps(self.api_body))
+        req_add_zone = self.api_call("POST", "/domains/", "domain", json.dumps(self.api_body))
 
         if self.validate_response(req_add_zone, 201, "adding zone " + zone):
             return 1
 
     def list_zone(self):
-        self.desec_endpoint+="/domains/"
-        print("Listing available zones ")
+        self.print_status("Listing available zones ")
+        if self.output_type == "ndjson":
+            return self.stream_all("/domains/", "listing zones")
 
-        req_list_zone = requests.get(self.desec_endpoint, headers=self.api_headers)
+        req_list_zone, zones = self.api_get_all("/domains/")
 
         if not self.validate_response(req_list_zone, 200, "listing zones"):
             return 0
 
-        if self.output_type == "text":
-            for resp_zone in req_list_zone.json():
-                sys.stdout.write(
-                    resp_zone["name"] + " :: TTL: " + str(resp_zone["minimum_ttl"]) +
-                    " :: Created: " + resp_zone["created"] + " :: Updated: " +
-                    resp_zone["touched"] + "\n")
-        else:
-            print(json.dumps(req_list_zone.json(), indent=4))
+        with profiler.span("render", "zones", records=len(zones)):
+            if self.output_type == "text":
+                for resp_zone in zones:
+                    sys.stdout.write(
+                        resp_zone["name"] + " :: TTL: " + str(resp_zone["minimum_ttl"]) +
+                        " :: Created: " + resp_zone["created"] + " :: Updated: " +
+                        resp_zone["touched"] + "\n")
+            else:
+                print(json.dumps(zones, indent=4))
 
         return 1
 
     def delete_zone(self, zone):
-        self.desec_endpoint+="/domains/"+zone
-        print("Deleting zone " + zone)
+        self.print_status("Deleting zone " + zone)
 
-        req_del_zone = requests.delete(self.desec_endpoint, headers=self.api_headers)
+        req_del_zone = self.api_call("DELETE", "/domains/" + zone + "/", "domain")
 
         if self.validate_response(req_del_zone, 204, "removed zone " + zone):
             return 1
 
     #   Resource-record functions
     def add_record(self, zone, template_file):
-        self.desec_endpoint+="/domains/"+zone+"/rrsets/"
-        records = self.open_template_file(template_file)
+        records = self.open_template_file(template_file, zone)
         if not records:
-            print("No valid record data provided")
+            self.print_status("No valid record data provided")
             return 0
 
-        for rr in records:
-            rr['records'].replace(self.template_token, zone)
-
-        req_add_rrs = requests.post(self.desec_endpoint, headers=self.api_headers, \
-            data=json.dumps(records))
+        req_add_rrs = self.api_call("POST", "/domains/" + zone + "/rrsets/", "write", \
+            json.dumps(records))
 
         if self.validate_response(req_add_rrs, 201, "added records for " + zone):
             return 1
 
     # TODO Add filter support
     def list_record(self, zone):
-        self.desec_endpoint+="/domains/"+zone+"/rrsets/"
+        if self.output_type == "ndjson":
+            return self.stream_all("/domains/" + zone + "/rrsets/", "list records of " + zone)
 
-        req_list_rrs = requests.get(self.desec_endpoint, headers=self.api_headers)
+        req_list_rrs, rrsets = self.api_get_all("/domains/" + zone + "/rrsets/")
 
         if not self.validate_response(req_list_rrs, 200, "list records of " + zone):
             return 0
 
-        if self.output_type == "text":
-            for rr in req_list_rrs.json():
-                sys.stdout.write(
-                    rr["name"] + " :: Type: " + rr["type"] + " :: TTL: " + str(rr["ttl"]) + \
-                        "\nDates:\n\tCreated: " + rr["created"] + "\n\tUpdated: " \
-                        + rr["touched"] + "\nValues:\n")
-                for record in rr["records"]:
-                    sys.stdout.write("\t" + record + "\n")
-        else:
-            print(json.dumps(req_list_rrs.json(), indent=4))
+        with profiler.span("render", "rrsets", records=len(rrsets)):
+            if self.output_type == "text":
+                for rr in rrsets:
+                    sys.stdout.write(
+                        rr["name"] + " :: Type: " + rr["type"] + " :: TTL: " + str(rr["ttl"]) + \
+                            "\nDates:\n\tCreated: " + rr["created"] + "\n\tUpdated: " \
+                            + rr["touched"] + "\nValues:\n")
+                    for record in rr["records"]:
+                        sys.stdout.write("\t" + record + "\n")
+            else:
+                print(json.dumps(rrsets, indent=4))
 
         return 1
 
     def delete_record(self, zone, template_file):
-        self.desec_endpoint+="/domains/"+zone+"/rrsets/"
-        records = self.open_template_file(template_file)
+        # Emptied rrsets are removed
+        records = self.open_template_file(template_file, zone, with_records=False)
         if not records:
-            print("No valid record data provided")
+            self.print_status("No valid record data provided")
             return 0
 
-        for resource_record in records:
-            resource_record["records"]=[]
-
-        req_del_rrs = requests.patch(self.desec_endpoint, headers=self.api_headers, \
-            data=json.dumps(records))
+        req_del_rrs = self.api_call("PATCH", "/domains/" + zone + "/rrsets/", "write", \
+            json.dumps(records))
 
         if self.validate_response(req_del_rrs, 200, "delete records of " + zone):
             return 1
 
+    #   Snapshot functions
+    # Refreshes local snapshots - Only zones deSEC reports as 'touched' since
+    #   the last run have their rrsets fetched
+    def snapshot_zone(self, zone):
+        store = zoneSnapshotStore("desec")
+
+        req_list_zone, zones = self.api_get_all("/domains/")
+        if not self.validate_response(req_list_zone, 200, "listing zones"):
+            return 0
+        live_zones = {resp_zone["name"]: resp_zone["touched"] for resp_zone in zones}
+
+        if zone:
+            if zone not in live_zones:
+                sys.stderr.write("Zone '" + zone + "' not found in account\n")
+                return 0
+            live_zones = {zone: live_zones[zone]}
+
+        inventory = dnsInventory()
+        try:
+            if not zone:
+                # Zones removed upstream are dropped from the local store & inventory
+                for stale_zone in set(store.zones()) - live_zones.keys():
+                    self.print_status("Forgetting removed zone " + stale_zone)
+                    store.forget_zone(stale_zone)
+                inventory.forget_zones("desec", live_zones)
+
+            refreshed = 0
+            for snap_zone, touched in sorted(live_zones.items()):
+                if not store.needs_refresh(snap_zone, touched):
+                    # Unchanged upstream - The inventory only needs filling in from the last snapshot
+                    if inventory.needs_refresh("desec", snap_zone, touched):
+                        rrsets = store.load_snapshot(snap_zone)
+                        if rrsets is not None:
+                            inventory.save_zone("desec", snap_zone, rrsets, touched)
+                    continue
+                req_list_rrs, rrsets = self.api_get_all("/domains/" + snap_zone + "/rrsets/")
+                if not self.validate_response(req_list_rrs, 200, "list records of " + snap_zone):
+                    continue
+                snap_id = store.save_snapshot(snap_zone, rrsets, touched)
+                inventory.save_zone("desec", snap_zone, rrsets, touched)
+                refreshed += 1
+                if snap_id:
+                    self.print_status("Snapshot " + snap_id + " saved for " + snap_zone)
+        finally:
+            store.save_index()
+            inventory.close()
+
+        self.print_status("Refreshed " + str(refreshed) + " of " + str(len(live_zones)) + " zone(s)")
+        return 1
+
+    def list_snapshot(self, zone):
+        store = zoneSnapshotStore("desec")
+        if not zone:
+            snap_zones = store.zones()
+        else:
+            snap_zones = [zone]
+
+        if self.output_type == "text":
+            for snap_zone in snap_zones:
+                sys.stdout.write(snap_zone + " :: Touched: " + \
+                    store.zone_state(snap_zone).get("touched", "never") + "\n")
+                for snap_id in store.list_snapshots(snap_zone):
+                    sys.stdout.write("\t" + snap_id + "\n")
+        elif self.output_type == "ndjson":
+            self.write_ndjson({"zone": snap_zone, "snapshots": store.list_snapshots(snap_zone)} \
+                for snap_zone in snap_zones)
+        else:
+            print(json.dumps({snap_zone: store.list_snapshots(snap_zone) \
+                for snap_zone in snap_zones}, indent=4))
+        return 1
+
+    # Compares two snapshots, or a snapshot against the live zone
+    def diff_snapshot(self, zone):
+        if not zone:
+            self.print_status("No zone provided")
+            return 0
+        store = zoneSnapshotStore("desec")
+        old_rrsets = store.load_snapshot(zone, self.snap_from)
+        if old_rrsets is None:
+            sys.stderr.write("No snapshot found for " + zone + "\n")
+            return 0
+
+        if self.snap_to:
+            new_rrsets = store.load_snapshot(zone, self.snap_to)
+            if new_rrsets is None:
+                sys.stderr.write("Snapshot '" + self.snap_to + "' not found for " + zone + "\n")
+                return 0
+        else:
+            req_list_rrs, new_rrsets = self.api_get_all("/domains/" + zone + "/rrsets/")
+            if not self.validate_response(req_list_rrs, 200, "list records of " + zone):
+                return 0
+
+        changes = store.diff_rrsets(old_rrsets, new_rrsets)
+        with profiler.span("render", "diff"):
+            if self.output_type == "text":
+                sys.stdout.write(store.format_diff(zone, changes))
+            elif self.output_type == "ndjson":
+                self.write_ndjson(store.diff_records(changes))
+            else:
+                print(json.dumps(changes, indent=4))
+        return 1
+
+    def export_bind(self, zone):
+        if not zone:
+            self.print_status("No zone provided")
+            return 0
+        store = zoneSnapshotStore("desec")
+        rrsets = store.load_snapshot(zone, self.snap_from)
+        if rrsets is None:
+            sys.stderr.write("No snapshot found for " + zone + " (Run: snapshot " + zone + ")\n")
+            return 0
+        with profiler.span("render", "bind", records=len(rrsets)):
+            sys.stdout.write(store.export_bind(zone, rrsets))
+        return 1
+
+    # Searches the latest snapshot of every zone, no API calls are made
+    def audit_records(self, pattern):
+        if not pattern:
+            self.print_status("No search pattern provided")
+            return 0
+        try:
+            matches = zoneSnapshotStore("desec").search(pattern, self.rr_type)
+        except re.error as err:
+            raise desecError("Invalid search pattern '" + pattern + "' (" + str(err) + ")")
+
+        if self.output_type == "text":
+            for zone, subname, rtype, record in matches:
+                sys.stdout.write(zone + " :: " + (subname or "@") + " :: Type: " + \
+                    rtype + " :: " + record + "\n")
+        elif self.output_type == "ndjson":
+            self.write_ndjson({"zone": zone, "subname": subname, "type": rtype, "record": record} \
+                for zone, subname, rtype, record in matches)
+        else:
+            print(json.dumps([{"zone": zone, "subname": subname, "type": rtype, "record": record} \
+                for zone, subname, rtype, record in matches], indent=4))
+        return 1
+
     # Utility functions
+    # Every API request goes through here so it is paced by the shared limiter
+    #   - rate_class: read | write | domain (See rateLimiter.bucket_limits)
+    def api_call(self, method, api_path, rate_class="read", api_data=None, api_params=None):
+        for attempt in range(self.max_retries + 1):
+            with profiler.span("ratelimit", rate_class):
+                self.rate_limiter.acquire(rate_class)
+            api_resp = self.http_session.request(method, self.desec_endpoint + api_path, \
+                headers=self.api_headers, data=api_data, params=api_params)
+            if api_resp.status_code != 429 or attempt == self.max_retries:
+                return api_resp
+
+            # Throttled - Make every process on the host back off, not just this one
+            retry_after = self.parse_retry_after(api_resp)
+            sys.stderr.write("Throttled by deSEC - Retrying in " + str(retry_after) + "s\n")
+            self.rate_limiter.penalize(rate_class, retry_after)
+        return api_resp
+
+    # Collections past deSEC's pagination threshold are returned in pages, each
+    #   pointing to the next through a cursor in the 'Link' header
+    #   Returns the last response & every item (None if any page failed)
+    def api_get_all(self, api_path):
+        items = []
+        for api_resp, page_items in self.api_pages(api_path):
+            if page_items is None:
+                return api_resp, None
+            items.extend(page_items)
+        return api_resp, items
+
+    # Yields (response, items) for each page as it arrives - Items are None for a
+    #   failed page, which is always the last
+    def api_pages(self, api_path):
+        cursor = ""
+        while cursor is not None:
+            api_resp = self.api_call("GET", api_path, api_params={"cursor": cursor})
+            if api_resp.status_code != 200:
+                yield api_resp, None
+                return
+            yield api_resp, api_resp.json()
+
+            cursor = None
+            if "next" in api_resp.links:
+                cursor = parse_qs(urlsplit(api_resp.links["next"]["url"]).query).get("cursor", [None])[0]
+
+    # Each page is written out as it arrives, rather than once the last is in
+    def stream_all(self, api_path, action_verb):
+        for api_resp, page_items in self.api_pages(api_path):
+            if page_items is None:
+                break
+            self.write_ndjson(page_items)
+        return self.validate_response(api_resp, 200, action_verb)
+
+    # One compact record per line, flushed so readers can start on them straight away
+    @staticmethod
+    def write_ndjson(records):
+        with profiler.span("render", "ndjson"):
+            sys.stdout.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+            sys.stdout.flush()
+
+    # Status & diagnostics - Kept off stdout while it carries JSON/NDJSON
+    def print_status(self, msg):
+        (sys.stdout if self.output_type == "text" else sys.stderr).write(msg + "\n")
+
+    @staticmethod
+    def parse_retry_after(api_resp):
+        try:
+            return max(0.0, float(api_resp.headers.get("Retry-After", 1)))
+        except ValueError:
+            return 1.0
+
     def find_api_token(self):
         dsDirs=["~/.secrets/","~/.api/","~/"]        # Common directories
         dsfnames=["desec","desec.key","desec.api"]   # DeSEC filenames
         found_path=""
 
-        for filename in dsfnames:
-            for directory in dsDirs:
-                if os.path.exists(os.path.expanduser(directory+filename)):
-                    found_path=os.path.expanduser(directory+filename)
+        with profiler.span("config", "api key"):
+            for filename in dsfnames:
+                for directory in dsDirs:
+                    if os.path.exists(os.path.expanduser(directory+filename)):
+                        found_path=os.path.expanduser(directory+filename)
 
-        if not found_path:
-            return ""
-        else:
-            print("Found DeSEC API key in path: " + found_path)
-            with open(found_path,"r") as api_file:
-                return api_file.read()[:-1]     # Need to remove the final file newline
-
-    def open_template_file(self, json_file_path):
+            if not found_path:
+                return ""
+            else:
+                self.print_status("Found DeSEC API key in path: " + found_path)
+                with open(found_path,"r") as api_file:
+                    return api_file.read()[:-1]     # Need to remove the final file newline
+
+    # Templates are checked before anything is sent - A bad one raises desecError
+    def open_template_file(self, json_file_path, zone, with_records=True):
+        if not json_file_path:
+            return None
+        if not zone:
+            raise desecError("No zone provided")
         try:
-            with open(json_file_path, "r") as template_fh:
-                template_json = json.load(template_fh)
-            return template_json
-        except EnvironmentError:
-            print("Unable to open '" + json_file_path + "' file path")
+            with profiler.span("config", "template"):
+                return zoneTemplate.load(json_file_path).expand(zone, with_records)
+        except templateError as err:
+            raise desecError(str(err))
 
     def validate_response(self, api_resp, good_code, action_verb):
         if api_resp.status_code == good_code:
-            print("API call for " + action_verb + " completed successfully")
+            self.print_status("API call for " + action_verb + " completed successfully")
             return 1
         else:
             sys.stderr.write(
                 "API call for " + action_verb + " with failed code " +
                 str(api_resp.status_code) + ".\n")
-            sys.stdout.write(json.dumps(api_resp.json(), indent=4) + "\n")
+            self.print_status(json.dumps(api_resp.json(), indent=4))
             return 0
 
 # Below is CLI only - Check namespace to confirm whether running standalone
@@ -243,7 +502,22 @@ if __name__ == "__main__":
     MDZ_ARGV.add_argument('--template', '-t', help='JSON template of DNS records to action')
     MDZ_ARGV.add_argument('--json', '-j', help='Return results in JSON', dest="ofmt", \
         action="store_const", const="json")
+    MDZ_ARGV.add_argument('--ndjson', help='Stream results as NDJSON (One record per line)', dest="ofmt", \
+        action="store_const", const="ndjson")
+    MDZ_ARGV.add_argument('--from', dest="snap_from", \
+        help='Snapshot ID to diff or export from (Default: latest)')
+    MDZ_ARGV.add_argument('--to', dest="snap_to", \
+        help='Snapshot ID to diff against (Default: live zone)')
+    MDZ_ARGV.add_argument('--type', dest="rr_type", help='Limit an audit to one record type')
+    profiler.add_arguments(MDZ_ARGV)
 
     MDZ_ARGV = MDZ_ARGV.parse_args()
-    MDZ_OBJ = manageDesecZone(MDZ_ARGV.action, MDZ_ARGV.zone, MDZ_ARGV.key, \
-        MDZ_ARGV.template, MDZ_ARGV.ofmt)
\ No newline at end of file
+    profiler.from_args(MDZ_ARGV, "manageDesecZone")
+    try:
+        MDZ_OBJ = manageDesecZone(MDZ_ARGV.action, MDZ_ARGV.zone, MDZ_ARGV.key, \
+            MDZ_ARGV.template, MDZ_ARGV.ofmt, MDZ_ARGV.snap_from, MDZ_ARGV.snap_to, MDZ_ARGV.rr_type)
+    except desecError as err:
+        sys.stderr.write(str(err) + "\n")
+        sys.exit(err.exit_code)
+    except BrokenPipeError:
+        sys.exit(0)                 # Reader went away (ie. | head)
\ No newline at end of file
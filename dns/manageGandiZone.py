@@ -11,12 +11,29 @@
 #	    Date: 10-Jan-2023        Version: 1.0
 #
 #	    1.0 - Migration + major refactor
+#	    1.1 - LiveDNS zone snapshots, diffs & BIND export
+#	    1.2 - Calls smoothed through the shared rate limiter
+#	    1.3 - Page through large collections
+#	    1.4 - Failures raised as gandiError (No exits outside the CLI),
+#	          optional shared HTTP session (See runJobs.py)
+#	    1.5 - Streaming NDJSON output, diagnostics on stderr with --json/--ndjson
+#	    1.6 - --profile timing of config, rate limiting, HTTP & rendering (See nixkitProfile.py)
+#	    1.7 - Bulk registration :: Parallel dry-runs, one confirmation, paced & journalled
+#	          commits (See registrationJournal.py)
+#	    1.8 - Snapshots also fill the cross-provider DNS inventory with LiveDNS records &
+#	          registrations (See dnsInventory.py)
 #
-#   - action: list | query | register
+#   - action: list | info | query | register | snapshot
+#       | list-snapshot | diff-snapshot | export-bind | audit
 #       The action to be executed
 #   - zone: The zone to peform the action on
+#       (audit: the record value pattern to search for)
 #   - key: Explicit API-key reference
 #       (Tool will auto-search for gandi.key in ~/)
+#   - batch: File of domains to register (One per line)
+#   - yes: Register without asking (After the dry-run)
+#   - dry_run: Only dry-run the registrations
+#   - rate: Registrations per minute
 #
 #	Lint score: 7.92/10
 #
@@ -24,12 +41,38 @@
 
 # Standard libraries
 import os
+import re
 import sys
 import json
+import time
 import argparse
-import requests
+
+# Shared instrumentation (--profile) lives at the top of the tree
+NIXKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NIXKIT_DIR not in sys.path:
+    sys.path.insert(1, NIXKIT_DIR)
+from nixkitProfile import profiler
+
+# In case for some reason requests isn't installed
+try:
+    import requests
+except ModuleNotFoundError:
+    sys.stderr.write("Error: Requests module not available (Run: pip3 install requests)\n")
+    exit(100)
 
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from zoneSnapshot import zoneSnapshotStore
+from dnsInventory import dnsInventory
+from rateLimiter import tokenBucketLimiter
+from registrationJournal import registrationJournal
+
+# Raised in place of exiting, so the class can be used in-process
+#   - exit_code: What the CLI exits with
+class gandiError(Exception):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
 
 class manageGandiZone:
 
@@ -59,88 +102,157 @@ class manageGandiZone:
     api_method = "GET"
     api_params = {}
     api_body = {}
-
-    def __init__(self, api_key, output, debug=False):
+    max_retries = 3                     # Retries after an HTTP 429 (Throttled)
+    page_size = 100                     # Items requested per page of a collection
+
+    # Registration
+    owner_fields = ("type", "country", "given", "family", "email", "streetaddr")
+    owner_paths = ("~/gandi_owner.conf", "~/.config/gandi_owner.conf")
+    register_workers = 8                # Dry-runs in flight at once
+    register_rate = 10                  # Real registrations per minute
+    register_duration = 1               # Years
+    register_states = ("registered", "ready", "skipped", "pending", "unavailable", "invalid", "failed")
+    confirm_prompt = True               # Ask on a terminal before registering (runJobs.py turns it off per instance)
+    valid_fqdn = re.compile(r"^(?=.{4,253}$)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9-]{2,63}$")
+
+    def __init__(self, api_key, output, debug=False, snap_from=False, snap_to=False, rr_type=False, \
+        http_session=False, batch_file=False, assume_yes=False, dry_run=False, register_rate=False):
 
         if debug:
             self.debug_mode = True
+        if output:
+            self.output_type = output
+
+        # Per-instance request state (Class-level dicts are shared between instances)
+        self.api_headers = dict(self.api_headers)
+        self.api_params = {}
+        self.api_body = {}
+
+        # Keeps connections (And their TLS sessions) open between calls - Can be shared
+        #   by many instances in one process
+        self.http_session = http_session or requests.Session()
+
+        # Shared with every other Gandi process on this host
+        self.rate_limiter = tokenBucketLimiter("gandi")
+
+        # Snapshot options
+        self.snap_from = snap_from
+        self.snap_to = snap_to
+        self.rr_type = rr_type
+
+        # Registration options
+        self.batch_file = batch_file
+        self.assume_yes = assume_yes
+        self.dry_run = dry_run
+        if register_rate is not False and register_rate is not None:
+            if not 0 < register_rate < float("inf"):
+                raise gandiError("Registration rate must be above 0 per minute (Got " + str(register_rate) + ")", 2)
+            self.register_rate = register_rate
+        self.owner_conf = None
 
         # Find & set API key
         if not api_key:
             api_key=self.find_api_token()
             if not api_key:
-                print("No API key set or found - Exiting")
-                sys.exit(2)
+                raise gandiError("No API key set or found", 2)
         self.print_debug("API key set as" + api_key)
         self.api_headers["Authorization"]="Apikey " + api_key
 
-        if output:
-            self.output_type = output
+    # Runs one of the CLI actions - Returns its result (Falsy if it failed)
+    def run_action(self, action, dns_zone=None):
+        valid_actions = {
+            "list": self.list_zone,              # 'zone' will be passed empty through here
+            "info": self.query_zone_information,
+            "query": self.query_zone_availability,
+            "register": self.register_zone,
+            "snapshot": self.snapshot_zone,
+            "list-snapshot": self.list_snapshot,
+            "diff-snapshot": self.diff_snapshot,
+            "export-bind": self.export_bind,
+            "audit": self.audit_records
+        }
+        if action not in valid_actions:
+            raise gandiError("Unknown action '" + action + "'")
+        action_result = valid_actions[action](dns_zone)
+        if not action_result:
+            self.print_status("Operation failed")
+        return action_result
 
     # Actionable functions
     def list_zone(self, dns_zone):
-        self.gandiEndpoint+="/domain/domains"
         if not dns_zone:
             self.print_debug("No zone selected - Displaying all owned zones")
         else:
             self.print_debug("Filtering results based on pattern " + dns_zone)
             self.api_params["fqdn"]=dns_zone
-        gandi_reply = requests.request(self.api_method, self.gandiEndpoint, \
-            headers=self.api_headers, params=self.api_params)
-        if self.output_type == "text":
-            # Status information
-            print(gandi_reply.json())
-            for zone in gandi_reply.json():
-                # Display zone status icon
-                self.show_status_icon(zone['status'])
-                # Basic information
-                sys.stdout.write(self.cdn + zone['fqdn'] + self.rst + " :: " + zone['owner'])
-                sys.stdout.write(" - Created: " + self.cdt + zone['dates']['created_at'] + self.rst)
-                # Expiry
-                sys.stdout.write(" - Expires: ")
-                self.format_datetime_expiry(zone['dates']['registry_ends_at'])
-                # Tags
-                if zone['tags']:
-                    sys.stdout.write(" :: [" + self.ctg)
-                    for tag in zone['tags']:
-                        sys.stdout.write(tag + " ")
-                    sys.stdout.write("\b" + self.rst +"]")
-                sys.stdout.write("\n")
-        elif self.output_type == "json":
-            print(json.dumps(gandi_reply.json(), indent=4))
+        if self.output_type == "ndjson":
+            return self.stream_all("/domain/domains", self.api_params, "list zones")
+        gandi_reply, zones = self.api_get_all("/domain/domains", self.api_params)
+        if zones is None:
+            self.print_status("Unable to list zones (HTTP Status: " + str(gandi_reply.status_code) + ")")
+            return 0
+        with profiler.span("render", "zones", records=len(zones)):
+            if self.output_type == "text":
+                # Status information
+                self.print_debug(str(len(zones)) + " zone(s) returned")
+                for zone in zones:
+                    # Display zone status icon
+                    self.show_status_icon(zone['status'])
+                    # Basic information
+                    sys.stdout.write(self.cdn + zone['fqdn'] + self.rst + " :: " + zone['owner'])
+                    sys.stdout.write(" - Created: " + self.cdt + zone['dates']['created_at'] + self.rst)
+                    # Expiry
+                    sys.stdout.write(" - Expires: ")
+                    self.format_datetime_expiry(zone['dates']['registry_ends_at'])
+                    # Tags
+                    if zone['tags']:
+                        sys.stdout.write(" :: [" + self.ctg)
+                        for tag in zone['tags']:
+                            sys.stdout.write(tag + " ")
+                        sys.stdout.write("\b" + self.rst +"]")
+                    sys.stdout.write("\n")
+            elif self.output_type == "json":
+                print(json.dumps(zones, indent=4))
         return 1
 
     def query_zone_availability(self, dns_zone):
-        self.gandiEndpoint+="/domain/check"
         if not dns_zone:
-            print("Error: No zone provided")
+            self.print_status("Error: No zone provided")
             return 0
         self.print_debug("Checking availability of zone " + dns_zone)
         self.api_params["name"]=dns_zone
-        gandi_reply = requests.request(self.api_method, self.gandiEndpoint, \
-                headers=self.api_headers, params=self.api_params)
+        gandi_reply = self.api_call(self.api_method, "/domain/check", api_params=self.api_params)
+
+        if gandi_reply.status_code != requests.codes.ok:
+            self.print_status("Unable to check availability of " + dns_zone + \
+                " (HTTP Status: " + str(gandi_reply.status_code) + ")")
+            return 0
 
+        check_json = gandi_reply.json()
         if self.output_type == "text":
-            print(gandi_reply.json())
-            for zone in gandi_reply.json()[0]:
-                print(zone['grid'])
-                # if zone["products"]["status"] == "available":
-                #     sys.stdout.write("✅ " + self.end + "Available" + self.rst + " :: " + dns_zone)
-                #     sys.stdout.write(" :: Price: " + self.cdn + "$" + zone["prices"]["price_after_taxes"] + "\n")
-                
+            # One line per product (The zone itself, plus any suggestions)
+            for product in check_json.get("products", []):
+                sys.stdout.write(self.cdn + product.get("name", dns_zone) + self.rst + " :: " + \
+                    str(product.get("status", "unknown")).capitalize())
+                prices = product.get("prices", [])
+                if product.get("status") == "available" and prices:
+                    sys.stdout.write(" :: Price: %.2f %s" % (prices[0].get("price_after_taxes", 0), \
+                        check_json.get("currency", "")))
+                sys.stdout.write("\n")
         elif self.output_type == "json":
-            print(json.dumps(gandi_reply.json(), indent=4))
+            print(json.dumps(check_json, indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson([check_json])
         return 1
 
     def query_zone_information(self, dns_zone):
         if not dns_zone:
-            print("Error: No zone provided")
+            self.print_status("Error: No zone provided")
             return 0
-        self.gandiEndpoint+="/domain/domains/" + dns_zone
         self.print_debug("Querying information about zone " + dns_zone)
         self.api_params["name"]=dns_zone
-        gandi_reply = requests.request(self.api_method, self.gandiEndpoint, \
-                headers=self.api_headers, params=self.api_params)
+        gandi_reply = self.api_call(self.api_method, "/domain/domains/" + dns_zone, \
+            api_params=self.api_params)
 
         if self.output_type == "text":
             zone = gandi_reply.json()
@@ -184,70 +296,499 @@ class manageGandiZone:
                 sys.stdout.write("Auto-Renew :: ⛔ \033[38;5;009mNo\033[0m\n")
         elif self.output_type == "json":
             print(json.dumps(gandi_reply.json(), indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson([gandi_reply.json()])
         return 1
 
+    # Bulk registration :: The owner template is loaded & checked once, every candidate
+    #   is dry-run at once for its price & errors, the lot is confirmed & only then are
+    #   real registrations made - One at a time, at register_rate, each journalled so
+    #   a crashed run can be resumed without registering anything twice
+    #   - dns_zone: A domain, or several comma separated (Plus any in batch_file)
     def register_zone(self, dns_zone):
-        self.gandiEndpoint+="/domain/domains"
-        self.api_method="POST"
-        # Registration defaults
-        self.api_headers["Dry-Run"]="1"
-        self.api_body["fqdn"]=dns_zone
-        self.api_body["duration"]=1
+        candidates = self.registration_candidates(dns_zone)
+        if not candidates:
+            self.print_status("Error: No zone provided")
+            return 0
+        owner_conf = self.registration_owner()
+        journal = registrationJournal("gandi")
+
+        results = {fqdn: {"fqdn": fqdn, "status": "", "price": None, "currency": "", "errors": []} \
+            for fqdn in candidates}
+        to_check = []
+        for fqdn in candidates:
+            if not self.valid_fqdn.match(fqdn):
+                results[fqdn].update(status="invalid", errors=["Not a valid domain name"])
+                continue
+            journal_state = journal.state(fqdn)
+            if journal_state == "registered":
+                results[fqdn].update(status="registered", errors=["Already registered (Journal)"])
+                continue
+            if journal_state == "pending":
+                resolved = self.resolve_pending(journal, fqdn, results[fqdn])
+                if not resolved:
+                    continue            # Can't tell if the last run's request landed - Left alone
+                if results[fqdn]["status"] == "registered":
+                    continue
+            to_check.append(fqdn)
+
+        # Dry-runs only read - They can all be in flight at once
+        if to_check:
+            self.print_status("Dry-running " + str(len(to_check)) + " registration(s)")
+            with ThreadPoolExecutor(max_workers=min(self.register_workers, len(to_check))) as dry_run_pool:
+                for fqdn, dry_result in zip(to_check, dry_run_pool.map( \
+                    lambda fqdn: self.try_dry_run(fqdn, owner_conf), to_check)):
+                    results[fqdn].update(dry_result)
+        ready = [fqdn for fqdn in to_check if results[fqdn]["status"] == "ready"]
+        self.show_registrations(results.values())
+
+        if ready and self.confirm_registration(ready, results):
+            self.commit_registrations(ready, results, owner_conf, journal)
+
+        if self.output_type == "json":
+            print(json.dumps(list(results.values()), indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson(results.values())
+        else:
+            self.print_status(", ".join(str(sum(1 for result in results.values() if result["status"] == status)) \
+                + " " + status for status in self.register_states \
+                if any(result["status"] == status for result in results.values())))
+
+        # Dry-run only (Or unconfirmed) runs succeed if everything could be registered
+        return int(all(result["status"] in ("ready", "registered") for result in results.values()))
+
+    # Domains from the CLI/step & the batch file - Lower-cased, de-duplicated, in order
+    def registration_candidates(self, dns_zone):
+        candidates = [fqdn for fqdn in (dns_zone or "").split(",")]
+        if self.batch_file:
+            try:
+                with open(self.batch_file, "r") as batch_fh:
+                    candidates += [line.split("#", 1)[0] for line in batch_fh]
+            except EnvironmentError as err:
+                raise gandiError("Unable to read batch file '" + self.batch_file + "' (" + str(err) + ")", 2)
+        return list(dict.fromkeys(fqdn.strip().lower().rstrip(".") for fqdn in candidates if fqdn.strip()))
+
+    # Loaded & checked once per instance, however many domains are registered
+    def registration_owner(self):
+        if self.owner_conf is None:
+            owner_conf = self.load_ownership_template()
+            if not owner_conf:
+                raise gandiError("No ownership configuration data loaded")
+            missing = [field for field in self.owner_fields \
+                if not owner_conf.get(field) or str(owner_conf[field]).startswith("<")]
+            if missing:
+                raise gandiError("Missing required ownership attribute(s) (" + ", ".join(missing) + ")")
+            self.owner_conf = owner_conf
+        return self.owner_conf
+
+    # A domain journalled as pending had its request sent with no answer recorded - If
+    #   it is now in the account it was registered, otherwise the attempt is closed off
+    #   as failed & the domain goes through a dry-run again (Where a registration Gandi
+    #   is still processing shows up as unavailable)
+    #   Returns False only if the account couldn't be checked
+    def resolve_pending(self, journal, fqdn, result):
+        gandi_reply = self.api_call("GET", "/domain/domains/" + fqdn)
+        if gandi_reply.status_code == 200:
+            journal.record(fqdn, "registered", recovered=True)
+            result.update(status="registered", errors=["Registered by an interrupted run (Recovered)"])
+        elif gandi_reply.status_code == 404:
+            journal.record(fqdn, "failed", error="Interrupted & not in the account")
+        else:
+            result.update(status="pending", \
+                errors=["Interrupted registration couldn't be checked (HTTP Status: " + \
+                str(gandi_reply.status_code) + ") - Left for the next run"])
+            return False
+        return True
+
+    # Availability & price from the check endpoint, then the registration itself with
+    #   'Dry-Run: 1' for the owner/TLD errors Gandi would refuse it with
+    def dry_run_registration(self, fqdn, owner_conf):
+        check_reply = self.api_call("GET", "/domain/check", api_params={"name": fqdn})
+        if check_reply.status_code != 200:
+            return {"status": "invalid", \
+                "errors": ["Availability check failed (HTTP Status: " + str(check_reply.status_code) + ")"]}
+        check_json = check_reply.json()
+        product = next((product for product in check_json.get("products", []) \
+            if product.get("name", fqdn) == fqdn), {})
+        if product.get("status") != "available":
+            return {"status": "unavailable", "errors": ["Status: " + str(product.get("status", "unknown"))]}
+
+        dry_result = {"status": "ready", "price": None, "currency": check_json.get("currency", ""), "errors": []}
+        for price in product.get("prices", []):
+            if price.get("duration_min", 1) <= self.register_duration <= price.get("duration_max", 1):
+                dry_result["price"] = price.get("price_after_taxes")
+                break
+
+        gandi_reply = self.api_call("POST", "/domain/domains", "write", extra_headers={"Dry-Run": "1"}, \
+            api_data=json.dumps(self.registration_body(fqdn, owner_conf, dry_result)))
+        if gandi_reply.status_code != 200:
+            dry_result.update(status="invalid", \
+                errors=["Dry-run failed (HTTP Status: " + str(gandi_reply.status_code) + ")"])
+        elif gandi_reply.json().get("status") == "error":
+            dry_result.update(status="invalid", errors=[error.get("name", "") + ": " + \
+                (error.get("description") or "Invalid") for error in gandi_reply.json().get("errors", [])])
+        return dry_result
+
+    # A dry-run whose request fails outright only marks its own domain invalid
+    def try_dry_run(self, fqdn, owner_conf):
+        try:
+            return self.dry_run_registration(fqdn, owner_conf)
+        except requests.RequestException as err:
+            return {"status": "invalid", "errors": ["Dry-run request failed (" + str(err) + ")"]}
+
+    # The price confirmed in the dry-run is sent with the registration, so Gandi refuses
+    #   it rather than charging something else
+    def registration_body(self, fqdn, owner_conf, dry_result):
+        reg_body = {"fqdn": fqdn, "duration": self.register_duration, "owner": owner_conf}
+        if dry_result.get("price") is not None:
+            reg_body.update(price=dry_result["price"], currency=dry_result["currency"])
+        return reg_body
+
+    # Consolidated dry-run results - On stderr with --json/--ndjson
+    def show_registrations(self, results):
+        for result in results:
+            price = ""
+            if result["price"] is not None:
+                price = "%.2f %s" % (result["price"], result["currency"])
+            self.print_status("%s%-40s%s %-11s %14s  %s" % (self.cdn if self.output_type == "text" else "", \
+                result["fqdn"], self.rst if self.output_type == "text" else "", result["status"], price, \
+                "; ".join(result["errors"])))
+
+    def confirm_registration(self, ready, results):
+        totals = {}
+        for fqdn in ready:
+            totals[results[fqdn]["currency"]] = totals.get(results[fqdn]["currency"], 0) + \
+                (results[fqdn]["price"] or 0)
+        total_text = ", ".join("%.2f %s" % (total, currency) for currency, total in totals.items())
+        self.print_status(str(len(ready)) + " domain(s) ready to register :: " + total_text)
+        if self.dry_run:
+            self.print_status("Dry-run only - Nothing registered")
+            return False
+        if self.assume_yes:
+            return True
+        if not self.confirm_prompt or not sys.stdin or not sys.stdin.isatty():
+            self.print_status("Not confirmed - Nothing registered (Re-run with --yes)")
+            return False
+        sys.stderr.write("Register " + str(len(ready)) + " domain(s) for " + total_text + "? [y/N] ")
+        sys.stderr.flush()
+        return sys.stdin.readline().strip().lower() in ("y", "yes")
+
+    # Real registrations, spaced out to register_rate per minute under the journal lock
+    #   - A pending entry is synced before each request is sent
+    def commit_registrations(self, ready, results, owner_conf, journal):
+        if not journal.lock():
+            raise gandiError("Another registration run is committing (" + journal.journal_path + ")", 3)
+        try:
+            next_commit = time.monotonic()
+            for fqdn in ready:
+                if journal.state(fqdn) in ("registered", "pending"):
+                    results[fqdn].update(status="skipped", errors=["Committed by another run"])
+                    continue
+                time.sleep(max(0.0, next_commit - time.monotonic()))
+                next_commit = time.monotonic() + 60.0 / self.register_rate
+
+                journal.record(fqdn, "pending", price=results[fqdn]["price"], currency=results[fqdn]["currency"])
+                try:
+                    gandi_reply = self.api_call("POST", "/domain/domains", "write", \
+                        api_data=json.dumps(self.registration_body(fqdn, owner_conf, results[fqdn])))
+                except requests.RequestException as err:
+                    # No telling whether it reached Gandi - Stays pending, checked on resume
+                    results[fqdn].update(status="pending", errors=[str(err)])
+                    self.print_status("Unknown outcome for " + fqdn + " - Checked on the next run")
+                    continue
+
+                if gandi_reply.status_code in (200, 201, 202):
+                    journal.record(fqdn, "registered")
+                    results[fqdn]["status"] = "registered"
+                    self.print_status("Registered " + fqdn)
+                elif gandi_reply.status_code >= 500:
+                    results[fqdn].update(status="pending", \
+                        errors=["HTTP Status: " + str(gandi_reply.status_code) + " - Checked on the next run"])
+                    self.print_status("Unknown outcome for " + fqdn + " - Checked on the next run")
+                else:
+                    error_text = "HTTP Status: " + str(gandi_reply.status_code) + " - " + gandi_reply.reason
+                    journal.record(fqdn, "failed", error=error_text)
+                    results[fqdn].update(status="failed", errors=[error_text])
+                    self.print_status("Failed to register " + fqdn + " (" + error_text + ")")
+        finally:
+            journal.unlock()
+
+    # LiveDNS snapshot functions
+    # LiveDNS has no per-zone change stamp, so every zone is fetched on refresh
+    #   and only stored as a new snapshot when its records actually changed
+    def snapshot_zone(self, dns_zone):
+        store = zoneSnapshotStore("gandi")
+
+        gandi_reply, zones = self.api_get_all("/livedns/domains")
+        if zones is None:
+            self.print_status("Unable to list LiveDNS zones (HTTP Status: " + str(gandi_reply.status_code) + ")")
+            return 0
+        live_zones = [zone['fqdn'] for zone in zones]
+
+        if dns_zone:
+            if dns_zone not in live_zones:
+                sys.stderr.write("Zone '" + dns_zone + "' not hosted on LiveDNS\n")
+                return 0
+            live_zones = [dns_zone]
+
+        inventory = dnsInventory()
+        try:
+            if not dns_zone:
+                # Zones removed upstream are dropped from the local store & inventory
+                for stale_zone in set(store.zones()) - set(live_zones):
+                    self.print_debug("Forgetting removed zone " + stale_zone)
+                    store.forget_zone(stale_zone)
+                inventory.forget_zones("gandi", live_zones)
+
+            changed = 0
+            for snap_zone in sorted(live_zones):
+                gandi_reply, rrsets = self.api_get_all("/livedns/domains/" + snap_zone + "/records")
+                if rrsets is None:
+                    self.print_status("Unable to fetch records of " + snap_zone + \
+                        " (HTTP Status: " + str(gandi_reply.status_code) + ")")
+                    continue
+                snap_id = store.save_snapshot(snap_zone, rrsets)
+                # LiveDNS has no change stamp - The inventory skips zones whose records match
+                inventory.save_zone("gandi", snap_zone, rrsets)
+                if snap_id:
+                    changed += 1
+                    self.print_debug("Snapshot " + snap_id + " saved for " + snap_zone)
+
+            store.save_index()
+            self.print_status("Saved " + str(changed) + " new snapshot(s) across " + str(len(live_zones)) + " zone(s)")
+            if not dns_zone:
+                self.refresh_registrations(inventory)
+        finally:
+            inventory.close()
+        return 1
+
+    # Registrations (Expiry, auto-renew & delegation) for the inventory - The listing
+    #   carries each domain's last update, so only domains changed since are fetched
+    def refresh_registrations(self, inventory):
+        gandi_reply, domains = self.api_get_all("/domain/domains")
+        if domains is None:
+            self.print_status("Unable to list registrations (HTTP Status: " + str(gandi_reply.status_code) + ")")
+            return 0
+        fetched = 0
+        for domain in domains:
+            updated = domain.get('dates', {}).get('updated_at', "")
+            if not inventory.registration_stale(domain['fqdn'], updated):
+                continue
+            gandi_reply = self.api_call("GET", "/domain/domains/" + domain['fqdn'])
+            if gandi_reply.status_code != requests.codes.ok:
+                self.print_status("Unable to fetch registration of " + domain['fqdn'] + \
+                    " (HTTP Status: " + str(gandi_reply.status_code) + ")")
+                continue
+            details = gandi_reply.json()
+            autorenew = details.get('autorenew')
+            if isinstance(autorenew, dict):
+                autorenew = autorenew.get('enabled')
+            inventory.save_registration(domain['fqdn'], "gandi", details.get('status', domain.get('status')), \
+                details.get('dates', domain.get('dates', {})).get('registry_ends_at'), autorenew, updated, \
+                details.get('nameservers'))
+            fetched += 1
+        inventory.forget_registrations("gandi", set(domain['fqdn'] for domain in domains))
+        self.print_status("Refreshed " + str(fetched) + " of " + str(len(domains)) + " registration(s)")
+        return 1
+
+    def list_snapshot(self, dns_zone):
+        store = zoneSnapshotStore("gandi")
+        if not dns_zone:
+            snap_zones = store.zones()
+        else:
+            snap_zones = [dns_zone]
+
+        if self.output_type == "text":
+            for snap_zone in snap_zones:
+                sys.stdout.write(self.cdn + snap_zone + self.rst + " :: Checked: " + self.cdt + \
+                    store.zone_state(snap_zone).get("checked", "never") + self.rst + "\n")
+                for snap_id in store.list_snapshots(snap_zone):
+                    sys.stdout.write("\t" + snap_id + "\n")
+        elif self.output_type == "json":
+            print(json.dumps({snap_zone: store.list_snapshots(snap_zone) \
+                for snap_zone in snap_zones}, indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson({"zone": snap_zone, "snapshots": store.list_snapshots(snap_zone)} \
+                for snap_zone in snap_zones)
+        return 1
+
+    # Compares two snapshots, or a snapshot against the live zone
+    def diff_snapshot(self, dns_zone):
         if not dns_zone:
-            print("Error: No zone provided")
+            self.print_status("Error: No zone provided")
             return 0
-        owner_conf = self.load_ownership_template()
-        if not owner_conf:
-            print("No configuration data loaded")
-            exit()
-        req_details=[ "type", "country", "given", "family", "email", "streetaddr" ]
-        for field in req_details:
-            if not owner_conf[field]:
-                print("Missing required ownership attribute ("+field+") :: Exiting")
-                return ""
-        self.api_body["owner"]=owner_conf
-        gandi_reply = requests.request(self.api_method, self.gandiEndpoint, \
-                headers=self.api_headers, data=json.dumps(self.api_body))
-        self.validate_response(gandi_reply)
-        print(json.dumps(gandi_reply.json(), indent=4))
+        store = zoneSnapshotStore("gandi")
+        old_rrsets = store.load_snapshot(dns_zone, self.snap_from)
+        if old_rrsets is None:
+            self.print_status("No snapshot found for " + dns_zone)
+            return 0
+
+        if self.snap_to:
+            new_rrsets = store.load_snapshot(dns_zone, self.snap_to)
+            if new_rrsets is None:
+                self.print_status("Snapshot '" + self.snap_to + "' not found for " + dns_zone)
+                return 0
+        else:
+            gandi_reply, new_rrsets = self.api_get_all("/livedns/domains/" + dns_zone + "/records")
+            if new_rrsets is None:
+                self.print_status("Unable to fetch records of " + dns_zone + \
+                    " (HTTP Status: " + str(gandi_reply.status_code) + ")")
+                return 0
+
+        changes = store.diff_rrsets(old_rrsets, new_rrsets)
+        if self.output_type == "text":
+            sys.stdout.write(store.format_diff(dns_zone, changes))
+        elif self.output_type == "json":
+            print(json.dumps(changes, indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson(store.diff_records(changes))
+        return 1
+
+    def export_bind(self, dns_zone):
+        if not dns_zone:
+            self.print_status("Error: No zone provided")
+            return 0
+        store = zoneSnapshotStore("gandi")
+        rrsets = store.load_snapshot(dns_zone, self.snap_from)
+        if rrsets is None:
+            self.print_status("No snapshot found for " + dns_zone + " (Run: snapshot " + dns_zone + ")")
+            return 0
+        with profiler.span("render", "bind", records=len(rrsets)):
+            sys.stdout.write(store.export_bind(dns_zone, rrsets))
+        return 1
+
+    # Searches the latest snapshot of every zone, no API calls are made
+    def audit_records(self, pattern):
+        if not pattern:
+            self.print_status("Error: No search pattern provided")
+            return 0
+        try:
+            matches = zoneSnapshotStore("gandi").search(pattern, self.rr_type)
+        except re.error as err:
+            raise gandiError("Invalid search pattern '" + pattern + "' (" + str(err) + ")")
 
+        if self.output_type == "text":
+            for zone, subname, rtype, record in matches:
+                sys.stdout.write(self.cdn + zone + self.rst + " :: " + (subname or "@") + \
+                    " :: Type: " + rtype + " :: " + record + "\n")
+        elif self.output_type == "json":
+            print(json.dumps([{"zone": zone, "subname": subname, "type": rtype, "record": record} \
+                for zone, subname, rtype, record in matches], indent=4))
+        elif self.output_type == "ndjson":
+            self.write_ndjson({"zone": zone, "subname": subname, "type": rtype, "record": record} \
+                for zone, subname, rtype, record in matches)
         return 1
 
     # Utility functions
+    # Every API request goes through here so it is paced by the shared limiter
+    #   - rate_class: read | write (See rateLimiter.bucket_limits)
+    #   - extra_headers: Added to this request only (ie. Dry-Run)
+    def api_call(self, method, api_path, rate_class="read", api_params=False, api_data=None, extra_headers=None):
+        req_headers = self.api_headers
+        if extra_headers:
+            req_headers = dict(self.api_headers, **extra_headers)
+        for attempt in range(self.max_retries + 1):
+            with profiler.span("ratelimit", rate_class):
+                self.rate_limiter.acquire(rate_class)
+            gandi_reply = self.http_session.request(method, self.gandiEndpoint + api_path, \
+                headers=req_headers, params=api_params or {}, data=api_data)
+            if gandi_reply.status_code != 429 or attempt == self.max_retries:
+                return gandi_reply
+
+            # Throttled - Make every process on the host back off, not just this one
+            try:
+                retry_after = max(0.0, float(gandi_reply.headers.get("Retry-After", 1)))
+            except ValueError:
+                retry_after = 1.0
+            self.print_debug("Throttled by Gandi - Retrying in " + str(retry_after) + "s")
+            self.rate_limiter.penalize(rate_class, retry_after)
+        return gandi_reply
+
+    # Gandi pages collections with page/per_page & reports the full size in
+    #   the 'Total-Count' header - Returns the last reply & every item
+    #   (None if any page failed)
+    def api_get_all(self, api_path, api_params=False):
+        items = []
+        for gandi_reply, page_items in self.api_pages(api_path, api_params):
+            if page_items is None:
+                return gandi_reply, None
+            items.extend(page_items)
+        return gandi_reply, items
+
+    # Yields (reply, items) for each page as it arrives - Items are None for a
+    #   failed page, which is always the last
+    def api_pages(self, api_path, api_params=False):
+        page_params = dict(api_params or {})
+        page_params["per_page"] = self.page_size
+        page_params["page"] = 1
+        item_count = 0
+        while True:
+            gandi_reply = self.api_call("GET", api_path, api_params=page_params)
+            if gandi_reply.status_code != requests.codes.ok:
+                yield gandi_reply, None
+                return
+            page_items = gandi_reply.json()
+            item_count += len(page_items)
+            yield gandi_reply, page_items
+
+            total_count = gandi_reply.headers.get("Total-Count")
+            if not page_items or not total_count or item_count >= int(total_count):
+                return
+            page_params["page"] += 1
+
+    # Each page is written out as it arrives, rather than once the last is in
+    def stream_all(self, api_path, api_params, action_verb):
+        for gandi_reply, page_items in self.api_pages(api_path, api_params):
+            if page_items is None:
+                self.print_status("Unable to " + action_verb + " (HTTP Status: " + str(gandi_reply.status_code) + ")")
+                return 0
+            self.write_ndjson(page_items)
+        return 1
+
+    # One compact record per line, flushed so readers can start on them straight away
+    @staticmethod
+    def write_ndjson(records):
+        with profiler.span("render", "ndjson"):
+            sys.stdout.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+            sys.stdout.flush()
+
+    # Status & diagnostics - Kept off stdout while it carries JSON/NDJSON
+    def print_status(self, msg):
+        (sys.stdout if self.output_type == "text" else sys.stderr).write(msg + "\n")
+
     def find_api_token(self):
         gDirs=["~/.secrets/","~/.api/","~/"]        # Common directories
         gfnames=["gandi","gandi.key","gandi.api"]   # Gandi filenames
         found_path=""
 
-        for filename in gfnames:
-            for directory in gDirs:
-                if os.path.exists(os.path.expanduser(directory+filename)):
-                    found_path=os.path.expanduser(directory+filename)
+        with profiler.span("config", "api key"):
+            for filename in gfnames:
+                for directory in gDirs:
+                    if os.path.exists(os.path.expanduser(directory+filename)):
+                        found_path=os.path.expanduser(directory+filename)
 
-        if not found_path:
-            return ""
-        else:
-            self.print_debug("Found Gandi API key in path: " + found_path)
-            with open(found_path,"r") as api_file:
-                return api_file.read()[:-1]     # Need to remove the final file newline
+            if not found_path:
+                return ""
+            else:
+                self.print_debug("Found Gandi API key in path: " + found_path)
+                with open(found_path,"r") as api_file:
+                    return api_file.read()[:-1]     # Need to remove the final file newline
 
     def load_ownership_template(self):
-        hmDir=os.path.expanduser("~")
-        if os.path.exists(hmDir+"gandi_owner.conf"):
-            found_path=hmDir+"gandi_owner.conf"
-        elif os.path.exists(hmDir+"/.config/gandi_owner.conf"):
-            found_path=hmDir+"/.config/gandi_owner.conf"
-        else:
-            print("No ownership template found :: Creating one")
+        found_path = next((os.path.expanduser(owner_path) for owner_path in self.owner_paths \
+            if os.path.exists(os.path.expanduser(owner_path))), "")
+        if not found_path:
+            self.print_status("No ownership template found :: Creating one")
             self.generate_ownership_template()
             return ""
 
-        if found_path:
-            with open(found_path, "r") as owners_json:
+        try:
+            with profiler.span("config", "owner template"), open(found_path, "r") as owners_json:
                 # Remove commented lines
-                uncom_json = "".join(line for line in owners_json if not line.startswith('//'))
-                owners_json = json.loads(uncom_json)
-            return owners_json
+                uncom_json = "".join(line for line in owners_json if not line.lstrip().startswith('//'))
+                return json.loads(uncom_json)
+        except (EnvironmentError, ValueError) as err:
+            raise gandiError("Unable to read ownership template '" + found_path + "' (" + str(err) + ")")
 
     def generate_ownership_template(self):
         gandi_owners_url="https://api.gandi.net/docs/domains/#post-v5-domain-domains"
@@ -271,21 +812,20 @@ class manageGandiZone:
                 json.dumps(req_ownership_fields, indent=4)+
                 "\n"
             )
-            print("Ownership template file created under ~/.config/gandi_owner.conf")
+            self.print_status("Ownership template file created under ~/.config/gandi_owner.conf")
         return ""
 
     def validate_response(self, req_response):
         if req_response.status_code != requests.codes.ok:
-            print("Request failed (HTTP Status: "+req_response.status_code+" - "\
-                +req_response.reason+")")
-            sys.exit(100)
+            raise gandiError("Request failed (HTTP Status: "+str(req_response.status_code)+" - "\
+                +req_response.reason+")", 100)
         elif "error" in req_response.json()['status']:
-            print("Response returned error: ")
+            self.print_status("Response returned error: ")
             for error in req_response.json()['errors']:
-                print("Missing attribute ["+error['name']+"]")
+                self.print_status("Missing attribute ["+error['name']+"]")
                 if error['description']:
-                    print(error['description'])
-            sys.exit(int(req_response.json()['status']))
+                    self.print_status(error['description'])
+            raise gandiError("Gandi returned an error status (" + str(req_response.json()['status']) + ")")
         else:
             return 1
 
@@ -316,7 +856,18 @@ class manageGandiZone:
 
     def print_debug(self, msg):
         if msg and self.debug_mode:
-            sys.stdout.write(msg + "\n")
+            self.print_status(msg)
+
+    # argparse type for --rate - Zero or less would stall (Or un-pace) registrations
+    @staticmethod
+    def positive_rate(rate_text):
+        try:
+            rate = float(rate_text)
+        except ValueError:
+            raise argparse.ArgumentTypeError("'" + rate_text + "' isn't a number")
+        if not 0 < rate < float("inf"):
+            raise argparse.ArgumentTypeError("must be above 0 per minute")
+        return rate
 
 
 # Below is CLI only - Check namespace to confirm whether running standalone
@@ -326,31 +877,47 @@ if __name__ == "__main__":
         description="A Python CLI & callable object for interfacing with the Gandi DNS API")
 
     MGZ_ARGV.add_argument('action', \
-        help="Available actions: [list | info | query | register]")
+        help="Available actions: [list | info | query | register | snapshot | " \
+            "list-snapshot | diff-snapshot | export-bind | audit]")
     MGZ_ARGV.add_argument('zone', nargs='?', \
         help="The DNS zone perform the action on")
     MGZ_ARGV.add_argument('--json', '-j', dest="ofmt", action="store_const", const="json", \
         help='Return results in JSON')
+    MGZ_ARGV.add_argument('--ndjson', dest="ofmt", action="store_const", const="ndjson", \
+        help='Stream results as NDJSON (One record per line)')
     MGZ_ARGV.add_argument('--debug', '-d', action="store_const", const=True, \
         help='Show extra debugging output')
     MGZ_ARGV.add_argument('--key', '-k', \
         help='An explicit API key to use')
+    MGZ_ARGV.add_argument('--from', dest="snap_from", \
+        help='Snapshot ID to diff or export from (Default: latest)')
+    MGZ_ARGV.add_argument('--to', dest="snap_to", \
+        help='Snapshot ID to diff against (Default: live zone)')
+    MGZ_ARGV.add_argument('--type', dest="rr_type", \
+        help='Limit an audit to one record type')
+    MGZ_ARGV.add_argument('--batch', \
+        help='File of domains to register (One per line)')
+    MGZ_ARGV.add_argument('--yes', '-y', action="store_true", \
+        help="Register once the dry-run passes, without asking")
+    MGZ_ARGV.add_argument('--dry-run', action="store_true", \
+        help="Only dry-run the registrations (Price & errors)")
+    MGZ_ARGV.add_argument('--rate', type=manageGandiZone.positive_rate, \
+        help="Registrations per minute (Default: 10)")
+    profiler.add_arguments(MGZ_ARGV)
 
     MGZ_ARGV = MGZ_ARGV.parse_args()
-    MGZ_OBJ = manageGandiZone(MGZ_ARGV.key, MGZ_ARGV.ofmt, MGZ_ARGV.debug)
-
-    # CLI ONLY :: define CLI actions
-    valid_actions = {
-        "list": MGZ_OBJ.list_zone,              # 'zone' will be passed empty through here
-        "info": MGZ_OBJ.query_zone_information,
-        "query": MGZ_OBJ.query_zone_availability,
-        "register": MGZ_OBJ.register_zone
-    }
+    profiler.from_args(MGZ_ARGV, "manageGandiZone")
 
     # Check & execute a CLI action
     try:
-        if not valid_actions[MGZ_ARGV.action](MGZ_ARGV.zone):
-            print("Operation failed")
-    except KeyError:
-        sys.stderr.write("Unknown action '" + MGZ_ARGV.action + "'\n")
+        MGZ_OBJ = manageGandiZone(MGZ_ARGV.key, MGZ_ARGV.ofmt, MGZ_ARGV.debug, \
+            MGZ_ARGV.snap_from, MGZ_ARGV.snap_to, MGZ_ARGV.rr_type, batch_file=MGZ_ARGV.batch, \
+            assume_yes=MGZ_ARGV.yes, dry_run=MGZ_ARGV.dry_run, register_rate=MGZ_ARGV.rate)
+        MGZ_RESULT = MGZ_OBJ.run_action(MGZ_ARGV.action, MGZ_ARGV.zone)
+    except gandiError as err:
+        sys.stderr.write(str(err) + "\n")
+        sys.exit(err.exit_code)
+    except BrokenPipeError:
+        sys.exit(0)                 # Reader went away (ie. | head)
+    if not MGZ_RESULT:
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	mockDnsApi.py - A local stand-in for the parts of the
+#   Gandi v5 & deSEC v1 APIs used by manageGandiZone and
+#   manageDesecZone, for offline benchmarks & testing
+#
+#   Emulates pagination (deSEC cursors / Gandi pages),
+#   request latency & throttling (HTTP 429), and counts
+#   every request it serves
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - One write per response & TCP_NODELAY (Kept-alive sessions were held
+#	          up ~40ms a request by Nagle/delayed ACK)
+#
+#   Endpoints:
+#       /api/v1/...     deSEC (Point desec_endpoint here)
+#       /v5/...         Gandi (Point gandiEndpoint here)
+#       GET /__stats    Request counters as JSON
+#       POST /__reset   Reset the request counters
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class mockDnsApi:
+
+    # Presets
+    domains = 10                # Zones in the account
+    rrsets = 10                 # rrsets in the first zone (Others get 2)
+    latency = 0.0               # Seconds added to every request
+    throttle_every = 0          # Answer every Nth request with a 429 (0: never)
+    retry_after = 0             # Retry-After sent with a 429
+    desec_page_size = 500       # deSEC's pagination threshold
+    gandi_page_size = 100       # Gandi's default per_page
+
+    def __init__(self, **config):
+        for conf_key, conf_value in config.items():
+            if not hasattr(self, conf_key):
+                raise ValueError("Unknown mock option '" + conf_key + "'")
+            setattr(self, conf_key, conf_value)
+
+        self.zone_names = ["zone%05d.example" % zone_idx for zone_idx in range(self.domains)]
+        self.zone_records = {}          # Zones whose rrsets have been changed through the API
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    # Request counters
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"requests": 0, "throttled": 0, "bytes": 0, "routes": {}}
+
+    def count_request(self, route, resp_bytes, throttled=False):
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += resp_bytes
+            self.stats["routes"][route] = self.stats["routes"].get(route, 0) + 1
+            if throttled:
+                self.stats["throttled"] += 1
+            return self.stats["requests"]
+
+    # Generated account data (Deterministic so runs are comparable)
+    def desec_rrsets(self, zone):
+        if zone in self.zone_records:
+            return self.zone_records[zone]
+        rr_count = self.rrsets if zone == self.zone_names[0] else 2
+        rrsets = [{"subname": "", "type": "NS", "ttl": 3600, \
+            "records": ["ns1.desec.io.", "ns2.desec.org."]}]
+        for rr_idx in range(1, rr_count):
+            rrsets.append({"subname": "host%05d" % rr_idx, "type": "A", "ttl": 3600, \
+                "records": ["10.%d.%d.%d" % (rr_idx >> 16 & 255, rr_idx >> 8 & 255, rr_idx & 255)]})
+        for rr in rrsets:
+            rr.update({"domain": zone, "name": (rr["subname"] + "." if rr["subname"] else "") + zone + ".", \
+                "created": "2023-01-01T00:00:00.000000Z", "touched": "2023-01-01T00:00:00.000000Z"})
+        return rrsets
+
+    def desec_domain(self, zone):
+        return {"name": zone, "minimum_ttl": 3600, "created": "2023-01-01T00:00:00.000000Z", \
+            "published": "2023-01-01T00:00:00.000000Z", "touched": "2023-01-01T00:00:00.000000Z"}
+
+    def gandi_domain(self, zone, full=False):
+        domain = {"fqdn": zone, "id": "id-" + zone, "owner": "nixkit", "status": [], \
+            "tags": ["bench"], "dates": {"created_at": "2023-01-01T00:00:00Z", \
+            "updated_at": "2023-01-01T00:00:00Z", "registry_ends_at": "2030-01-01T00:00:00Z"}}
+        if full:
+            domain.update({"sharing_space": {"name": "nixkit"}, "services": ["gandilivedns", "dnssec"], \
+                "nameservers": ["ns1.gandi.net", "ns2.gandi.net"], "autorenew": {"enabled": True}})
+        return domain
+
+    def gandi_records(self, zone):
+        return [{"rrset_name": rr["subname"] or "@", "rrset_type": rr["type"], \
+            "rrset_ttl": rr["ttl"], "rrset_values": rr["records"]} for rr in self.desec_rrsets(zone)]
+
+    # Routing :: Returns (route label, status, body, extra headers)
+    def route(self, method, url, req_headers, req_body):
+        url_parts = urlsplit(url)
+        path = url_parts.path
+        query = parse_qs(url_parts.query, keep_blank_values=True)
+
+        # deSEC
+        if path == "/api/v1/domains/":
+            if method == "GET":
+                return ("desec:domains",) + self.desec_page(url_parts, query, \
+                    [self.desec_domain(zone) for zone in self.zone_names])
+            if method == "POST":
+                zone = json.loads(req_body or "{}").get("name", "")
+                self.zone_names.append(zone)
+                return "desec:add-domain", 201, self.desec_domain(zone), {}
+        domain_match = re.match(r"^/api/v1/domains/([^/]+)/(rrsets/)?$", path)
+        if domain_match:
+            zone = domain_match.group(1)
+            if zone not in self.zone_names:
+                return "desec:missing", 404, {"detail": "Not found."}, {}
+            if not domain_match.group(2):
+                if method == "DELETE":
+                    self.zone_names.remove(zone)
+                    return "desec:delete-domain", 204, None, {}
+                return "desec:domain", 200, self.desec_domain(zone), {}
+            if method == "GET":
+                return ("desec:rrsets",) + self.desec_page(url_parts, query, self.desec_rrsets(zone))
+            if method in ("POST", "PATCH", "PUT"):
+                return self.desec_write_rrsets(method, zone, json.loads(req_body or "[]"))
+
+        # Gandi
+        if path == "/v5/domain/domains":
+            if method == "POST":
+                if req_headers.get("Dry-Run") == "1":
+                    return "gandi:register-dry", 200, {"status": "success", "errors": []}, {}
+                return "gandi:register", 202, {"message": "Confirmed"}, {}
+            return ("gandi:domains",) + self.gandi_page(query, \
+                [self.gandi_domain(zone) for zone in self.zone_names])
+        if path == "/v5/domain/check":
+            name = query.get("name", [""])[0]
+            return "gandi:check", 200, {"currency": "USD", "grid": "A", "products": [{"name": name, \
+                "status": "available" if name not in self.zone_names else "unavailable", \
+                "prices": [{"duration_min": 1, "duration_max": 1, "price_after_taxes": 12.5}]}]}, {}
+        gandi_match = re.match(r"^/v5/domain/domains/([^/]+)$", path)
+        if gandi_match:
+            if gandi_match.group(1) not in self.zone_names:
+                return "gandi:missing", 404, {"status": "error", "message": "Not found"}, {}
+            return "gandi:domain", 200, self.gandi_domain(gandi_match.group(1), True), {}
+        if path == "/v5/livedns/domains":
+            return ("gandi:livedns",) + self.gandi_page(query, \
+                [{"fqdn": zone, "domain_href": url + "/" + zone} for zone in self.zone_names])
+        livedns_match = re.match(r"^/v5/livedns/domains/([^/]+)/records$", path)
+        if livedns_match:
+            return ("gandi:records",) + self.gandi_page(query, self.gandi_records(livedns_match.group(1)))
+
+        return "unknown", 404, {"detail": "No mock for " + method + " " + path}, {}
+
+    def desec_page(self, url_parts, query, items):
+        if "cursor" not in query:
+            if len(items) > self.desec_page_size:
+                return 400, {"detail": "Pagination required. You can query up to " + \
+                    str(self.desec_page_size) + " items at a time ('cursor' parameter)."}, \
+                    {"Link": "<" + url_parts.path + "?cursor=>; rel=\"first\""}
+            return 200, items, {}
+        offset = int(query["cursor"][0] or 0)
+        links = ["<" + url_parts.path + "?cursor=>; rel=\"first\""]
+        if offset + self.desec_page_size < len(items):
+            links.append("<" + url_parts.path + "?cursor=" + str(offset + self.desec_page_size) + \
+                ">; rel=\"next\"")
+        return 200, items[offset:offset + self.desec_page_size], {"Link": ", ".join(links)}
+
+    def gandi_page(self, query, items):
+        per_page = int(query.get("per_page", [self.gandi_page_size])[0])
+        page = int(query.get("page", [1])[0])
+        return 200, items[(page - 1) * per_page:page * per_page], {"Total-Count": str(len(items))}
+
+    def desec_write_rrsets(self, method, zone, new_rrsets):
+        rrsets = {(rr["subname"], rr["type"]): rr for rr in self.desec_rrsets(zone)}
+        for rr in new_rrsets:
+            rr_key = (rr.get("subname", ""), rr.get("type", ""))
+            if not rr.get("records"):
+                rrsets.pop(rr_key, None)
+            else:
+                rrsets[rr_key] = dict(rr, domain=zone, created="2023-01-01T00:00:00.000000Z", \
+                    touched="2023-01-01T00:00:00.000000Z")
+        self.zone_records[zone] = list(rrsets.values())
+        return "desec:write-rrsets", 201 if method == "POST" else 200, new_rrsets, {}
+
+    def serve(self, host="127.0.0.1", port=0):
+        mock_api = self
+
+        class mockHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 65536            # Status, headers & body leave in one write
+
+            # Small writes on a kept-alive connection would otherwise wait on the client's
+            #   delayed ACK (Nagle) - ~40ms a request that no real API adds
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def handle_any(self):
+                req_body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+                if self.path.startswith("/__"):
+                    if self.path == "/__reset":
+                        mock_api.reset_stats()
+                    with mock_api.stats_lock:
+                        self.reply(200, mock_api.stats, {})
+                    return
+
+                if mock_api.latency:
+                    time.sleep(mock_api.latency)
+                with mock_api.stats_lock:
+                    req_number = mock_api.stats["requests"] + 1
+                if mock_api.throttle_every and req_number % mock_api.throttle_every == 0:
+                    resp_len = self.reply(429, {"detail": "Request was throttled."}, \
+                        {"Retry-After": str(mock_api.retry_after)})
+                    mock_api.count_request("throttled", resp_len, True)
+                    return
+
+                route, status, body, headers = mock_api.route(self.command, self.path, \
+                    self.headers, req_body)
+                mock_api.count_request(route, self.reply(status, body, headers))
+
+            def reply(self, status, body, headers):
+                payload = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for header_key, header_value in headers.items():
+                    self.send_header(header_key, header_value)
+                self.end_headers()
+                self.wfile.write(payload)
+                self.wfile.flush()
+                return len(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_any
+
+        return ThreadingHTTPServer((host, port), mockHandler)
+
+# Runs the mock in a child process so its allocations & CPU time stay out of
+#   the caller's measurements - Returns (process, base url)
+def start_mock_process(**config):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    mock_proc = multiprocessing.Process(target=serve_mock_process, args=(child_conn, config), daemon=True)
+    mock_proc.start()
+    mock_port = parent_conn.recv()
+    if isinstance(mock_port, Exception):
+        raise mock_port
+    return mock_proc, "http://127.0.0.1:" + str(mock_port)
+
+def serve_mock_process(conn, config):
+    try:
+        mock_server = mockDnsApi(**config).serve()
+    except Exception as err:
+        conn.send(err)
+        return
+    conn.send(mock_server.server_address[1])
+    mock_server.serve_forever()
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    MDA_ARGV = argparse.ArgumentParser(description="Local mock of the Gandi v5 & deSEC v1 APIs")
+    MDA_ARGV.add_argument('--port', type=int, default=8053, help='Port to listen on')
+    MDA_ARGV.add_argument('--domains', type=int, default=10, help='Zones in the account')
+    MDA_ARGV.add_argument('--rrsets', type=int, default=10, help='rrsets in the first zone')
+    MDA_ARGV.add_argument('--latency', type=float, default=0.0, help='Seconds added per request')
+    MDA_ARGV.add_argument('--throttle-every', type=int, default=0, \
+        help='Answer every Nth request with HTTP 429')
+    MDA_ARGV.add_argument('--retry-after', type=int, default=0, help='Retry-After sent with a 429')
+
+    MDA_ARGV = MDA_ARGV.parse_args()
+    MDA_SERVER = mockDnsApi(domains=MDA_ARGV.domains, rrsets=MDA_ARGV.rrsets, \
+        latency=MDA_ARGV.latency, throttle_every=MDA_ARGV.throttle_every, \
+        retry_after=MDA_ARGV.retry_after).serve(port=MDA_ARGV.port)
+    sys.stdout.write("Mock DNS API listening on http://127.0.0.1:" + str(MDA_ARGV.port) + \
+        " (deSEC: /api/v1 - Gandi: /v5)\n")
+    try:
+        MDA_SERVER.serve_forever()
+    except KeyboardInterrupt:
+        pass
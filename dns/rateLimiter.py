@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	rateLimiter.py - A token-bucket rate limiter shared
+#   across every process on the host that talks to the
+#   same DNS provider API
+#
+#   Each bucket lives in its own small state file guarded
+#   by flock(), so callers only ever contend on the bucket
+#   they are drawing from. Tokens are reserved (the bucket
+#   may go into debt) while the lock is held and the wait
+#   happens after it is released, so nobody sleeps while
+#   holding a lock
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+#   Environment:
+#       NIXKIT_RATELIMIT_DIR: Override the state directory
+#       NIXKIT_RATELIMIT=off: Disable limiting entirely
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import time
+import fcntl
+import struct
+
+class tokenBucketLimiter:
+
+    # Presets
+    state_dir = "~/.cache/nixkit/ratelimit"
+    state_format = "=dd"                # tokens, last refill (monotonic-ish wall clock)
+
+    # Bucket definitions: provider -> endpoint class -> [(bucket, capacity, period secs)]
+    #   Buckets named the same within a provider are shared between classes
+    bucket_limits = {
+        "desec": {
+            "read": [("read-1s", 10, 1), ("read-1m", 50, 60)],
+            "write": [("write-1s", 2, 1), ("write-1m", 15, 60), ("write-1h", 100, 3600)],
+            "domain": [("domain-1m", 10, 60), ("domain-1h", 100, 3600)],
+        },
+        "gandi": {
+            "read": [("api-1m", 1000, 60)],
+            "write": [("api-1m", 1000, 60)],
+        },
+    }
+
+    def __init__(self, provider, state_dir=False, enabled=True):
+        if provider not in self.bucket_limits:
+            raise ValueError("No rate limits defined for provider '" + provider + "'")
+        if os.environ.get("NIXKIT_RATELIMIT", "").lower() in ("0", "off", "false", "no"):
+            enabled = False
+        if not state_dir:
+            state_dir = os.environ.get("NIXKIT_RATELIMIT_DIR", self.state_dir)
+
+        self.provider = provider
+        self.enabled = enabled
+        self.state_path = os.path.expanduser(state_dir)
+        if self.enabled:
+            try:
+                os.makedirs(self.state_path, exist_ok=True)
+            except OSError as err:
+                sys.stderr.write("Rate limiter state directory unusable (" + self.state_path + "): " + \
+                    str(err) + " - Calls won't be paced\n")
+                self.enabled = False
+
+    # Blocks until a call of 'rate_class' may be made, returns seconds waited
+    def acquire(self, rate_class="read"):
+        if not self.enabled:
+            return 0.0
+        delay = 0.0
+        for bucket, capacity, period in self.class_buckets(rate_class):
+            delay = max(delay, self.reserve(bucket, capacity, period, 1))
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    # Called on an HTTP 429 - Drains every bucket of the class so that all
+    #   processes back off for 'retry_after' seconds, not just this one
+    def penalize(self, rate_class="read", retry_after=1.0):
+        if not self.enabled:
+            time.sleep(retry_after)         # Nothing shared to drain - Just wait it out
+            return
+        for bucket, capacity, period in self.class_buckets(rate_class):
+            self.reserve(bucket, capacity, period, 0, drain_for=retry_after)
+
+    def class_buckets(self, rate_class):
+        try:
+            return self.bucket_limits[self.provider][rate_class]
+        except KeyError:
+            raise ValueError("Unknown rate class '" + rate_class + "' for " + self.provider)
+
+    # Refills, takes 'tokens' & stores the bucket state under an exclusive lock
+    #   Returns how long the caller must wait before its reservation is valid
+    def reserve(self, bucket, capacity, period, tokens, drain_for=0.0):
+        fill_rate = capacity / float(period)
+        bucket_path = os.path.join(self.state_path, self.provider + "." + bucket)
+        state_size = struct.calcsize(self.state_format)
+
+        bucket_fd = None
+        try:
+            bucket_fd = os.open(bucket_path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(bucket_fd, fcntl.LOCK_EX)
+            now = time.time()
+            raw_state = os.pread(bucket_fd, state_size, 0)
+            if len(raw_state) == state_size:
+                level, last = struct.unpack(self.state_format, raw_state)
+                level = min(capacity, level + max(0.0, now - last) * fill_rate)
+            else:
+                level = float(capacity)     # New (or corrupt) bucket starts full
+
+            if drain_for:
+                level = min(level, -drain_for * fill_rate)
+            level -= tokens
+            os.pwrite(bucket_fd, struct.pack(self.state_format, level, now), 0)
+        except OSError as err:
+            # A broken (Or unwritable) state file shouldn't stop the tool - The call goes unpaced
+            sys.stderr.write("Rate limiter state error (" + bucket_path + "): " + str(err) + "\n")
+            return 0.0
+        finally:
+            if bucket_fd is not None:
+                os.close(bucket_fd)         # Closing releases the lock
+
+        if level >= 0:
+            return 0.0
+        return -level / fill_rate
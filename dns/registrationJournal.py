@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	registrationJournal.py - An append-only journal of
+#   domain registrations, so a bulk run that dies part
+#   way can be resumed without registering a domain twice
+#
+#   Every registration is journalled as 'pending' (fsynced)
+#   before its request is sent & 'registered' or 'failed'
+#   once the answer is in. A domain left 'pending' had its
+#   request sent with no answer recorded - Whoever resumes
+#   must check the account before trying it again
+#
+#   Only one run may commit at a time - The journal file
+#   itself is flock()ed while it does
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+#   Layout:
+#       <journal_root>/<provider>.journal (One JSON entry per line)
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import fcntl
+
+from datetime import datetime, timezone
+
+class registrationJournal:
+
+    # Presets
+    journal_root = "~/.cache/nixkit/registrations"
+    states = ("pending", "registered", "failed")
+
+    def __init__(self, provider, journal_root=False):
+        if journal_root:
+            self.journal_root = journal_root
+        self.provider = provider
+        self.journal_path = os.path.join(os.path.expanduser(self.journal_root), provider + ".journal")
+        self.journal_fd = None
+        self.entries = {}               # fqdn -> latest entry
+        self.reload()
+
+    # Replays the journal - The last entry of each domain is its state
+    def reload(self):
+        self.entries = {}
+        try:
+            with open(self.journal_path, "r") as journal_file:
+                for line_num, journal_line in enumerate(journal_file, 1):
+                    try:
+                        entry = json.loads(journal_line)
+                        self.entries[entry["fqdn"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        # A torn final line from a crash - Anything before it still counts
+                        sys.stderr.write("Skipping unreadable journal line " + str(line_num) + \
+                            " (" + self.journal_path + ")\n")
+        except FileNotFoundError:
+            pass
+        return self.entries
+
+    def state(self, fqdn):
+        return self.entries.get(fqdn.lower(), {}).get("state", "")
+
+    # Appends & syncs an entry before returning - 'pending' must be on disk before
+    #   the request it covers is sent
+    def record(self, fqdn, state, **details):
+        if state not in self.states:
+            raise ValueError("Unknown registration state '" + state + "'")
+        entry = {"fqdn": fqdn.lower(), "state": state, \
+            "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        entry.update(details)
+        journal_fd = self.journal_fd
+        if journal_fd is None:
+            journal_fd = self.open_journal()
+        try:
+            os.write(journal_fd, (json.dumps(entry, separators=(",", ":")) + "\n").encode())
+            os.fsync(journal_fd)
+        finally:
+            if journal_fd != self.journal_fd:
+                os.close(journal_fd)
+        self.entries[entry["fqdn"]] = entry
+        return entry
+
+    # Held for the whole commit phase - Returns False if another run has it
+    def lock(self):
+        journal_fd = self.open_journal()
+        try:
+            fcntl.flock(journal_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(journal_fd)
+            return False
+        self.journal_fd = journal_fd
+        self.reload()                   # Another run may have committed since we last read it
+        return True
+
+    def unlock(self):
+        if self.journal_fd is not None:
+            os.close(self.journal_fd)   # Closing releases the lock
+            self.journal_fd = None
+
+    # A torn last line is closed off first, so the next entry starts on its own line
+    def open_journal(self):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        journal_fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        journal_size = os.fstat(journal_fd).st_size
+        if journal_size and os.pread(journal_fd, 1, journal_size - 1) != b"\n":
+            os.write(journal_fd, b"\n")
+        return journal_fd
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	zoneSnapshot.py - A local, versioned store of DNS zone
+#   rrsets shared by manageDesecZone & manageGandiZone
+#
+#   Snapshots are stored as gzipped compact JSON, one file
+#   per version, with a single index per provider that
+#   holds the latest records of every zone so audits can
+#   be answered without touching the API
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Diffs as flat records (For NDJSON output)
+#
+#   Layout:
+#       <store_root>/<provider>/index.json
+#       <store_root>/<provider>/<zone>/<snapshot id>.json.gz
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+
+from datetime import datetime, timezone
+
+class zoneSnapshotStore:
+
+    # Presets
+    store_root = "~/.cache/nixkit/zones"
+    max_snapshots = 20                  # Older snapshots are pruned past this
+    index_version = 1
+    snapshot_id_format = "%Y%m%dT%H%M%S%fZ"
+
+    def __init__(self, provider, store_root=False):
+        if store_root:
+            self.store_root = store_root
+        self.provider = provider
+        self.store_path = os.path.join(os.path.expanduser(self.store_root), provider)
+        self.index_path = os.path.join(self.store_path, "index.json")
+        self.index = self.load_index()
+
+    # Index functions
+    def load_index(self):
+        try:
+            with open(self.index_path, "r") as index_fh:
+                index = json.load(index_fh)
+            if index.get("version") == self.index_version:
+                return index
+            sys.stderr.write("Snapshot index version mismatch - Rebuilding\n")
+        except FileNotFoundError:
+            pass
+        except (EnvironmentError, ValueError):
+            sys.stderr.write("Unable to read snapshot index (" + self.index_path + ") - Rebuilding\n")
+        return {"version": self.index_version, "zones": {}}
+
+    def save_index(self):
+        self.write_atomic(self.index_path, \
+            json.dumps(self.index, separators=(",", ":")).encode())
+
+    def zones(self):
+        return sorted(self.index["zones"])
+
+    def zone_state(self, zone):
+        return self.index["zones"].get(zone, {})
+
+    # Checks a zone's last recorded 'touched' stamp against the one the API
+    #   reports. Providers without a stamp (touched=False) always refresh
+    def needs_refresh(self, zone, touched):
+        state = self.zone_state(zone)
+        if not state or not touched:
+            return True
+        return state.get("touched") != touched
+
+    # Snapshot functions
+    def save_snapshot(self, zone, rrsets, touched=False):
+        rrsets = self.normalize_rrsets(rrsets)
+        digest = self.digest_rrsets(rrsets)
+        state = self.index["zones"].setdefault(zone, {"snapshots": []})
+
+        # Only new content creates a version, a bare 'touched' change is recorded
+        state["touched"] = touched or ""
+        state["checked"] = datetime.now(timezone.utc).strftime(self.snapshot_id_format)
+        if state.get("digest") == digest:
+            return ""
+
+        snap_id = state["checked"]
+        self.write_atomic(self.snapshot_path(zone, snap_id), \
+            gzip.compress(json.dumps(rrsets, separators=(",", ":")).encode(), mtime=0))
+        state["digest"] = digest
+        state["snapshots"].append(snap_id)
+        state["records"] = [[rr[0], rr[1], rr[3]] for rr in rrsets]
+
+        # Prune anything past the retention count
+        while len(state["snapshots"]) > self.max_snapshots:
+            try:
+                os.remove(self.snapshot_path(zone, state["snapshots"].pop(0)))
+            except FileNotFoundError:
+                pass
+
+        return snap_id
+
+    def load_snapshot(self, zone, snap_id=False):
+        state = self.zone_state(zone)
+        if not state or not state["snapshots"]:
+            return None
+        if not snap_id:
+            snap_id = state["snapshots"][-1]
+        elif snap_id not in state["snapshots"]:
+            # Allow unambiguous prefixes (ie. a date) to select a snapshot
+            matches = [sid for sid in state["snapshots"] if sid.startswith(snap_id)]
+            if len(matches) != 1:
+                return None
+            snap_id = matches[0]
+        try:
+            with gzip.open(self.snapshot_path(zone, snap_id), "rb") as snap_fh:
+                return json.loads(snap_fh.read())
+        except (EnvironmentError, ValueError):
+            sys.stderr.write("Unable to read snapshot '" + snap_id + "' of " + zone + "\n")
+            return None
+
+    def list_snapshots(self, zone):
+        return list(self.zone_state(zone).get("snapshots", []))
+
+    def forget_zone(self, zone):
+        state = self.index["zones"].pop(zone, None)
+        if not state:
+            return 0
+        for snap_id in state["snapshots"]:
+            try:
+                os.remove(self.snapshot_path(zone, snap_id))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(os.path.join(self.store_path, zone))
+        except OSError:
+            pass
+        return 1
+
+    # Answers "which zones have X" from the index alone
+    #   - pattern: regular expression matched against each record value
+    #   - rr_type: optionally limit the search to a record type
+    def search(self, pattern, rr_type=False):
+        value_re = re.compile(pattern, re.IGNORECASE)
+        rr_type = rr_type.upper() if rr_type else False
+        results = []
+        for zone in sorted(self.index["zones"]):
+            for subname, rtype, records in self.index["zones"][zone].get("records", []):
+                if rr_type and rtype != rr_type:
+                    continue
+                for record in records:
+                    if value_re.search(record):
+                        results.append((zone, subname, rtype, record))
+        return results
+
+    def snapshot_path(self, zone, snap_id):
+        return os.path.join(self.store_path, zone, snap_id + ".json.gz")
+
+    # Utility functions
+    @staticmethod
+    def write_atomic(file_path, data):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + ".tmp" + str(os.getpid())
+        with open(tmp_path, "wb") as tmp_fh:
+            tmp_fh.write(data)
+        os.replace(tmp_path, file_path)
+
+    # Every provider's rrsets are reduced to sorted [subname, type, ttl, [records]]
+    #   - deSEC: {"subname", "type", "ttl", "records"}
+    #   - Gandi: {"rrset_name", "rrset_type", "rrset_ttl", "rrset_values"}
+    @staticmethod
+    def normalize_rrsets(rrsets):
+        normalized = []
+        for rr in rrsets:
+            if isinstance(rr, (list, tuple)):
+                subname, rtype, ttl, records = rr
+            elif "rrset_type" in rr:
+                subname = rr.get("rrset_name", "")
+                rtype, ttl, records = rr["rrset_type"], rr.get("rrset_ttl", 0), rr["rrset_values"]
+            else:
+                subname, rtype, ttl, records = rr.get("subname", ""), rr["type"], rr["ttl"], rr["records"]
+            if subname == "@":
+                subname = ""
+            normalized.append([subname, rtype.upper(), int(ttl or 0), sorted(records)])
+        normalized.sort(key=lambda rr: (rr[0], rr[1]))
+        return normalized
+
+    @staticmethod
+    def digest_rrsets(rrsets):
+        return hashlib.sha256(json.dumps(rrsets, separators=(",", ":")).encode()).hexdigest()
+
+    # Compares two sets of rrsets keyed by (subname, type)
+    @classmethod
+    def diff_rrsets(cls, old_rrsets, new_rrsets):
+        old_map = {(rr[0], rr[1]): rr for rr in cls.normalize_rrsets(old_rrsets or [])}
+        new_map = {(rr[0], rr[1]): rr for rr in cls.normalize_rrsets(new_rrsets or [])}
+        changes = {"added": [], "removed": [], "changed": []}
+
+        for key in sorted(new_map.keys() - old_map.keys()):
+            changes["added"].append(new_map[key])
+        for key in sorted(old_map.keys() - new_map.keys()):
+            changes["removed"].append(old_map[key])
+        for key in sorted(old_map.keys() & new_map.keys()):
+            if old_map[key] != new_map[key]:
+                changes["changed"].append([old_map[key], new_map[key]])
+        return changes
+
+    # A diff as flat records (One per added/removed/changed rrset) for NDJSON output
+    @staticmethod
+    def diff_records(changes):
+        for change in ("added", "removed"):
+            for subname, rtype, ttl, records in changes[change]:
+                yield {"change": change, "subname": subname, "type": rtype, "ttl": ttl, "records": records}
+        for old_rr, new_rr in changes["changed"]:
+            yield {"change": "changed", "subname": new_rr[0], "type": new_rr[1], \
+                "old": {"ttl": old_rr[2], "records": old_rr[3]}, "new": {"ttl": new_rr[2], "records": new_rr[3]}}
+
+    @staticmethod
+    def format_diff(zone, changes):
+        lines = []
+        for subname, rtype, ttl, records in changes["added"]:
+            for record in records:
+                lines.append("+ " + (subname or "@") + " " + str(ttl) + " " + rtype + " " + record)
+        for subname, rtype, ttl, records in changes["removed"]:
+            for record in records:
+                lines.append("- " + (subname or "@") + " " + str(ttl) + " " + rtype + " " + record)
+        for old_rr, new_rr in changes["changed"]:
+            name = (new_rr[0] or "@") + " "
+            for record in old_rr[3]:
+                if old_rr[2] != new_rr[2] or record not in new_rr[3]:
+                    lines.append("- " + name + str(old_rr[2]) + " " + old_rr[1] + " " + record)
+            for record in new_rr[3]:
+                if old_rr[2] != new_rr[2] or record not in old_rr[3]:
+                    lines.append("+ " + name + str(new_rr[2]) + " " + new_rr[1] + " " + record)
+        if not lines:
+            return "No differences in " + zone + "\n"
+        return "--- " + zone + "\n" + "\n".join(lines) + "\n"
+
+    # Renders rrsets as a BIND zone file
+    @classmethod
+    def export_bind(cls, zone, rrsets, default_ttl=3600):
+        origin = zone.rstrip(".") + "."
+        lines = ["; " + origin + " exported " + \
+            datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC"), \
+            "$ORIGIN " + origin, "$TTL " + str(default_ttl)]
+        rrsets = cls.normalize_rrsets(rrsets)
+        name_width = max([len(rr[0] or "@") for rr in rrsets] + [1])
+        for subname, rtype, ttl, records in rrsets:
+            for record in records:
+                lines.append((subname or "@").ljust(name_width) + "\t" + str(ttl) + \
+                    "\tIN\t" + rtype + "\t" + record)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	zoneTemplate.py - Compiles the deSEC rrset templates
+#   (dns/zone-templates/*.json) used by add-record &
+#   delete-record in manageDesecZone
+#
+#   Every template is checked locally before anything is
+#   sent - rrset shape, subnames, TTL bounds & the records
+#   of each type (A, AAAA, CNAME, MX, NS, SRV, TXT/SPF) -
+#   with all of its problems reported at once. Placeholders
+#   are split out when compiling, so expanding a template
+#   for a zone is only a join of precompiled parts
+#
+#   Compiled templates are cached by content, in-process &
+#   on disk, so an unchanged template is only checked once
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+#   - template: Template file(s) to check
+#   - zone: Show the template expanded for a zone
+#
+#   Layout:
+#       <cache_root>/<digest>.json (Compiled template)
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import ipaddress
+
+from zoneSnapshot import zoneSnapshotStore
+
+# Raised for a template that can't be used
+#   - problems: Every problem found, one per line
+#   - exit_code: What the CLI exits with
+class templateError(Exception):
+    def __init__(self, message, problems=None, exit_code=1):
+        super().__init__(message)
+        self.problems = problems or []
+        self.exit_code = exit_code
+
+    def __str__(self):
+        return "\n\t".join([super().__str__()] + self.problems)
+
+class zoneTemplate:
+
+    # Presets
+    cache_root = "~/.cache/nixkit/templates"
+    compiler_version = 1                # Bump when the checks change - Invalidates the cache
+    template_token = "<<DOMAIN>>"
+    probe_domain = "example.com"        # Stands in for the zone while checking records
+    min_ttl = 3600                      # deSEC's default minimum for a zone
+    max_ttl = 86400
+    max_txt_string = 255
+
+    # Compiled templates of this process, by digest
+    compiled = {}
+
+    valid_subname = re.compile(r"^(\*|(\*\.)?([a-z0-9_-]+\.)*[a-z0-9_-]+)?$")
+    valid_hostname = re.compile(r"^([a-zA-Z0-9_]([a-zA-Z0-9_-]{0,61}[a-zA-Z0-9_])?\.)+$")
+    valid_txt = re.compile(r'^"(?:[^"\\]|\\.)*"(?:\s+"(?:[^"\\]|\\.)*")*$')
+    txt_string = re.compile(r'"((?:[^"\\]|\\.)*)"')
+    placeholder = re.compile(r"<<[A-Za-z0-9_]+>>")
+
+    def __init__(self, rrsets, template_path="", digest=""):
+        # [subname parts, type, ttl, [record parts]] - Parts are joined with the zone
+        self.rrsets = rrsets
+        self.template_path = template_path
+        self.digest = digest
+
+    # Loads & compiles a template file, or returns its cached compilation
+    @classmethod
+    def load(cls, template_path, use_cache=True):
+        try:
+            with open(template_path, "rb") as template_fh:
+                template_data = template_fh.read()
+        except EnvironmentError as err:
+            raise templateError("Unable to open template '" + template_path + "' (" + str(err) + ")")
+
+        digest = hashlib.sha256((str(cls.compiler_version) + ":" + str(cls.min_ttl) + ":" + \
+            str(cls.max_ttl) + ":").encode() + template_data).hexdigest()
+        if digest in cls.compiled:
+            return cls(cls.compiled[digest], template_path, digest)
+
+        cache_path = os.path.join(os.path.expanduser(cls.cache_root), digest + ".json")
+        if use_cache:
+            try:
+                with open(cache_path, "r") as cache_fh:
+                    cls.compiled[digest] = json.load(cache_fh)
+                return cls(cls.compiled[digest], template_path, digest)
+            except (EnvironmentError, ValueError):
+                pass
+
+        try:
+            template_json = json.loads(template_data)
+        except ValueError as err:
+            raise templateError("Template '" + template_path + "' isn't valid JSON (" + str(err) + ")")
+        rrsets = cls.compile(template_json, template_path)
+        cls.compiled[digest] = rrsets
+        if use_cache:
+            try:
+                zoneSnapshotStore.write_atomic(cache_path, json.dumps(rrsets, separators=(",", ":")).encode())
+            except EnvironmentError:
+                pass                    # Only a cache - Compiled again next run
+        return cls(rrsets, template_path, digest)
+
+    # Checks every rrset & splits out the placeholders - Raises templateError with
+    #   all problems found
+    @classmethod
+    def compile(cls, template_json, template_path=""):
+        if not isinstance(template_json, list) or not template_json:
+            raise templateError("Template '" + template_path + "' must be a non-empty list of rrsets")
+
+        problems = []
+        rrsets = []
+        seen_types = {}
+        for rr_num, rr in enumerate(template_json, 1):
+            rr_problems = []
+            if not isinstance(rr, dict):
+                problems.append("rrset " + str(rr_num) + ": not an object")
+                continue
+            unknown = sorted(set(rr) - {"subname", "type", "ttl", "records"})
+            if unknown:
+                rr_problems.append("unknown field(s) " + ", ".join(unknown))
+
+            subname, rtype, ttl, records = rr.get("subname", ""), rr.get("type"), rr.get("ttl"), rr.get("records")
+            if not isinstance(subname, str):
+                rr_problems.append("subname must be a string")
+                subname = ""
+            elif not cls.valid_subname.match(subname.replace(cls.template_token, "probe")):
+                rr_problems.append("invalid subname '" + subname + "'")
+            if not isinstance(rtype, str) or not rtype.isalnum() or not rtype.isupper():
+                rr_problems.append("type must be an upper-case record type")
+                rtype = ""
+            if isinstance(ttl, bool) or not isinstance(ttl, int):
+                rr_problems.append("ttl must be a whole number")
+            elif not cls.min_ttl <= ttl <= cls.max_ttl:
+                rr_problems.append("ttl " + str(ttl) + " outside " + str(cls.min_ttl) + "-" + str(cls.max_ttl))
+            if not isinstance(records, list) or not records or \
+                not all(isinstance(record, str) for record in records):
+                rr_problems.append("records must be a non-empty list of strings")
+                records = []
+            elif len(set(records)) != len(records):
+                rr_problems.append("duplicate records")
+
+            for record in records:
+                rr_problems.extend(cls.check_placeholders(record))
+                record_problem = cls.check_record(rtype, record.replace(cls.template_token, cls.probe_domain))
+                if record_problem:
+                    rr_problems.append(record_problem + " '" + record + "'")
+
+            if rtype:
+                subname_types = seen_types.setdefault(subname, [])
+                if rtype in subname_types:
+                    rr_problems.append("duplicate rrset (Merge its records into one)")
+                subname_types.append(rtype)
+                if rtype == "CNAME":
+                    if not subname:
+                        rr_problems.append("CNAME can't be at the zone apex")
+                    if len(records) > 1:
+                        rr_problems.append("CNAME must have a single record")
+
+            if rr_problems:
+                problems.extend("rrset " + str(rr_num) + " (" + (subname or "@") + " " + str(rtype) + "): " + \
+                    rr_problem for rr_problem in rr_problems)
+                continue
+            rrsets.append([subname.split(cls.template_token), rtype, ttl, \
+                [record.split(cls.template_token) for record in records]])
+
+        for subname, subname_types in seen_types.items():
+            if "CNAME" in subname_types and len(subname_types) > 1:
+                problems.append((subname or "@") + ": CNAME can't share a name with " + \
+                    ", ".join(rtype for rtype in subname_types if rtype != "CNAME"))
+
+        if problems:
+            raise templateError("Template '" + template_path + "' has " + str(len(problems)) + " problem(s)", \
+                problems)
+        return rrsets
+
+    # Returns a problem with a record of a type (Placeholders already substituted), or ""
+    @classmethod
+    def check_record(cls, rtype, record):
+        fields = record.split()
+        if rtype in ("A", "AAAA"):
+            try:
+                if ipaddress.ip_address(record).version != (4 if rtype == "A" else 6):
+                    return "not an IPv" + ("4" if rtype == "A" else "6") + " address"
+            except ValueError:
+                return "invalid address"
+        elif rtype in ("CNAME", "NS", "DNAME", "PTR"):
+            if len(fields) != 1 or not cls.valid_hostname_fqdn(record):
+                return "target must be a fully qualified name ending in '.'"
+        elif rtype == "MX":
+            if len(fields) != 2 or not cls.valid_uint16(fields[0]):
+                return "must be '<preference> <exchange>.'"
+            if fields[1] != "." and not cls.valid_hostname_fqdn(fields[1]):     # '.' - Null MX
+                return "exchange must be a fully qualified name ending in '.'"
+        elif rtype == "SRV":
+            if len(fields) != 4 or not all(cls.valid_uint16(field) for field in fields[:3]):
+                return "must be '<priority> <weight> <port> <target>.'"
+            if fields[3] != "." and not cls.valid_hostname_fqdn(fields[3]):     # '.' - Service not offered
+                return "target must be a fully qualified name ending in '.'"
+        elif rtype in ("TXT", "SPF"):
+            if not cls.valid_txt.match(record):
+                return "must be one or more double-quoted strings (Escape inner quotes as \\\")"
+            if any(len(txt_string.encode()) > cls.max_txt_string for txt_string in cls.txt_string.findall(record)):
+                return "has a string over " + str(cls.max_txt_string) + " bytes (Split it into several quoted strings)"
+        return ""
+
+    @classmethod
+    def check_placeholders(cls, value):
+        return ["unknown placeholder " + token for token in cls.placeholder.findall(value) \
+            if token != cls.template_token]
+
+    # Expands the compiled template for a zone, as deSEC rrsets
+    def expand(self, zone, with_records=True):
+        zone = zone.rstrip(".").lower()
+        if not self.valid_hostname_fqdn(zone + "."):
+            raise templateError("Invalid zone '" + zone + "'")
+        return [{"subname": zone.join(subname), "type": rtype, "ttl": ttl, \
+            "records": [zone.join(record) for record in records] if with_records else []} \
+            for subname, rtype, ttl, records in self.rrsets]
+
+    # Utility functions
+    @classmethod
+    def valid_hostname_fqdn(cls, hostname):
+        return len(hostname) <= 254 and bool(cls.valid_hostname.match(hostname))
+
+    @staticmethod
+    def valid_uint16(value):
+        return value.isdigit() and int(value) <= 65535
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    ZTC_ARGV = argparse.ArgumentParser(description="Check deSEC rrset templates without touching the API")
+
+    ZTC_ARGV.add_argument('template', nargs='+', help="Template file(s) to check")
+    ZTC_ARGV.add_argument('--zone', '-z', help='Show the template(s) expanded for a zone')
+    ZTC_ARGV.add_argument('--no-cache', dest="use_cache", action="store_false", \
+        help="Check again, even if unchanged since the last check")
+
+    ZTC_ARGV = ZTC_ARGV.parse_args()
+    ZTC_FAILED = 0
+    try:
+        for ZTC_PATH in ZTC_ARGV.template:
+            try:
+                ZTC_TEMPLATE = zoneTemplate.load(ZTC_PATH, ZTC_ARGV.use_cache)
+                if ZTC_ARGV.zone:
+                    print(json.dumps(ZTC_TEMPLATE.expand(ZTC_ARGV.zone), indent=4))
+                else:
+                    print(ZTC_PATH + " :: OK (" + str(len(ZTC_TEMPLATE.rrsets)) + " rrset(s))")
+            except templateError as err:
+                sys.stderr.write(str(err) + "\n")
+                ZTC_FAILED = err.exit_code
+        sys.stdout.flush()
+    except BrokenPipeError:
+        sys.exit(0)                 # Reader went away (ie. | head)
+    sys.exit(ZTC_FAILED)
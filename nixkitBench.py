@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	nixkitBench.py - What the nixkit benchmarks share
+#   (benchmarkDnsApi.py & benchmarkWgEnroll.py): quiet
+#   calls, peak memory, the results table & regression
+#   checks against a saved baseline
+#
+#   A benchmark subclasses nixkitBenchmark, sets its
+#   columns & tolerances and fills in run()
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+#   Results:
+#       {"created", "python", ..., "results": {"<name>@<size>": {"status", "wall_s",
+#           "peak_kib", ...}}}
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import json
+import tracemalloc
+import contextlib
+
+class nixkitBenchmark:
+
+    # Presets
+    time_tolerance = 1.5            # Slow-down ratio before wall time counts as a regression
+    time_floor = 0.05               # ...ignoring differences smaller than this (seconds)
+    memory_tolerance = 1.5
+    memory_floor = 256              # KiB
+
+    # Results table :: (Heading, width) of the name, then (Heading, result field, width)
+    #   per column & the baseline fields noted after each row as (Field, unit)
+    name_column = ("Operation", 36)
+    result_columns = (("Wall (s)", "wall_s", 10), ("Peak (KiB)", "peak_kib", 12))
+    baseline_fields = (("wall_s", "s"), ("peak_kib", "KiB"))
+    op_noun = "operation"
+
+    # Runs a benchmarked call with its output discarded - Returns "ok" or what went wrong
+    @classmethod
+    def call_quietly(cls, op_call, *op_args):
+        if not op_call:
+            return "ok"
+        with open(os.devnull, "w") as null_fh, contextlib.redirect_stdout(null_fh), \
+            contextlib.redirect_stderr(null_fh):
+            try:
+                op_return = op_call(*op_args)
+            except SystemExit as err:
+                return "error: exit " + str(err.code)
+            except Exception as err:
+                return "error: " + type(err).__name__ + ": " + str(err)
+        if op_return is not None and not op_return:
+            return "error: " + cls.op_noun + " failed"
+        return "ok"
+
+    # Peak (Python) memory of a call in KiB - On its own pass, as tracemalloc slows
+    #   everything it watches
+    @classmethod
+    def peak_memory(cls, op_call, *op_args):
+        tracemalloc.start()
+        try:
+            cls.call_quietly(op_call, *op_args)
+            return round(tracemalloc.get_traced_memory()[1] / 1024.0, 1)
+        finally:
+            tracemalloc.stop()
+
+    # Compares a run against the baseline - Returns a list of regression messages
+    def compare(self, baseline, current):
+        regressions = []
+        for result_key, result in sorted(current["results"].items()):
+            base = baseline.get("results", {}).get(result_key)
+            if not base:
+                continue
+            if base["status"] == "ok" and result["status"] != "ok":
+                regressions.append(result_key + ": now failing (" + result["status"] + ")")
+            if result.get("requests", 0) > base.get("requests", 0):
+                regressions.append(result_key + ": requests " + str(base["requests"]) + \
+                    " -> " + str(result["requests"]))
+            if self.grew(base.get("wall_s"), result.get("wall_s"), self.time_tolerance, self.time_floor):
+                regressions.append(result_key + ": wall time " + str(base["wall_s"]) + \
+                    "s -> " + str(result["wall_s"]) + "s")
+            if self.grew(base.get("peak_kib"), result.get("peak_kib"), self.memory_tolerance, \
+                self.memory_floor):
+                regressions.append(result_key + ": peak memory " + str(base["peak_kib"]) + \
+                    "KiB -> " + str(result["peak_kib"]) + "KiB")
+        return regressions
+
+    @staticmethod
+    def grew(base_value, new_value, tolerance, floor):
+        if base_value is None or new_value is None:
+            return False
+        return new_value > base_value * tolerance and new_value - base_value > floor
+
+    @classmethod
+    def format_results(cls, current, baseline=False):
+        base_results = (baseline or {}).get("results", {})
+        name_heading, name_width = cls.name_column
+        row_format = "%-" + str(name_width) + "s" + \
+            "".join(" %" + str(col_width) + "s" for heading, field, col_width in cls.result_columns) + "  %s"
+        lines = [row_format % ((name_heading,) + tuple(heading for heading, field, col_width \
+            in cls.result_columns) + ("Status",))]
+        for result_key, result in current["results"].items():
+            line = row_format % ((result_key,) + tuple(result.get(field, "-") for heading, field, col_width \
+                in cls.result_columns) + (result["status"],))
+            if result_key in base_results and "wall_s" in base_results[result_key]:
+                line += "  (Baseline: " + ", ".join(str(base_results[result_key].get(field, "-")) + unit \
+                    for field, unit in cls.baseline_fields) + ")"
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    # Baseline files
+    @staticmethod
+    def load_baseline(baseline_path):
+        baseline_path = os.path.expanduser(baseline_path)
+        if not os.path.exists(baseline_path):
+            return {}
+        with open(baseline_path, "r") as baseline_fh:
+            return json.load(baseline_fh)
+
+    @staticmethod
+    def save_baseline(baseline_path, results):
+        baseline_path = os.path.expanduser(baseline_path)
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as baseline_fh:
+            json.dump(results, baseline_fh, indent=4)
+        return baseline_path
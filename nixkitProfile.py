@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	nixkitProfile.py - Shared --profile instrumentation for
+#   the nixkit Python tools
+#
+#   Records timed spans for start-up & imports, config
+#   loads, every HTTP request (Method, URL template, status,
+#   bytes & latency, with its DNS, connect & TLS time),
+#   every subprocess & output rendering. A summary table is
+#   written to stderr on exit & the spans can be dumped as
+#   a Chrome trace (chrome://tracing, Perfetto) or the run
+#   as cProfile stats
+#
+#   Nothing is patched until a tool calls enable() - While
+#   disabled, span() hands back one shared no-op context
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+#   - profile: Print the summary table on exit
+#   - profile_out: Also dump to this file - Chrome trace
+#       JSON if it ends in .json, otherwise cProfile stats
+#       (Read with pstats / snakeviz)
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# Taken as early as the tools import this - Everything they load after it is 'import'
+import_start = time.perf_counter()
+
+# Stands in for every span while profiling is off
+class nullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+class profileSpan:
+    __slots__ = ("profiler", "category", "name", "fields", "start")
+
+    def __init__(self, profiler, category, name, fields):
+        self.profiler = profiler
+        self.category = category
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.profiler.record(self.category, self.name, self.start, time.perf_counter(), self.fields)
+        return False
+
+    # Fields only known once the work is done (ie. a status)
+    def set(self, **fields):
+        self.fields.update(fields)
+
+class nixkitProfiler:
+
+    # Presets
+    enabled = False
+    null_span = nullSpan()
+    # Summary order - Anything else follows
+    categories = ("startup", "import", "config", "lock", "ratelimit", "allocate", "keygen", "dns", "connect", "tls", \
+        "http", "smtp", "subprocess", "render", "commit")
+
+    def __init__(self):
+        self.spans = []                 # (category, name, start, end, thread id, fields)
+        self.tool = ""
+        self.dump_path = False
+        self.run_start = import_start
+        self.cprofile = None
+
+    # Adds --profile & --profile-out to a tool's parser
+    @staticmethod
+    def add_arguments(arg_parser):
+        arg_parser.add_argument('--profile', action="store_true", \
+            help="Time imports, config, HTTP, subprocesses & rendering (Summary on stderr)")
+        arg_parser.add_argument('--profile-out', \
+            help="Also dump the profile - Chrome trace if it ends in .json, otherwise cProfile stats")
+
+    # Enables profiling if the parsed arguments ask for it
+    def from_args(self, parsed_args, tool):
+        if parsed_args.profile or parsed_args.profile_out:
+            self.enable(tool, parsed_args.profile_out)
+
+    def enable(self, tool, dump_path=False):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.tool = tool
+        self.dump_path = dump_path
+        enable_time = time.perf_counter()
+
+        # Interpreter start-up is only known from the kernel's record of the process
+        process_start = self.process_start()
+        if process_start is not None and process_start < import_start:
+            self.run_start = process_start
+            self.record("startup", "interpreter", process_start, import_start, {})
+        self.record("import", tool, import_start, enable_time, {"modules": len(sys.modules)})
+
+        self.install_hooks()
+        if dump_path and not dump_path.endswith(".json"):
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        atexit.register(self.finish)
+
+    def span(self, category, name="", **fields):
+        if not self.enabled:
+            return self.null_span
+        return profileSpan(self, category, name, fields)
+
+    def record(self, category, name, start, end, fields):
+        self.spans.append((category, name, start, end, threading.get_ident(), fields))
+
+    # Process start on the perf_counter clock (Linux only, to the kernel's clock tick)
+    @staticmethod
+    def process_start():
+        try:
+            with open("/proc/self/stat", "r") as stat_file:
+                start_ticks = int(stat_file.read().rsplit(")", 1)[1].split()[19])
+            boot_now = time.clock_gettime(time.CLOCK_BOOTTIME)
+        except (OSError, IndexError, ValueError, AttributeError):
+            return None
+        return time.perf_counter() - (boot_now - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+    #   Hooks
+    # Wrapped at the library level, so calls made anywhere in the tool (Or its
+    #   siblings) are traced without them knowing
+    def install_hooks(self):
+        import ssl
+        import socket
+        import subprocess
+        import urllib.request
+
+        self.wrap(socket, "getaddrinfo", lambda host, port, *args, **kwargs: ("dns", str(host), {}))
+        self.wrap(socket.socket, "connect", self.connect_span)
+        self.wrap(ssl.SSLSocket, "do_handshake", \
+            lambda ssl_sock, *args: ("tls", str(ssl_sock.server_hostname), {}))
+        self.wrap(subprocess, "run", self.subprocess_span, self.subprocess_result)
+        self.wrap(urllib.request.OpenerDirector, "open", self.urllib_span, self.urllib_result)
+        if "requests" in sys.modules:
+            self.wrap(sys.modules["requests"].Session, "send", self.requests_span, self.requests_result)
+
+    # Replaces owner.attr with a timed version
+    #   - describe: (call args) -> (category, name, fields), or None to skip the call
+    #   - result: (call result, fields) - Adds what the result tells
+    def wrap(self, owner, attr, describe, result=None):
+        original = getattr(owner, attr)
+        profiler = self
+
+        def traced(*args, **kwargs):
+            span_info = describe(*args, **kwargs)
+            if span_info is None:
+                return original(*args, **kwargs)
+            category, name, fields = span_info
+            start = time.perf_counter()
+            try:
+                call_result = original(*args, **kwargs)
+            except Exception as err:
+                fields["error"] = type(err).__name__
+                if hasattr(err, "code") and isinstance(err.code, int):
+                    fields["status"] = err.code         # urllib's HTTPError
+                profiler.record(category, name, start, time.perf_counter(), fields)
+                raise
+            if result:
+                result(call_result, fields)
+            profiler.record(category, name, start, time.perf_counter(), fields)
+            return call_result
+
+        traced.__wrapped__ = original
+        setattr(owner, attr, traced)
+
+    # Only TCP connects - The UDP 'connects' used for route probes send nothing
+    @staticmethod
+    def connect_span(sock, address):
+        import socket
+        if sock.type != socket.SOCK_STREAM or not isinstance(address, tuple):
+            return None
+        return ("connect", str(address[0]) + ":" + str(address[1]), {})
+
+    @staticmethod
+    def subprocess_span(cmd_args, *args, **kwargs):
+        if isinstance(cmd_args, (list, tuple)):
+            cmd_name = " ".join(str(cmd_arg) for cmd_arg in cmd_args[:2])
+        else:
+            cmd_name = " ".join(str(cmd_args).split()[:2])
+        return ("subprocess", cmd_name, {})
+
+    @staticmethod
+    def subprocess_result(completed, fields):
+        fields["returncode"] = completed.returncode
+
+    def requests_span(self, http_session, prepared_req, **kwargs):
+        return ("http", prepared_req.method + " " + self.url_template(prepared_req.url), \
+            {"method": prepared_req.method, "url": self.url_template(prepared_req.url), \
+            "sent": len(prepared_req.body or b""), "stream": bool(kwargs.get("stream"))})
+
+    @staticmethod
+    def requests_result(http_resp, fields):
+        fields["status"] = http_resp.status_code
+        if fields.pop("stream"):
+            fields["bytes"] = int(http_resp.headers.get("Content-Length", 0) or 0)
+        else:
+            fields["bytes"] = len(http_resp.content)
+        fields["ttfb_ms"] = round(http_resp.elapsed.total_seconds() * 1000, 3)
+
+    def urllib_span(self, opener, full_url, data=None, *args, **kwargs):
+        if isinstance(full_url, str):
+            method, url = ("POST" if data is not None else "GET"), full_url
+        else:
+            method, url = full_url.get_method(), full_url.full_url
+        return ("http", method + " " + self.url_template(url), \
+            {"method": method, "url": self.url_template(url), "sent": len(data or b"")})
+
+    @staticmethod
+    def urllib_result(url_resp, fields):
+        fields["status"] = url_resp.status
+        fields["bytes"] = int(url_resp.headers.get("Content-Length", 0) or 0)
+
+    # Groups requests by endpoint & keeps secrets out of the trace :: Query values,
+    #   domains, numeric IDs & token-like path segments become placeholders
+    @staticmethod
+    def url_template(url):
+        url, has_query, query = url.partition("?")
+        scheme, has_scheme, rest = url.partition("://")
+        if not has_scheme:
+            scheme, rest = "", url
+        host, slash, path = rest.partition("/")
+        url_parts = []
+        for segment in path.split("/"):
+            if "." in segment:
+                segment = "{name}"
+            elif len(segment) >= 24 or (len(segment) >= 6 and any(char.isdigit() for char in segment)):
+                segment = "{id}"
+            url_parts.append(segment)
+        templated = (scheme + has_scheme) + host + slash + "/".join(url_parts)
+        if has_query:
+            templated += "?" + "&".join(param.partition("=")[0] + "={}" \
+                for param in query.split("&") if param)
+        return templated
+
+    #   Output
+    def finish(self):
+        if self.cprofile:
+            self.cprofile.disable()
+        run_end = time.perf_counter()
+        try:
+            self.write_summary(run_end, sys.stderr)
+            if self.dump_path:
+                if self.cprofile:
+                    self.cprofile.dump_stats(self.dump_path)
+                else:
+                    self.dump_trace(self.dump_path)
+                sys.stderr.write("Profile written to " + self.dump_path + "\n")
+        except (OSError, ValueError) as err:
+            sys.stderr.write("Unable to write profile: " + str(err) + "\n")
+
+    # Per category, then per HTTP endpoint - Categories nest (ie. http holds its
+    #   dns/connect/tls), so 'untraced' is the run time no span covered at all
+    def write_summary(self, run_end, out_stream):
+        run_time = run_end - self.run_start
+        by_category = {}
+        by_endpoint = {}
+        for category, name, start, end, thread_id, fields in self.spans:
+            by_category.setdefault(category, []).append(end - start)
+            if category == "http":
+                endpoint = by_endpoint.setdefault(name, {"times": [], "status": set(), "bytes": 0})
+                endpoint["times"].append(end - start)
+                endpoint["status"].add(str(fields.get("status", fields.get("error", "-"))))
+                endpoint["bytes"] += fields.get("bytes", 0)
+
+        summary = ["", "Profile :: " + self.tool + " :: " + self.format_ms(run_time) + " total", ""]
+        summary.append("%-12s %6s %11s %11s %11s %6s" % ("Span", "Count", "Total", "Mean", "Max", "Run%"))
+        ordered = [category for category in self.categories if category in by_category] + \
+            sorted(category for category in by_category if category not in self.categories)
+        for category in ordered + ["untraced"]:
+            if category == "untraced":
+                times = [max(0.0, run_time - self.covered_time(run_end))]
+            else:
+                times = by_category[category]
+            summary.append("%-12s %6d %11s %11s %11s %5.1f%%" % (category, len(times), \
+                self.format_ms(sum(times)), self.format_ms(sum(times) / len(times)), \
+                self.format_ms(max(times)), 100 * sum(times) / run_time if run_time else 0))
+
+        if by_endpoint:
+            name_width = min(100, max(len(endpoint) for endpoint in by_endpoint))
+            summary += ["", "%-*s %6s %11s %11s %10s  %s" % (name_width, "HTTP request", "Count", "Total", \
+                "Mean", "Bytes", "Status")]
+            for endpoint, stats in sorted(by_endpoint.items(), key=lambda item: -sum(item[1]["times"])):
+                summary.append("%-*s %6d %11s %11s %10d  %s" % (name_width, endpoint[:name_width], \
+                    len(stats["times"]), self.format_ms(sum(stats["times"])), \
+                    self.format_ms(sum(stats["times"]) / len(stats["times"])), stats["bytes"], \
+                    ",".join(sorted(stats["status"]))))
+        out_stream.write("\n".join(summary) + "\n")
+        out_stream.flush()
+
+    # Time covered by the union of every span
+    def covered_time(self, run_end):
+        covered = 0.0
+        cover_start = cover_end = None
+        for start, end in sorted((span[2], min(span[3], run_end)) for span in self.spans):
+            if cover_end is None or start > cover_end:
+                if cover_end is not None:
+                    covered += cover_end - cover_start
+                cover_start, cover_end = start, end
+            else:
+                cover_end = max(cover_end, end)
+        if cover_end is not None:
+            covered += cover_end - cover_start
+        return covered
+
+    # Chrome trace event format ('Complete' events, microseconds from the run start)
+    def dump_trace(self, dump_path):
+        pid = os.getpid()
+        trace_events = [{"name": name or category, "cat": category, "ph": "X", "pid": pid, "tid": thread_id, \
+            "ts": round((start - self.run_start) * 1e6, 3), "dur": round((end - start) * 1e6, 3), \
+            "args": fields} for category, name, start, end, thread_id, fields in self.spans]
+        with open(dump_path, "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms", \
+                "otherData": {"tool": self.tool}}, trace_file)
+
+    @staticmethod
+    def format_ms(seconds):
+        return "%.2fms" % (seconds * 1000)
+
+# One per process, shared by every tool loaded into it
+profiler = nixkitProfiler()
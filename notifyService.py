@@ -9,11 +9,16 @@
 #	    Date: 25-Jan-2022        Version: 1.0
 #
 #	    0.7 - Migration + major refactor
+#	    0.8 - Failures raised as notifyError (No exits outside the CLI),
+#	          in-process messages & shared HTTP session (See runJobs.py)
+#	    0.9 - --profile timing of config, HTTP & SMTP calls (See nixkitProfile.py)
 #
 #   - conf: Configuration file to use
 #   - dry_run: Perform a dry-run of the notifications
 #   - initialize: generate a blank .conf file with all
 #       supported methods included
+#   - message: Message text to send (In-process use - Skips
+#       the contents file & stdin)
 #
 #   TODOS:
 #       - Create Discord method JSON templating
@@ -26,20 +31,37 @@
 import sys
 import configparser
 import argparse
+
+from nixkitProfile import profiler
+
 import smtplib
 import requests
 
 from email.message import EmailMessage
 
+# Raised in place of exiting, so the class can be used in-process
+#   - exit_code: What the CLI exits with
+class notifyError(Exception):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
+
 class notifyServices:
-    def __init__(self, notif_contents, notif_file='notifyServices.conf', init_conf=False, dry_run=False):
+    def __init__(self, notif_contents, notif_file='notifyServices.conf', init_conf=False, dry_run=False, \
+        message=False, http_session=False):
+
+        # Method name -> whether it ran successfully
+        self.results = {}
+        self.http_session = http_session or requests
 
-        if notif_contents:
+        if message:
+            notif_contents = message
+        elif notif_contents:
             try:
-                contents_file = open(notif_contents, "r")
+                with profiler.span("config", "message file"), open(notif_contents, "r") as contents_file:
+                    notif_contents = contents_file.read()
             except OSError:
-                print("Unable to open the message file")
-            notif_contents = contents_file.read()
+                raise notifyError("Unable to open the message file", 2)
             print("msg read from file: " + notif_contents)
         elif sys.stdin:
             # Stops empty/blank commands from hanging waiting on user-input
@@ -48,30 +70,29 @@ class notifyServices:
                 print("stin at runtime: " + notif_contents)
 
         if init_conf:
-            if self.initialize_configuration(notif_file):
-                sys.exit(0)
-            else:
-                sys.exit(1)
+            if not self.initialize_configuration(notif_file):
+                raise notifyError("Unable to create blank configuration file")
+            return
 
         if not notif_contents:
-            print("Empty message")
-            sys.exit(2)
+            raise notifyError("Empty message", 2)
 
         try:
             conf_handle = open(notif_file, "r")
         except OSError:
-            print("Unable to open existing configuration '" + notif_file + "'")
-            sys.exit(2)
-        cnf_objs = self.parse_notification_config(conf_handle)
+            raise notifyError("Unable to open existing configuration '" + notif_file + "'", 2)
+        with profiler.span("config", notif_file):
+            cnf_objs = self.parse_notification_config(conf_handle)
 
         # This is the dynamically-calling brain of this thing, don't fuck with it
         for method in cnf_objs.sections():
             fcmd = "notify_" + method.lower()   # Function Method
-            func_method = getattr(self, fcmd)
-            if hasattr(self, fcmd) and callable(func_method):
+            func_method = getattr(self, fcmd, None)
+            if callable(func_method):
                 # Le meat'n'potatos
                 print("Calling method " + fcmd)
-                if func_method(dict(cnf_objs.items(method)), notif_contents):
+                self.results[method.lower()] = bool(func_method(dict(cnf_objs.items(method)), notif_contents))
+                if self.results[method.lower()]:
                     print(method.lower() + " notification ran successfully")
                 else:
                     print(method.lower() + " notification did not run correctly")
@@ -154,34 +175,35 @@ class notifyServices:
             except OSError:
                 print("Unable to open template file (" + opt_dict['template'] + ")")
                 return False
-            eml_content_html = tmpl_file.read()
-            eml_content_html = eml_content_html.replace(cont_token, msg)
-            notif_email.add_alternative(eml_content_html, subtype="html")
+            with profiler.span("render", "email template"):
+                eml_content_html = tmpl_file.read()
+                eml_content_html = eml_content_html.replace(cont_token, msg)
+                notif_email.add_alternative(eml_content_html, subtype="html")
 
         # Wrap some detection logic around this [TBD]
         conn_details = opt_dict['mail_host'].split(":")
 
         print("Connecting to mail server '" + conn_details[0] + "' on port '" + conn_details[1] +"'")
-        email_sndr = smtplib.SMTP(conn_details[0], int(conn_details[1]))
-
-        if 'username' in opt_dict and 'password' in opt_dict:
-            try:
-                email_sndr.login(opt_dict['username'], opt_dict['password'])
-            except (SMTPHeloError, SMTPAuthenticationError):
-                print("Unable to log into remote mail server to send message")
-                return False
-
-        email_sndr.send_message(notif_email)
-        email_sndr.quit()
+        with profiler.span("smtp", conn_details[0]):
+            email_sndr = smtplib.SMTP(conn_details[0], int(conn_details[1]))
+
+            if 'username' in opt_dict and 'password' in opt_dict:
+                try:
+                    email_sndr.login(opt_dict['username'], opt_dict['password'])
+                except (smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError):
+                    print("Unable to log into remote mail server to send message")
+                    return False
+
+            email_sndr.send_message(notif_email)
+            email_sndr.quit()
         return True
 
 
-    @classmethod
-    def notify_discord(cls, opt_dict, msg):
+    def notify_discord(self, opt_dict, msg):
         print("Running Discord notification...")
         discord_base_url = "https://discord.com/api/webhooks/"
 
-        if not cls.validate_required_params(['webhook_id', 'webhook_token'], opt_dict):
+        if not self.validate_required_params(['webhook_id', 'webhook_token'], opt_dict):
             print("Required values not provided, exiting")
             return False
         elif not msg:
@@ -192,10 +214,11 @@ class notifyServices:
         # req_headers = { 'Content-Type': 'application/json' }
         req_body = {'content': msg}
 
-        wh_request = requests.post(webhook_url, json=req_body)
+        wh_request = self.http_session.post(webhook_url, json=req_body)
 
-        if wh_request.status_code != requests.codes.ok:
-            print("Discord notification failure (" + wh_request.status_code + ")")
+        # Webhooks answer 204 (No Content) unless asked to wait for the message
+        if wh_request.status_code not in (requests.codes.ok, requests.codes.no_content):
+            print("Discord notification failure (" + str(wh_request.status_code) + ")")
             print(wh_request.text)
             return False
 
@@ -216,21 +239,31 @@ class notifyServices:
             file_notif_handle = open(opt_dict["file_path"], "a")
         except OSError:
             print("Unable to create or open '" + opt_dict["file_path"] + "' for writing")
-            sys.exit(1)
+            return False
 
         file_notif_handle.write(msg + "\n")
         file_notif_handle.close()
+        return True
 
-NSV_ARGC = argparse.ArgumentParser(description="Perform an automated notification across services")
-
-NSV_ARGC.add_argument('--file', '-f', default='notifyServices.conf', \
-    help="Configuration file + methods to notifiy with")
-NSV_ARGC.add_argument('--contents', '-c', \
-    help="Notify using file contents instead of stdin")
-NSV_ARGC.add_argument('--initialize', default=False, action='store_true', \
-    help='Initize a blank configuration to use')
-NSV_ARGC.add_argument('--dry_run', default=False, \
-    help='Perform a notification dry-run')
-
-NSV_ARGV = NSV_ARGC.parse_args()
-NSV_OBJ = notifyServices(NSV_ARGV.contents, NSV_ARGV.file, NSV_ARGV.initialize, NSV_ARGV.dry_run)
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    NSV_ARGC = argparse.ArgumentParser(description="Perform an automated notification across services")
+
+    NSV_ARGC.add_argument('--file', '-f', default='notifyServices.conf', \
+        help="Configuration file + methods to notifiy with")
+    NSV_ARGC.add_argument('--contents', '-c', \
+        help="Notify using file contents instead of stdin")
+    NSV_ARGC.add_argument('--initialize', default=False, action='store_true', \
+        help='Initize a blank configuration to use')
+    NSV_ARGC.add_argument('--dry_run', default=False, \
+        help='Perform a notification dry-run')
+    profiler.add_arguments(NSV_ARGC)
+
+    NSV_ARGV = NSV_ARGC.parse_args()
+    profiler.from_args(NSV_ARGV, "notifyService")
+    try:
+        NSV_OBJ = notifyServices(NSV_ARGV.contents, NSV_ARGV.file, NSV_ARGV.initialize, NSV_ARGV.dry_run)
+    except notifyError as err:
+        sys.stderr.write(str(err) + "\n")
+        sys.exit(err.exit_code)
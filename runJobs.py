@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	runJobs.py - Runs a job file of nixkit operations
+#   (deSEC, Gandi, Wireguard enrollment/peers & service
+#   notifications) in a single process
+#
+#   A step runs once every step it is 'after' has succeeded,
+#   independent steps run in parallel on a thread pool. HTTP
+#   sessions are shared per provider, so connections (And
+#   their TLS sessions) are reused from step to step. Each
+#   step's output is captured & failures come back as
+#   results - Nothing a step does exits the runner
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - NDJSON steps (Records parsed into 'data')
+#	    1.2 - Gandi bulk registration steps (Never prompt - 'yes' to register)
+#	    1.3 - deSEC templates checked with the job, before any step runs
+#
+#   - job: YAML (Needs PyYAML) or JSON job file
+#   - workers: Steps run at once (Default: job's 'workers', 4)
+#   - json: Return results in JSON
+#
+#   Job file:
+#       workers: 4
+#       defaults:                   # Merged into every step of a tool
+#         desec: {key: "..."}
+#       steps:
+#         - {id: zones, tool: desec, action: list-zone, json: true}
+#         - {id: laptop, tool: wg-enroll, name: laptop, out_dir: /root/clients}
+#         - {id: tell, tool: notify, after: [laptop], conf: notify.conf,
+#            message: "laptop enrolled"}
+#
+#   Tools & step fields (Matching each tool's CLI):
+#       desec: action, zone, key, template, json|ndjson, from, to, type
+#       gandi: action, zone, key, json|ndjson, debug, from, to, type,
+#           batch, yes, dry_run, rate
+#       wg-enroll: name, server, conf, port, out_dir, formats, apply
+#       wg-batch: manifest, server, conf, port, out_dir, formats, apply
+#       wg-peers: action, query, conf, json|ndjson, apply
+#       notify: message | contents, conf
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Every tool imports its siblings directly
+NIXKIT_DIR = os.path.dirname(os.path.abspath(__file__))
+for NIXKIT_TOOL_DIR in ("dns", "wireguard"):
+    sys.path.insert(1, os.path.join(NIXKIT_DIR, NIXKIT_TOOL_DIR))
+
+import requests
+
+from notifyService import notifyServices
+from manageDesecZone import manageDesecZone
+from manageGandiZone import manageGandiZone
+from zoneTemplate import zoneTemplate, templateError
+from enrollWgClient import enrollWireguardClient, enrollWireguardBatch, enrollError
+from manageWgPeers import manageWireguardPeers
+
+# For YAML job files
+try:
+    import yaml
+    yaml_module = True
+except ModuleNotFoundError:
+    yaml_module = False
+
+# Sends writes to the buffer of whichever step the writing thread is running, or
+#   to the real stream outside of steps
+class threadOutput:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        step_output = self.local.buffer.getvalue()
+        self.local.buffer = None
+        return step_output
+
+    def write(self, text):
+        step_buffer = getattr(self.local, "buffer", None)
+        return (self.stream if step_buffer is None else step_buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class nixkitJobRunner:
+
+    # Presets
+    workers = 4
+    serial_tools = ("wg-enroll", "wg-batch", "wg-peers")     # Enrollment keeps class-level state
+    session_pool = 8                    # Connections kept open per host & provider
+
+    # tool -> (Required fields, optional fields)
+    step_fields = {
+        "desec": (("action",), ("zone", "key", "template", "json", "ndjson", "from", "to", "type")),
+        "gandi": (("action",), ("zone", "key", "json", "ndjson", "debug", "from", "to", "type", "batch", "yes", \
+            "dry_run", "rate")),
+        "wg-enroll": (("name",), ("server", "conf", "port", "out_dir", "formats", "apply")),
+        "wg-batch": (("manifest",), ("server", "conf", "port", "out_dir", "formats", "apply")),
+        "wg-peers": (("action",), ("query", "conf", "json", "ndjson", "apply")),
+        "notify": ((), ("message", "contents", "conf")),
+    }
+    common_fields = ("id", "tool", "after")
+
+    # Raises ValueError for a job that can't be run
+    def __init__(self, job, workers=False):
+        if isinstance(job, list):
+            job = {"steps": job}
+        if not isinstance(job, dict) or not isinstance(job.get("steps"), list):
+            raise ValueError("Job has no list of 'steps'")
+        self.workers = int(workers or job.get("workers") or self.workers)
+        self.steps = self.validate_steps(job["steps"], job.get("defaults") or {})
+
+        self.sessions = {}
+        self.session_lock = threading.Lock()
+        self.serial_lock = threading.Lock()
+
+    @staticmethod
+    def load_job(job_path):
+        with open(job_path, "r") as job_file:
+            if job_path.lower().endswith((".yml", ".yaml")):
+                if not yaml_module:
+                    raise ValueError("PyYAML module not found on system (Run: pip3 install pyyaml)")
+                return yaml.safe_load(job_file)
+            return json.load(job_file)
+
+    def validate_steps(self, steps, defaults):
+        valid_steps = []
+        for step_num, step in enumerate(steps, 1):
+            if not isinstance(step, dict) or step.get("tool") not in self.step_fields:
+                raise ValueError("Step " + str(step_num) + " has no known 'tool' (" + \
+                    ", ".join(self.step_fields) + ")")
+            step = dict(defaults.get(step["tool"]) or {}, **step)
+            step.setdefault("id", step["tool"] + "-" + str(step_num))
+            step["id"] = str(step["id"])
+            if isinstance(step.get("after"), str):
+                step["after"] = [step["after"]]
+            step["after"] = [str(after_id) for after_id in step.get("after") or []]
+
+            required, optional = self.step_fields[step["tool"]]
+            missing = [field for field in required if not step.get(field)]
+            if step["tool"] == "notify" and not (step.get("message") or step.get("contents")):
+                missing.append("message")
+            unknown = [field for field in step if field not in required + optional + self.common_fields]
+            if missing or unknown:
+                raise ValueError("Step '" + step["id"] + "'" + \
+                    (" is missing " + ", ".join(missing) if missing else "") + \
+                    (" has unknown field(s) " + ", ".join(unknown) if unknown else ""))
+            if step["tool"] == "desec" and step.get("template"):
+                try:
+                    zoneTemplate.load(step["template"])
+                except templateError as err:
+                    raise ValueError("Step '" + step["id"] + "': " + str(err))
+            valid_steps.append(step)
+
+        step_ids = [step["id"] for step in valid_steps]
+        if len(set(step_ids)) != len(step_ids):
+            raise ValueError("Step ids must be unique")
+        for step in valid_steps:
+            for after_id in step["after"]:
+                if after_id not in step_ids:
+                    raise ValueError("Step '" + step["id"] + "' is after unknown step '" + after_id + "'")
+
+        # Steps that can never start (Waiting on each other)
+        settled = set()
+        while len(settled) < len(valid_steps):
+            ready = [step["id"] for step in valid_steps if step["id"] not in settled and \
+                all(after_id in settled for after_id in step["after"])]
+            if not ready:
+                raise ValueError("Steps depend on each other in a cycle: " + \
+                    ", ".join(step_id for step_id in step_ids if step_id not in settled))
+            settled.update(ready)
+        return valid_steps
+
+    # Returns a result for every step, in job order
+    def run(self):
+        results = {}
+        waiting = list(self.steps)
+        real_stdout, real_stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = threadOutput(real_stdout), threadOutput(real_stderr)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as step_pool:
+                running = {}
+                while waiting or running:
+                    for step in list(waiting):
+                        after_results = [results.get(after_id) for after_id in step["after"]]
+                        if any(after_result and after_result["status"] != "ok" for after_result in after_results):
+                            results[step["id"]] = self.skipped_result(step)
+                            waiting.remove(step)
+                        elif all(after_results):
+                            running[step_pool.submit(self.run_step, step)] = step["id"]
+                            waiting.remove(step)
+                    if not running:
+                        continue                # Only skips this pass - Check what they unblocked
+                    done, pending = wait(running, return_when=FIRST_COMPLETED)
+                    for step_future in done:
+                        results[running.pop(step_future)] = step_future.result()
+        finally:
+            sys.stdout, sys.stderr = real_stdout, real_stderr
+        return [results[step["id"]] for step in self.steps]
+
+    def run_step(self, step):
+        result = {"id": step["id"], "tool": step["tool"], "action": step.get("action", ""), \
+            "status": "ok", "exit_code": 0, "error": ""}
+        step_run = getattr(self, "run_" + step["tool"].replace("-", "_"))
+        start_time = time.perf_counter()
+        sys.stdout.capture()
+        sys.stderr.capture()
+        try:
+            if step["tool"] in self.serial_tools:
+                with self.serial_lock:
+                    step_return = step_run(step)
+            else:
+                step_return = step_run(step)
+            if not step_return:
+                result.update({"status": "failed", "exit_code": 1})
+        except SystemExit as err:
+            result.update({"status": "error", "exit_code": err.code, "error": "Exited"})
+        except Exception as err:
+            result.update({"status": "error", "exit_code": getattr(err, "exit_code", 1), \
+                "error": str(err) if hasattr(err, "exit_code") else type(err).__name__ + ": " + str(err)})
+        finally:
+            result["output"] = sys.stdout.release()
+            result["errors"] = sys.stderr.release()
+        result["duration_s"] = round(time.perf_counter() - start_time, 3)
+        if step.get("ndjson"):
+            result["data"] = self.parse_ndjson_output(result["output"])
+        elif step.get("json"):
+            result["data"] = self.parse_json_output(result["output"])
+        return result
+
+    @staticmethod
+    def skipped_result(step):
+        return {"id": step["id"], "tool": step["tool"], "action": step.get("action", ""), \
+            "status": "skipped", "exit_code": None, "error": "An earlier step it is after did not succeed", \
+            "output": "", "errors": "", "duration_s": 0.0}
+
+    # One session per provider, shared by every step using it
+    def http_session(self, provider):
+        with self.session_lock:
+            if provider not in self.sessions:
+                session = requests.Session()
+                session_adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(self.session_pool, self.workers))
+                session.mount("https://", session_adapter)
+                session.mount("http://", session_adapter)
+                self.sessions[provider] = session
+            return self.sessions[provider]
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
+
+    #   Tools
+    def run_desec(self, step):
+        return manageDesecZone(step["action"], step.get("zone"), step.get("key", False), \
+            step.get("template", False), self.output_type(step), step.get("from", False), \
+            step.get("to", False), step.get("type", False), self.http_session("desec")).result
+
+    # Registrations are never confirmed interactively - A step registers only with 'yes'
+    def run_gandi(self, step):
+        gandi_obj = manageGandiZone(step.get("key", False), self.output_type(step), \
+            step.get("debug", False), step.get("from", False), step.get("to", False), step.get("type", False), \
+            self.http_session("gandi"), step.get("batch", False), step.get("yes", False), \
+            step.get("dry_run", False), step.get("rate", False))
+        gandi_obj.confirm_prompt = False
+        return gandi_obj.run_action(step["action"], step.get("zone"))
+
+    # Artifacts are written before the commit & removed if it fails, as the CLI does
+    def run_wg_enroll(self, step):
+        enrollWireguardClient.wg_live_apply = step.get("apply", True)
+        enrollWireguardClient(step["name"], step.get("server", False), step.get("conf", False), \
+            step.get("port", False))
+        try:
+            client_artifacts = enrollWireguardClient.export_client_artifacts(step.get("out_dir", "."), \
+                self.step_formats(step))
+            try:
+                return enrollWireguardClient.import_peer_conf()
+            except enrollError:
+                client_artifacts.remove()
+                raise
+        finally:
+            enrollWireguardClient.release_conf_lock()     # Already released once committed
+
+    def run_wg_batch(self, step):
+        enrollWireguardClient.wg_live_apply = step.get("apply", True)
+        enroll_batch = enrollWireguardBatch(step["manifest"], step.get("out_dir", "."), step.get("server", False), \
+            step.get("conf", False), step.get("port", False))
+        try:
+            enroll_batch.export_clients(self.step_formats(step))
+            return enroll_batch.import_peer_confs()
+        finally:
+            enroll_batch.release_conf_lock()              # Already released once committed
+
+    def run_wg_peers(self, step):
+        return manageWireguardPeers(step["action"], step.get("query", False), step.get("conf", False), \
+            self.output_type(step), step.get("apply", True)).result
+
+    def run_notify(self, step):
+        notify_obj = notifyServices(step.get("contents", False), step.get("conf", "notifyServices.conf"), \
+            message=step.get("message", False), http_session=self.http_session("notify"))
+        return bool(notify_obj.results) and all(notify_obj.results.values())
+
+    @staticmethod
+    def output_type(step):
+        if step.get("ndjson"):
+            return "ndjson"
+        return "json" if step.get("json") else False
+
+    @staticmethod
+    def step_formats(step):
+        formats = step.get("formats") or ["conf"]
+        if isinstance(formats, str):
+            formats = formats.split(",")
+        return [out_format.strip() for out_format in formats if out_format.strip()]
+
+    # The JSON document a '--json' operation printed after its status lines (Or None)
+    @staticmethod
+    def parse_json_output(step_output):
+        for line_start in range(len(step_output)):
+            if step_output[line_start] in "[{" and (line_start == 0 or step_output[line_start - 1] == "\n"):
+                try:
+                    return json.loads(step_output[line_start:])
+                except ValueError:
+                    continue
+        return None
+
+    @staticmethod
+    def parse_ndjson_output(step_output):
+        records = []
+        for output_line in step_output.splitlines():
+            try:
+                records.append(json.loads(output_line))
+            except ValueError:
+                continue
+        return records
+
+    @staticmethod
+    def format_results(results):
+        lines = []
+        for result in results:
+            lines.append("[" + result["status"] + "] " + result["id"] + " (" + result["tool"] + \
+                (" " + result["action"] if result["action"] else "") + ") " + str(result["duration_s"]) + "s" + \
+                (" :: " + result["error"] if result["error"] else ""))
+            for step_output in (result["output"], result["errors"]):
+                lines.extend("\t" + output_line for output_line in step_output.splitlines())
+        return "\n".join(lines) + "\n"
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    RJB_ARGV = argparse.ArgumentParser(description="Run a job file of nixkit operations in one process")
+    RJB_ARGV.add_argument('job', help="YAML/JSON job file")
+    RJB_ARGV.add_argument('--workers', '-w', type=int, help="Steps run at once (Default: 4)")
+    RJB_ARGV.add_argument('--json', '-j', dest="ofmt", action="store_const", const="json", \
+        help='Return results in JSON')
+
+    RJB_ARGV = RJB_ARGV.parse_args()
+    try:
+        RJB_OBJ = nixkitJobRunner(nixkitJobRunner.load_job(RJB_ARGV.job), RJB_ARGV.workers)
+    except (EnvironmentError, ValueError) as err:
+        sys.stderr.write("Unable to load job '" + RJB_ARGV.job + "': " + str(err) + "\n")
+        sys.exit(2)
+
+    RJB_RESULTS = RJB_OBJ.run()
+    RJB_OBJ.close()
+    try:
+        if RJB_ARGV.ofmt == "json":
+            print(json.dumps(RJB_RESULTS, indent=4))
+        else:
+            sys.stdout.write(RJB_OBJ.format_results(RJB_RESULTS))
+    except BrokenPipeError:
+        pass                        # Reader went away (ie. | head) - Still exit on the results
+
+    if any(result["status"] != "ok" for result in RJB_RESULTS):
+        sys.exit(1)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	benchmarkWgEnroll.py - Scale benchmark & regression
+#   checks for enrollWgClient against synthetic server
+#   confs (ie. 100, 10,000 & 100,000 peers)
+#
+#   Each enrollment phase (conf parse, address allocation,
+#   key generation, server conf commit & a full enrollment)
+#   is timed on its own & measured for peak (Python) memory
+#   at every conf size, then compared against a saved
+#   baseline. `wg` is replaced by a stub on PATH so no real
+#   interface is ever touched
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Baseline checks & results table shared with benchmarkDnsApi (See nixkitBench.py)
+#
+#   - sizes: Peers in the synthetic server confs
+#   - phases: Only run phases matching these names
+#   - keys: Keypairs made by the keygen phase
+#   - baseline: Results file to compare against/save to
+#   - save: Store this run as the new baseline
+#
+#   Exits 1 if any phase regressed against the baseline
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import re
+import sys
+import json
+import time
+import base64
+import shutil
+import argparse
+import tempfile
+import platform
+import ipaddress
+
+from datetime import datetime, timezone
+
+# Shared benchmark helpers live at the top of the tree
+NIXKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NIXKIT_DIR not in sys.path:
+    sys.path.insert(1, NIXKIT_DIR)
+from nixkitBench import nixkitBenchmark
+
+import wgKeys as wgKeysModule
+
+from wgConf import wgConf
+from wgKeys import wgKeys, wgKeyPool
+from wgAddressPool import wgAddressPool
+from wgPeerInventory import wgPeerInventory
+from enrollWgClient import enrollWireguardClient
+
+class benchmarkWgEnroll(nixkitBenchmark):
+
+    # Presets
+    baseline_path = "~/.cache/nixkit/bench/wgEnroll.json"
+    bench_server = "203.0.113.1"
+    intf_addrs = "10.0.0.1/8, fd00::1/64"
+    name_column = ("Phase", 28)
+    op_noun = "phase"
+
+    # Stands in for `wg` - Fixed keys & no interface up
+    wg_stub = "#!/bin/sh\n" \
+        "case \"$1\" in\n" \
+        "  genkey) echo \"" + base64.b64encode(bytes(32)).decode() + "\";;\n" \
+        "  pubkey) cat >/dev/null; echo \"" + base64.b64encode(bytes(31) + b"\x01").decode() + "\";;\n" \
+        "  *) exit 1;;\n" \
+        "esac\n"
+
+    def __init__(self, sizes, phase_filter=False, key_count=100, measure_memory=True):
+        self.sizes = sizes
+        self.key_count = key_count
+        self.measure_memory = measure_memory
+        self.real_env = {env_var: os.environ.get(env_var, "") for env_var in ("HOME", "PATH")}
+
+        # name: (setup, phase) - Both are called with the scratch server conf path
+        self.phases = {
+            "parse": (None, self.phase_parse),
+            "allocate-cold": (None, self.phase_allocate),
+            "allocate-warm": (self.save_address_index, self.phase_allocate),
+            "keygen": (None, self.phase_keygen),
+            "keygen-wg": (None, self.phase_keygen_wg),
+            "commit": (self.save_indexes, self.phase_commit),
+            "enroll": (self.save_indexes, self.phase_enroll),
+        }
+        if phase_filter:
+            self.phases = {phase_name: phase for phase_name, phase in self.phases.items() \
+                if any(re.search(phase_re, phase_name) for phase_re in phase_filter)}
+
+    def run(self):
+        results = {}
+        self.bench_dir = tempfile.mkdtemp(prefix="nixkit-wgbench-")
+        try:
+            self.install_wg_stub()
+            for size in self.sizes:
+                sys.stderr.write("Generating a " + str(size) + " peer server conf\n")
+                template_path = os.path.join(self.bench_dir, "template-" + str(size) + ".conf")
+                self.write_synthetic_conf(template_path, size)
+                for phase_name, (phase_setup, phase_run) in self.phases.items():
+                    result_key = phase_name + "@" + str(size)
+                    sys.stderr.write("Running " + result_key + "\n")
+                    results[result_key] = self.run_phase(template_path, phase_setup, phase_run)
+        finally:
+            shutil.rmtree(self.bench_dir, ignore_errors=True)
+            os.environ.update(self.real_env)
+        return {"created": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(), \
+            "keys": self.key_count, "results": results}
+
+    # Every phase gets a fresh copy of the conf so runs don't leak into each other
+    def run_phase(self, template_path, phase_setup, phase_run):
+        result = {"status": "ok"}
+        conf_path = self.new_scratch(template_path)
+        status = self.call_quietly(phase_setup, conf_path)
+        if status != "ok":
+            return {"status": "setup " + status}
+
+        start_time = time.perf_counter()
+        result["status"] = self.call_quietly(phase_run, conf_path)
+        result["wall_s"] = round(time.perf_counter() - start_time, 4)
+
+        # Separate from the timed pass as tracemalloc slows everything it watches
+        if self.measure_memory and result["status"] == "ok":
+            conf_path = self.new_scratch(template_path)
+            self.call_quietly(phase_setup, conf_path)
+            result["peak_kib"] = self.peak_memory(phase_run, conf_path)
+        return result
+
+    #   Phases
+    def phase_parse(self, conf_path):
+        wg_conf = wgConf.load(conf_path)
+        wg_conf.enrolled_names()
+        wg_conf.interface_get("Address")
+        wg_conf.close()
+
+    def phase_allocate(self, conf_path):
+        wg_conf = wgConf.load(conf_path)
+        wgAddressPool.load(conf_path, wg_conf.interface_get("Address"), wg_conf.peer_allowed_ips).allocate()
+        wg_conf.close()
+
+    def phase_keygen(self, conf_path):
+        key_pool = wgKeyPool(self.key_count)
+        try:
+            for key_idx in range(self.key_count):
+                key_pool.get()
+        finally:
+            key_pool.close()
+
+    # The `wg genkey`/`wg pubkey` fallback used without the cryptography module
+    def phase_keygen_wg(self, conf_path):
+        crypto_module = wgKeysModule.crypto_module
+        wgKeysModule.crypto_module = False
+        try:
+            self.phase_keygen(conf_path)
+        finally:
+            wgKeysModule.crypto_module = crypto_module
+
+    # Appending one peer, with the address index & inventory kept in step
+    def phase_commit(self, conf_path):
+        wg_conf = wgConf.load(conf_path)
+        addr_pool = wgAddressPool.load(conf_path, wg_conf.interface_get("Address"), wg_conf.peer_allowed_ips)
+        wg_conf.close()
+        privkey, pubkey = wgKeys.generate_keypair()
+        return enrollWireguardClient.commit_peer_confs(conf_path, [("bench-commit", \
+            {"AllowedIPs": ", ".join(addr_pool.allocate()), "PublicKey": pubkey})], addr_pool)
+
+    # A whole single-client enrollment, as the CLI runs it
+    def phase_enroll(self, conf_path):
+        enrollWireguardClient("bench-enroll", self.bench_server, conf_path, False)
+        enrollWireguardClient.export_client_file(os.path.join(os.path.dirname(conf_path), "client.conf"))
+        return enrollWireguardClient.import_peer_conf()
+
+    #   Setups
+    def save_address_index(self, conf_path):
+        wg_conf = wgConf.load(conf_path)
+        wgAddressPool.load(conf_path, wg_conf.interface_get("Address"), wg_conf.peer_allowed_ips).save(conf_path)
+        wg_conf.close()
+
+    def save_indexes(self, conf_path):
+        self.save_address_index(conf_path)
+        peer_inventory = wgPeerInventory(conf_path)
+        peer_inventory.sync()
+        peer_inventory.close()
+
+    def install_wg_stub(self):
+        stub_dir = os.path.join(self.bench_dir, "bin")
+        os.makedirs(stub_dir)
+        with open(os.path.join(stub_dir, "wg"), "w") as stub_fh:
+            stub_fh.write(self.wg_stub)
+        os.chmod(os.path.join(stub_dir, "wg"), 0o755)
+        os.environ["PATH"] = stub_dir + os.pathsep + self.real_env["PATH"]
+        enrollWireguardClient.wg_live_apply = False
+
+    def new_scratch(self, template_path):
+        scratch_dir = tempfile.mkdtemp(prefix="run-", dir=self.bench_dir)
+        os.environ["HOME"] = scratch_dir       # Keeps endpoint & other caches out of the real home
+        conf_path = os.path.join(scratch_dir, "wg0.conf")
+        shutil.copyfile(template_path, conf_path)
+        return conf_path
+
+    # A dual-stack conf of enroller-style peers with sequential addresses
+    def write_synthetic_conf(self, conf_path, peer_count):
+        v4_base = int(ipaddress.ip_address("10.0.0.0"))
+        v6_base = int(ipaddress.ip_address("fd00::"))
+        with open(conf_path, "w") as conf_fh:
+            conf_fh.write("[Interface]\nAddress = " + self.intf_addrs + "\nListenPort = 51820\n" \
+                "PrivateKey = " + base64.b64encode(bytes(31) + b"\x02").decode() + "\n\n")
+            for peer_idx in range(peer_count):
+                conf_fh.write("# peer%06d :: Auto-generated peer\n[Peer]\nPublicKey = %s\n" \
+                    "AllowedIPs = %s/32, %s/128\n\n" % (peer_idx, \
+                    base64.b64encode(peer_idx.to_bytes(32, "big")).decode(), \
+                    ipaddress.ip_address(v4_base + peer_idx + 2), ipaddress.ip_address(v6_base + peer_idx + 2)))
+
+# Below is CLI only - Check namespace to confirm whether running standalone
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    BWE_ARGV = argparse.ArgumentParser( \
+        description="Benchmark Wireguard enrollment against synthetic server confs")
+    BWE_ARGV.add_argument('--sizes', default="100,10000,100000", \
+        help='Comma separated peer counts of the synthetic confs')
+    BWE_ARGV.add_argument('--phases', help='Comma separated patterns of phases to run')
+    BWE_ARGV.add_argument('--keys', type=int, default=100, help='Keypairs made by the keygen phases')
+    BWE_ARGV.add_argument('--baseline', default=benchmarkWgEnroll.baseline_path, \
+        help='Baseline results file')
+    BWE_ARGV.add_argument('--save', action="store_true", help='Save this run as the new baseline')
+    BWE_ARGV.add_argument('--no-memory', dest="memory", action="store_false", \
+        help='Skip the peak memory pass')
+    BWE_ARGV.add_argument('--json', '-j', dest="ofmt", action="store_const", const="json", \
+        help='Return results in JSON')
+
+    BWE_ARGV = BWE_ARGV.parse_args()
+    BWE_OBJ = benchmarkWgEnroll([int(size) for size in BWE_ARGV.sizes.split(",")], \
+        BWE_ARGV.phases.split(",") if BWE_ARGV.phases else False, BWE_ARGV.keys, BWE_ARGV.memory)
+
+    BWE_BASELINE = BWE_OBJ.load_baseline(BWE_ARGV.baseline)
+
+    BWE_RESULTS = BWE_OBJ.run()
+    if BWE_ARGV.ofmt == "json":
+        print(json.dumps(BWE_RESULTS, indent=4))
+    else:
+        sys.stdout.write(BWE_OBJ.format_results(BWE_RESULTS, BWE_BASELINE))
+
+    BWE_REGRESSIONS = BWE_OBJ.compare(BWE_BASELINE, BWE_RESULTS)
+    for BWE_REGRESSION in BWE_REGRESSIONS:
+        sys.stderr.write("Regression :: " + BWE_REGRESSION + "\n")
+
+    if BWE_ARGV.save:
+        sys.stderr.write("Baseline saved to " + BWE_OBJ.save_baseline(BWE_ARGV.baseline, BWE_RESULTS) + "\n")
+
+    if BWE_REGRESSIONS:
+        sys.exit(1)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	collectWgTelemetry.py - Per-peer Wireguard telemetry
+#   as InfluxDB line protocol, for Telegraf
+#
+#   Samples `wg show all dump` (Or reads a dump from a
+#   file/stdin), names peers from the peer inventory the
+#   enroller keeps & works out handshake age and rx/tx
+#   rates against the previous sample. Counters from the
+#   last sample live in flat arrays indexed by a slot per
+#   peer, so a long-lived loop keeps no per-peer objects
+#   between intervals
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Dump scanned by offset, peer inventory only read if it already exists
+#	    1.2 - Peer inventory opened read-only & never synced (No conf lock is held)
+#
+#   - interval: Seconds between samples (Loop mode)
+#   - once: Take a single sample (ie. Telegraf inputs.exec)
+#   - input: Read a dump from a file ('-' for stdin)
+#       instead of running `wg`
+#   - conf_dir: Where <interface>.conf & its inventory are
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import subprocess
+from array import array
+
+from wgConf import wgConf
+from wgPeerInventory import wgPeerInventory
+
+class wgTelemetryCollector:
+
+    # Presets
+    measurement = b"wireguard_peer"
+    intf_measurement = b"wireguard_interface"
+    conf_dir = "/etc/wireguard"
+    active_window = 180         # Seconds since the last handshake a peer still counts as connected
+    chunk_size = 1 << 16        # Output is written in chunks of about this many bytes
+    tag_escapes = ((b"\\", b"\\\\"), (b",", b"\\,"), (b"=", b"\\="), (b" ", b"\\ "))
+
+    def __init__(self, conf_dir=False, output=None):
+        if conf_dir:
+            self.conf_dir = conf_dir
+        self.output = output or sys.stdout.buffer
+
+        # Previous sample :: (interface, public key) -> slot in the counter arrays
+        self.slots = {}
+        self.prev_rx = array("Q")
+        self.prev_tx = array("Q")
+        self.prev_time = array("d")
+        self.last_seen = array("Q")            # Sample number a slot was last filled in
+        self.sample_num = 0
+
+        # Escaped name tags per interface, reloaded when the inventory's conf changes
+        self.peer_names = {}
+        self.name_stamps = {}
+
+    # Runs `wg show all dump` - Returns the raw output (Or None)
+    def read_dump(self, input_path=False):
+        if input_path == "-":
+            return sys.stdin.buffer.read()
+        if input_path:
+            with open(input_path, "rb") as dump_file:
+                return dump_file.read()
+        try:
+            wg_dump = subprocess.run(["wg", "show", "all", "dump"], check=True, capture_output=True)
+        except FileNotFoundError:
+            sys.stderr.write("wg binary not found\n")
+            return None
+        except subprocess.CalledProcessError as err:
+            sys.stderr.write("wg show failed: " + err.stderr.decode().strip() + "\n")
+            return None
+        return wg_dump.stdout
+
+    def interface_names(self, ifname):
+        conf_path = os.path.join(self.conf_dir, ifname.decode() + ".conf")
+        try:
+            conf_stat = os.stat(conf_path)
+        except OSError:
+            return self.peer_names.get(ifname, {})
+        conf_stamp = (conf_stat.st_mtime_ns, conf_stat.st_size)
+        if self.name_stamps.get(ifname) != conf_stamp:
+            try:
+                peer_names = None
+                if os.path.exists(conf_path + wgPeerInventory.db_suffix):
+                    peer_inventory = wgPeerInventory(conf_path, read_only=True)
+                    try:
+                        if peer_inventory.is_current():
+                            peer_names = {peer["pubkey"].encode(): self.escape_tag(peer["name"].encode()) \
+                                for peer in peer_inventory.list_peers() if peer["name"]}
+                    finally:
+                        peer_inventory.close()
+                if peer_names is not None:
+                    self.peer_names[ifname] = peer_names
+                else:
+                    # No inventory (Not enrolled through nixkit) or one the conf has moved on
+                    #   from - Names come straight from the conf's markers, nothing is written
+                    wg_conf = wgConf.load(conf_path)
+                    self.peer_names[ifname] = {peer.get("PublicKey", "").encode(): \
+                        self.escape_tag(peer.name.encode()) for peer in wg_conf.peers() if peer.name}
+                    wg_conf.close()
+            except (sqlite3.Error, EnvironmentError) as err:
+                sys.stderr.write("Unable to read peer names for " + ifname.decode() + ": " + str(err) + "\n")
+                self.peer_names[ifname] = {}
+            self.name_stamps[ifname] = conf_stamp
+        return self.peer_names[ifname]
+
+    # Turns one dump into line protocol, written straight to the output in chunks
+    def sample(self, wg_dump, sample_time=None):
+        sample_time = sample_time or time.time()
+        timestamp = b" %d\n" % int(sample_time * 1e9)
+        self.sample_num += 1
+        intf_totals = {}                        # ifname -> [peers, active, rx rate, tx rate]
+        intf_tags = {}                          # ifname -> (Escaped tag, peer names) - Once per sample
+        out_chunk = bytearray()
+        out_lines = 0
+        slots, prev_rx, prev_tx, prev_time = self.slots, self.prev_rx, self.prev_tx, self.prev_time
+
+        # Scanned with offsets into the dump - Lines & fields are never split out, only
+        #   the key & counters of each peer are sliced from the buffer
+        dump_find, dump_rfind, dump_len = wg_dump.find, wg_dump.rfind, len(wg_dump)
+        ifname, ifname_end = b"", -1
+        line_start = 0
+        while line_start < dump_len:
+            line_end = dump_find(b"\n", line_start)
+            if line_end < 0:
+                line_end = dump_len
+            # ifname, public key, ... then handshake, rx, tx & keepalive as the last four fields
+            key_tab = dump_find(b"\t", line_start, line_end)
+            pubkey_tab = dump_find(b"\t", key_tab + 1, line_end)
+            tx_tab = dump_rfind(b"\t", line_start, line_end)
+            rx_tab = dump_rfind(b"\t", line_start, tx_tab)
+            handshake_tab = dump_rfind(b"\t", line_start, rx_tab)
+            allowed_tab = dump_rfind(b"\t", line_start, handshake_tab)
+            if key_tab < 0 or pubkey_tab < 0 or allowed_tab <= pubkey_tab or \
+                wg_dump.count(b"\t", pubkey_tab + 1, allowed_tab) != 2:
+                # Interface lines have 5 fields (Peers 9) - Only their name is needed
+                if key_tab > 0 and allowed_tab == key_tab:
+                    intf_totals.setdefault(wg_dump[line_start:key_tab], [0, 0, 0.0, 0.0])
+                line_start = line_end + 1
+                continue
+            # Most lines are on the same interface as the one before
+            if key_tab - line_start != ifname_end or not wg_dump.startswith(ifname, line_start):
+                ifname = wg_dump[line_start:key_tab]
+                ifname_end = key_tab - line_start
+            slot_key = wg_dump[line_start:pubkey_tab]       # ifname<tab>pubkey
+            pubkey = slot_key[ifname_end + 1:]
+            handshake = int(wg_dump[allowed_tab + 1:handshake_tab])
+            rx_bytes = int(wg_dump[handshake_tab + 1:rx_tab])
+            tx_bytes = int(wg_dump[rx_tab + 1:tx_tab])
+            line_start = line_end + 1
+
+            if ifname not in intf_tags:
+                intf_tags[ifname] = (self.escape_tag(ifname), self.interface_names(ifname))
+            ifname_tag, peer_names = intf_tags[ifname]
+            totals = intf_totals.setdefault(ifname, [0, 0, 0.0, 0.0])
+            totals[0] += 1
+
+            handshake_fields = b",connected=false"
+            if handshake:
+                handshake_age = max(0, int(sample_time) - handshake)
+                if handshake_age < self.active_window:
+                    totals[1] += 1
+                    handshake_fields = b",handshake_age=%di,connected=true" % handshake_age
+                else:
+                    handshake_fields = b",handshake_age=%di,connected=false" % handshake_age
+
+            # Rates need a previous sample & counters that haven't been reset
+            rate_fields = b""
+            slot = slots.get(slot_key)
+            if slot is None:
+                slots[slot_key] = len(prev_rx)
+                prev_rx.append(rx_bytes)
+                prev_tx.append(tx_bytes)
+                prev_time.append(sample_time)
+                self.last_seen.append(self.sample_num)
+            else:
+                elapsed = sample_time - prev_time[slot]
+                if elapsed > 0 and rx_bytes >= prev_rx[slot] and tx_bytes >= prev_tx[slot]:
+                    rx_rate = (rx_bytes - prev_rx[slot]) / elapsed
+                    tx_rate = (tx_bytes - prev_tx[slot]) / elapsed
+                    totals[2] += rx_rate
+                    totals[3] += tx_rate
+                    rate_fields = b",rx_rate=%.3f,tx_rate=%.3f" % (rx_rate, tx_rate)
+                prev_rx[slot], prev_tx[slot], prev_time[slot] = rx_bytes, tx_bytes, sample_time
+                self.last_seen[slot] = self.sample_num
+
+            # Public keys are base64 - '=' is the only character needing an escape
+            peer_name = peer_names.get(pubkey)
+            out_chunk += b"%s,interface=%s,public_key=%s%s%s rx_bytes=%di,tx_bytes=%di%s%s%s" % (self.measurement, \
+                ifname_tag, pubkey.replace(b"=", b"\\="), b",name=" if peer_name else b"", peer_name or b"", \
+                rx_bytes, tx_bytes, handshake_fields, rate_fields, timestamp)
+            out_lines += 1
+            if len(out_chunk) >= self.chunk_size:
+                self.output.write(out_chunk)
+                out_chunk.clear()
+
+        for ifname, (peers, active, rx_rate, tx_rate) in intf_totals.items():
+            out_chunk += b"%s,interface=%s peers=%di,active_peers=%di,rx_rate=%.3f,tx_rate=%.3f%s" % \
+                (self.intf_measurement, self.escape_tag(ifname), peers, active, rx_rate, tx_rate, timestamp)
+            out_lines += 1
+
+        self.output.write(out_chunk)
+        self.output.flush()
+        self.evict_slots()
+        return out_lines
+
+    # Drops slots of peers that have gone - Only once they're half of the arrays
+    def evict_slots(self):
+        stale_slots = sum(1 for seen in self.last_seen if seen != self.sample_num)
+        if stale_slots * 2 <= len(self.last_seen):
+            return
+        kept = [(slot_key, slot) for slot_key, slot in self.slots.items() if self.last_seen[slot] == self.sample_num]
+        self.prev_rx = array("Q", (self.prev_rx[slot] for slot_key, slot in kept))
+        self.prev_tx = array("Q", (self.prev_tx[slot] for slot_key, slot in kept))
+        self.prev_time = array("d", (self.prev_time[slot] for slot_key, slot in kept))
+        self.last_seen = array("Q", (self.sample_num for slot_key, slot in kept))
+        self.slots = {slot_key: new_slot for new_slot, (slot_key, slot) in enumerate(kept)}
+
+    # Samples every 'interval' seconds, on a fixed schedule (Not drifting with run time)
+    def run(self, interval, input_path=False):
+        next_sample = time.monotonic()
+        while True:
+            wg_dump = self.read_dump(input_path)
+            if wg_dump is not None:
+                self.sample(wg_dump)
+            next_sample += interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+    @classmethod
+    def escape_tag(cls, tag_value):
+        for tag_char, tag_escape in cls.tag_escapes:
+            if tag_char in tag_value:
+                tag_value = tag_value.replace(tag_char, tag_escape)
+        return tag_value
+
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    WGT_ARGV = argparse.ArgumentParser(description="Wireguard peer telemetry as InfluxDB line protocol")
+    WGT_ARGV.add_argument('--interval', type=float, default=10, help="Seconds between samples (Default: 10)")
+    WGT_ARGV.add_argument('--once', action="store_true", help="Take a single sample & exit")
+    WGT_ARGV.add_argument('--input', help="Read a `wg show all dump` from a file ('-' for stdin)")
+    WGT_ARGV.add_argument('--conf-dir', help="Directory of the interface confs (Default: /etc/wireguard)")
+
+    WGT_ARGV = WGT_ARGV.parse_args()
+    WGT_OBJ = wgTelemetryCollector(WGT_ARGV.conf_dir)
+    if WGT_ARGV.once or WGT_ARGV.input == "-":
+        WGT_DUMP = WGT_OBJ.read_dump(WGT_ARGV.input)
+        if WGT_DUMP is None:
+            sys.exit(1)
+        WGT_OBJ.sample(WGT_DUMP)
+        sys.exit(0)
+    try:
+        WGT_OBJ.run(WGT_ARGV.interval, WGT_ARGV.input)
+    except (KeyboardInterrupt, BrokenPipeError):
+        sys.exit(0)
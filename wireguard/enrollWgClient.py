@@ -9,12 +9,29 @@
 #	    Date: 25-Sep-2021        Version: 1.0
 #
 #	    1.0 - Migration + minor refactor
+#	    1.1 - Indexed (gap reusing, dual-stack) address allocation
+#	    1.2 - Batch enrollment from a CSV/JSON manifest
+#	    1.3 - In-process key generation, cached interface public key
+#	    1.4 - Locked, atomic server conf commits applied to the live interface
+#	    1.5 - Server conf read by wgConf (Replaces configparser + multi_dict)
+#	    1.6 - Enrollments recorded in the peer inventory (See manageWgPeers.py)
+#	    1.7 - Client artifacts (conf, ASCII/SVG/PNG QR) rendered in parallel to a dir or zip
+#	    1.8 - Cached, multi-source server endpoint discovery (See wgEndpoint.py)
+#	    1.9 - Failures raised as enrollError (No exits outside the CLI, see runJobs.py)
+#	    1.10 - --profile timing of locking, config, keys, subprocesses & rendering (See nixkitProfile.py)
 #
 #   - client_id: Unique identifier for client
 #   - wg_dir: Wireguard working directory
 #   - wg_server_conf: server .conf file to update
 #   - wg_hostport: The hostname:port for clients to
 #       connect to
+#   - batch: CSV/JSON manifest of clients to enroll at once
+#       (Columns/keys: name, endpoint, port, allowed_ips,
+#       dns, keepalive - Only name is required)
+#   - out_dir: Where batch client configs are written (A
+#       directory, or a zip bundle if it ends in .zip)
+#   - format: Artifacts written per client (conf, qr.txt,
+#       svg, png)
 #
 #	Lint score: 8.77/10
 #
@@ -22,41 +39,49 @@
 #
 
 # Standard libraries
-import io
 import os
+import re
 import sys
-import configparser
+import csv
+import json
+import fcntl
+import sqlite3
+import tempfile
 import subprocess
-import ipaddress
 import argparse
 
-# For multi_dict
-from collections import OrderedDict
-
-# For QR code output
-try:
-    import qrcode
-    qr_module = True
-except ModuleNotFoundError:
-    sys.stderr.write("Warning: QRcode module not found on system (Run: pip3 install qrcode)\n")
-    qr_module = False
-
-# Multi dictionary :: The ability to set multie same-key items uniquely!
-# To fix --> Insert a check to see whether the key already exist, and if not, leave unnamed
-class multi_dict(OrderedDict):
-    uniq = 0
-
-    def __setitem__(self, key, value):
-        if isinstance(value, dict):
-            self.uniq+=1
-            key += str(self.uniq)
-        OrderedDict.__setitem__(self, key, value)
+# Shared instrumentation (--profile) lives at the top of the tree
+NIXKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if NIXKIT_DIR not in sys.path:
+    sys.path.insert(1, NIXKIT_DIR)
+from nixkitProfile import profiler
+
+from wgAddressPool import wgAddressPool
+from wgKeys import wgKeys, wgKeyPool
+from wgConf import wgConf
+from wgPeerInventory import wgPeerInventory
+from wgArtifacts import wgArtifactWriter, render_qr_ascii, qr_module
+from wgEndpoint import wgEndpointDiscovery
+
+# Raised in place of exiting, so enrollments can be run in-process - The conf lock
+#   is always released first
+#   - exit_code: What the CLI exits with
+class enrollError(Exception):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
 
 class enrollWireguardClient:
     # Defaults
     wg_ifname="wg0"
     wg_path="/etc/wireguard/"+wg_ifname+".conf"
+    wg_default_path=wg_path
     wg_cname=""
+    wg_addr_pool=None
+    wg_conf_lock=None
+    wg_live_apply=True          # Push new peers to the running interface with `wg set`
+    wg_set_chunk=256            # Peers per `wg set` call
+    valid_name = re.compile(r"^[\w@.+-]+$")     # Names end up in artifact file paths
 
     # Client configuration dictionaries
     wg_client_peer_conf = {}
@@ -71,182 +96,293 @@ class enrollWireguardClient:
 
         # Check client name has been provided
         if not client_name:
-            sys.stderr.write("No client identifier set")
-            sys.exit(1)
+            raise enrollError("No client identifier set", 1)
+        elif not self.valid_name.match(client_name):
+            raise enrollError("Invalid client name '" + client_name + "'", 1)
         else:
             self.wg_cname = client_name
             print(self.wg_cname)
 
         # Assume kernel-land and check for root
         if os.geteuid():
-            sys.stderr.write("Enrollment needs to be run as root")
-            sys.exit(2)
+            raise enrollError("Enrollment needs to be run as root", 2)
 
         # Check whether custom .conf file set, is in fact a file and set it
         if not wg_conf_path:
             sys.stdout.write("Using default /etc/wireguard/wg0.conf\n")
+            self.wg_path = self.wg_default_path     # Not whatever an earlier enrollment used
         else:
             self.wg_path = wg_conf_path
 
         if not os.path.isfile(self.wg_path):
-            sys.stderr.write("Wireguard .conf '" + self.wg_path + "' is not readable\n")
-            sys.exit(1)
+            raise enrollError("Wireguard .conf '" + self.wg_path + "' is not readable", 1)
+        self.wg_ifname = self.interface_name(self.wg_path)
 
         if not wg_server:
             sys.stdout.write("No server address provided - Attempting to query manually\n")
-            wg_server=self.discover_wan_address()
+            wg_server=self.discover_wan_address(self.wg_path)
             if not wg_server:
-                sys.stderr.write("Server address unable to be queried\n")
-                sys.exit(5)
+                raise enrollError("Server address unable to be queried", 5)
 
-        # Open wireguard server configuration - Load into configParse
+        # Held until the peer is committed, so concurrent enrollments can't be handed
+        #   the same address or overwrite each other's [Peer] blocks
+        self.wg_conf_lock = self.lock_server_conf(self.wg_path)
         try:
-            with open(self.wg_path,"r") as wg_conf_file:
-                wg_conf = configparser.ConfigParser(defaults=None, dict_type=multi_dict, strict=False)
-                wg_conf.read_file(wg_conf_file)
-        except EnvironmentError:
-            sys.stderr.write("Unable to open Wireguard server conf (" + self.wg_path + ")\n")
-            sys.exit(5)
-
-        print(wg_conf.sections())
-
-        # If no port is provided - grab it from the conf
-        if not wg_client_port:
-            # Since multi_dict relabels EVERY section, [Interface] became [Interface1]
-            wg_serv_port = wg_conf.get("Interface1","ListenPort")
-            sys.stdout.write("No port specificed :: using ListenPort from WG server conf.\n")
-        elif 1024 < wg_client_port < 65536:
-            wg_serv_port=wg_client_port
-        else:
-            print(type(wg_client_port))
-            sys.stderr.write("Invalid port provided '" + str(wg_client_port) + "'\n")
-            sys.exit(4)
-
-        # Generate the client's peer configuration
-        self.wg_client_peer_conf["PublicKey"] = self.query_interface_pubkey()
-        self.wg_client_peer_conf["Endpoint"] = wg_server + ":" + str(wg_serv_port)
-        self.wg_client_peer_conf["AllowedIPs"] = "0.0.0.0/0"
-        # TODO :: Add option for PersistentKeepalive
-
-        # Allocate the new peer's IP address & port from the server configuration
-        client_addr = self.generate_client_addr(wg_conf) + "/32"
-        self.wg_client_intf_conf["Address"] = client_addr
-        self.wg_server_peer_conf["AllowedIPs"] = client_addr
-
-        # TODO :: Add option to specify the DNS on client interface
-
-        # Generate a new keypair for the peer
-        client_privkey = self.generate_client_privkey()
-        self.wg_client_intf_conf["PrivateKey"] = client_privkey
-        self.wg_server_peer_conf["PublicKey"] = self.generate_client_pubkey(client_privkey)
-
-        # Don't know why - But I like the ListenPort being on the bottom
-        self.wg_client_intf_conf["ListenPort"] = wg_serv_port
-
-    # Generate a public key for the peer derived from the interface's private key
+            # Open wireguard server configuration
+            wg_conf = self.load_server_conf(self.wg_path)
+            if self.wg_cname in wg_conf.enrolled_names():
+                raise enrollError("Client '" + self.wg_cname + "' is already enrolled", 1)
+
+            print(str(len(wg_conf)) + " existing peer(s) in " + self.wg_path)
+
+            # If no port is provided - grab it from the conf
+            if not wg_client_port:
+                wg_serv_port = wg_conf.interface_get("ListenPort")
+                sys.stdout.write("No port specificed :: using ListenPort from WG server conf.\n")
+            elif 1024 < wg_client_port < 65536:
+                wg_serv_port=wg_client_port
+            else:
+                print(type(wg_client_port))
+                raise enrollError("Invalid port provided '" + str(wg_client_port) + "'", 4)
+
+            # Allocate the new peer's IP address(es) from the server configuration
+            try:
+                with profiler.span("allocate", self.wg_cname):
+                    client_addrs = self.generate_client_addr(wg_conf)
+            except ValueError as err:
+                raise enrollError("Unable to allocate a client address: " + str(err), 7)
+            client_addr = ", ".join(client_addrs)
+            self.wg_client_intf_conf["Address"] = client_addr
+            self.wg_server_peer_conf["AllowedIPs"] = client_addr
+
+            # Generate the client's peer configuration (Full tunnel on each allocated family)
+            self.wg_client_peer_conf["PublicKey"] = self.query_interface_pubkey(wg_conf)
+            self.wg_client_peer_conf["Endpoint"] = wgEndpointDiscovery.format_endpoint(wg_server, wg_serv_port)
+            self.wg_client_peer_conf["AllowedIPs"] = ", ".join( \
+                "0.0.0.0/0" if ":" not in addr else "::/0" for addr in client_addrs)
+            # TODO :: Add option for PersistentKeepalive
+
+            # TODO :: Add option to specify the DNS on client interface
+
+            # Generate a new keypair for the peer
+            with profiler.span("keygen", self.wg_cname):
+                client_privkey = self.generate_client_privkey()
+                self.wg_client_intf_conf["PrivateKey"] = client_privkey
+                self.wg_server_peer_conf["PublicKey"] = self.generate_client_pubkey(client_privkey)
+
+            # Don't know why - But I like the ListenPort being on the bottom
+            self.wg_client_intf_conf["ListenPort"] = wg_serv_port
+        except BaseException:
+            os.close(self.wg_conf_lock)     # Nothing was committed - Let the next enrollment in
+            self.wg_conf_lock = None
+            raise
+
+    # Configured hostname, local interface, cached answer, then racing lookup services
     @classmethod
-    def discover_wan_address(cls):
-        checkUrl="https://api.my-ip.io/ip"
-        wan_addr = subprocess.run(["curl", "-s", checkUrl], capture_output=True, text=True)
-        if ipaddress.ip_address(wan_addr.stdout):
-            return wan_addr.stdout
+    def discover_wan_address(cls, conf_path=False):
+        wan_discovery = wgEndpointDiscovery(conf_path)
+        wan_addr = wan_discovery.discover()
+        if wan_addr:
+            print("Using server address " + wan_addr + " (" + wan_discovery.source + ")")
+            return wan_addr
         return 0
 
+    # Derived from the conf's own PrivateKey where possible (No `wg show` needed) &
+    #   cached next to the conf
     @classmethod
-    def query_interface_pubkey(cls):
-        pubkey = subprocess.run(["wg","show",cls.wg_ifname,"public-key"], capture_output=True, text=True)
+    def query_interface_pubkey(cls, conf_handle=None, conf_path=False):
+        intf_privkey = False
+        if conf_handle:
+            intf_privkey = conf_handle.interface_get("PrivateKey", False)
+        pubkey = wgKeys.interface_pubkey(intf_privkey, conf_path or cls.wg_path, cls.wg_ifname)
         if pubkey:
-            return pubkey.stdout
+            return pubkey
         return 0
 
+    @classmethod
+    def load_server_conf(cls, conf_path):
+        try:
+            with profiler.span("config", conf_path):
+                wg_conf = wgConf.load(conf_path)
+        except EnvironmentError:
+            raise enrollError("Unable to open Wireguard server conf (" + conf_path + ")", 5)
+        if not wg_conf.interface:
+            raise enrollError("No [Interface] section in Wireguard server conf (" + conf_path + ")", 5)
+        return wg_conf
+
+    # Names recorded in the '# name :: Auto-generated peer' comments of the server conf
+    @classmethod
+    def enrolled_peer_names(cls, conf_path):
+        return cls.load_server_conf(conf_path).enrolled_names()
+
     # Pass the handle brah
-    # (This is a mess) :: Checks all the AllowedIP peers to find the largest one,
-    #   increments it by one and returns it
+    # Allocates the lowest free address in each of the interface's subnets from the
+    #   persisted index - Peers are only re-scanned when the index is stale
     @classmethod
     def generate_client_addr(cls, conf_handle):
-        gw_addr = ipaddress.ip_network(conf_handle.get("Interface1","Address"),strict=False)
-        largest_host = gw_addr.network_address
-        for client in conf_handle.sections():
-            # client_dict = client.options(client)
-            if conf_handle.has_option(client, "AllowedIPs"):
-                peer_addr = ipaddress.ip_network(conf_handle.get(client, "AllowedIPs")).network_address
-                if (peer_addr in gw_addr) and (peer_addr > largest_host):
-                    largest_host = peer_addr
-        return str(largest_host+1)
+        cls.wg_addr_pool = wgAddressPool.load(cls.wg_path, conf_handle.interface_get("Address"), \
+            conf_handle.peer_allowed_ips)
+        return cls.wg_addr_pool.allocate()
 
     @classmethod
     def generate_client_privkey(cls):
-        privkey = subprocess.run(["wg", "genkey"], check=True, capture_output=True, text=True)
-        return privkey.stdout[:-1]  # Trim trailing newline
+        return wgKeys.generate_privkey()
 
     @classmethod
     def generate_client_pubkey(cls, privkey):
-        pubkey = subprocess.run(["wg", "pubkey"], input=privkey, check=True, capture_output=True, text=True)
-        return pubkey.stdout[:-1]   # Trim trailing newline
+        return wgKeys.derive_pubkey(privkey)
 
     @classmethod
     def import_peer_conf(cls):
         print("Loading server [Peer] configuration into " + cls.wg_path)
         print(cls.wg_cname)
-        server_peer_conf = "# " + cls.wg_cname + " :: Auto-generated peer\n[Peer]\n"
-        for inf_key in cls.wg_server_peer_conf:
-            server_peer_conf += inf_key + " = " + str(cls.wg_server_peer_conf[inf_key]) + "\n"
+        try:
+            committed = cls.commit_peer_confs(cls.wg_path, [(cls.wg_cname, cls.wg_server_peer_conf)], \
+                cls.wg_addr_pool, cls.wg_conf_lock)
+        finally:
+            cls.wg_conf_lock = None         # Released by the commit, whatever happened
+        if not committed:
+            raise enrollError("Client '" + cls.wg_cname + "' was not enrolled", 8)
+        return True
+
+    # The transactional commit :: Under the conf lock, the current conf is re-read,
+    #   the [Peer] blocks appended & the result swapped in atomically. Only the new
+    #   peers are then pushed to the running interface - Existing sessions are untouched
+    #   - peer_confs: [(client name, server-side peer dictionary)]
+    #   - conf_lock: An already held lock (Released once committed)
+    @classmethod
+    def commit_peer_confs(cls, conf_path, peer_confs, addr_pool=None, conf_lock=None):
+        if conf_lock is None:
+            conf_lock = cls.lock_server_conf(conf_path)
+        try:
+            try:
+                prior_stamp = wgAddressPool.conf_stamp(conf_path)
+                with profiler.span("config", conf_path):
+                    wg_conf = wgConf.load(conf_path)
+                try:
+                    with profiler.span("render", "server conf", peers=len(peer_confs)):
+                        conf_contents = wg_conf.render("".join(cls.render_peer_block(client_name, \
+                            server_peer_conf) for client_name, server_peer_conf in peer_confs).encode())
+                finally:
+                    wg_conf.close()
+                with profiler.span("commit", conf_path, bytes=len(conf_contents)):
+                    cls.write_server_conf(conf_path, conf_contents)
+            except EnvironmentError as err:
+                sys.stderr.write("Unable to update server conf file (" + conf_path + "): " + str(err) + "\n")
+                return False
+
+            # Index is stamped against the .conf it now matches
+            if addr_pool:
+                try:
+                    addr_pool.save(conf_path)
+                except EnvironmentError:
+                    sys.stderr.write("Unable to save address index - It will be rebuilt next run\n")
+            try:
+                with profiler.span("commit", "peer inventory"):
+                    peer_inventory = wgPeerInventory(conf_path)
+                    peer_inventory.apply_changes(prior_stamp, [(client_name, server_peer_conf["PublicKey"], \
+                        server_peer_conf["AllowedIPs"]) for client_name, server_peer_conf in peer_confs])
+                    peer_inventory.close()
+            except sqlite3.Error as err:
+                sys.stderr.write("Unable to update peer inventory (" + str(err) + ") - It will be rebuilt next run\n")
+        finally:
+            os.close(conf_lock)             # Closing releases the lock
+
+        if cls.wg_live_apply:
+            cls.apply_peers_live(cls.interface_name(conf_path), \
+                [server_peer_conf for client_name, server_peer_conf in peer_confs])
+        return True
+
+    # Adds peers to the running interface without touching existing ones (Unlike a
+    #   restart or full `wg setconf`) - Skipped if the interface isn't up
+    @classmethod
+    def apply_peers_live(cls, ifname, server_peer_confs):
+        try:
+            if subprocess.run(["wg", "show", ifname, "public-key"], capture_output=True).returncode:
+                print("Interface " + ifname + " is not up - Peers will load when it is next started")
+                return False
+            for chunk_start in range(0, len(server_peer_confs), cls.wg_set_chunk):
+                wg_set_cmd = ["wg", "set", ifname]
+                for server_peer_conf in server_peer_confs[chunk_start:chunk_start + cls.wg_set_chunk]:
+                    wg_set_cmd += ["peer", server_peer_conf["PublicKey"], "allowed-ips", \
+                        server_peer_conf["AllowedIPs"].replace(" ", "")]
+                subprocess.run(wg_set_cmd, check=True, capture_output=True, text=True)
+        except FileNotFoundError:
+            print("wg binary not found - Peers will load when " + ifname + " is next started")
+            return False
+        except subprocess.CalledProcessError as err:
+            sys.stderr.write("Unable to apply peers to " + ifname + " (" + err.stderr.strip() + \
+                ") - They are saved in the conf\n")
+            return False
+        print("Applied " + str(len(server_peer_confs)) + " peer(s) to running interface " + ifname)
+        return True
+
+    # For enrollments abandoned before their commit
+    @classmethod
+    def release_conf_lock(cls):
+        if cls.wg_conf_lock is not None:
+            os.close(cls.wg_conf_lock)
+            cls.wg_conf_lock = None
 
-        server_peer_conf += "\n"    # Can have a final extra newline as a treat
+    # A sidecar lock file - The conf itself is replaced by rename, so can't hold a lock
+    @classmethod
+    def lock_server_conf(cls, conf_path):
+        lock_fd = os.open(conf_path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
         try:
-            with open(cls.wg_path,"a") as wg_server_file:
-                wg_server_file.write(server_peer_conf)
-        except EnvironmentError:
-            sys.stderr.write("Unable to open server conf file (" + cls.wg_path + ")\n")
-            sys.exit(8)
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("Waiting for another enrollment to finish with " + conf_path)
+            with profiler.span("lock", conf_path):
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        return lock_fd
+
+    @classmethod
+    def interface_name(cls, conf_path):
+        return os.path.splitext(os.path.basename(conf_path))[0]
 
     @classmethod
     def export_client_stdout(cls):
         print("Generating client configuration - Displaying as stdout")
-        sys.stdout.write("# Auto-generated configuration\n[Interface]\n")
-        cls.write_toml(cls.wg_client_intf_conf)
+        with profiler.span("render", "stdout"):
+            sys.stdout.write("# Auto-generated configuration\n[Interface]\n")
+            cls.write_toml(cls.wg_client_intf_conf)
 
-        sys.stdout.write("\n[Peer]\n")
-        cls.write_toml(cls.wg_client_peer_conf)
+            sys.stdout.write("\n[Peer]\n")
+            cls.write_toml(cls.wg_client_peer_conf)
 
     @classmethod
     def export_client_file(cls, file_path):
-        client_conf_full = "# Auto-generated configuration\n[Interface]\n"
         print("Generating client configuration file - Path: " + file_path)
-
-        client_conf_full = "# Auto-generated configuration\n[Interface]\n"
-        for inf_key in cls.wg_client_intf_conf:
-            client_conf_full += inf_key + " = " + str(cls.wg_client_intf_conf[inf_key]) + "\n"
-
-        client_conf_full += "\n[Peer]\n"
-        for inf_key in cls.wg_client_peer_conf:
-            client_conf_full += inf_key + " = " + str(cls.wg_client_peer_conf[inf_key]) + "\n"
+        client_conf_full = cls.render_client_conf(cls.wg_client_intf_conf, cls.wg_client_peer_conf)
 
         try:
-            with open(file_path,"w") as wg_client_file:
-                wg_client_file.write(client_conf_full)
+            with profiler.span("render", "client file"):
+                cls.write_server_conf(file_path, client_conf_full)
         except EnvironmentError:
-            sys.stderr.write("Unable to open requested client file path (" + file_path + ")\n")
-            sys.exit(6)
+            raise enrollError("Unable to open requested client file path (" + file_path + ")", 6)
+        return True
 
     @classmethod
     def export_client_qr_stdout(cls):
         print("Generating client configuration as scannable QR code")
-        client_conf_full = "# Auto-generated configuration\n[Interface]\n"
-        for inf_key in cls.wg_client_intf_conf:
-            client_conf_full += inf_key + " = " + str(cls.wg_client_intf_conf[inf_key]) + "\n"
-
-        client_conf_full += "\n[Peer]\n"
-        for inf_key in cls.wg_client_peer_conf:
-            client_conf_full += inf_key + " = " + str(cls.wg_client_peer_conf[inf_key]) + "\n"
-
-        client_wg_qrcode = qrcode.QRCode()
-        client_wg_qrcode.add_data(client_conf_full)
-        wg_client_conf = io.StringIO()
-        client_wg_qrcode.print_ascii(out=wg_client_conf)
+        client_conf_full = cls.render_client_conf(cls.wg_client_intf_conf, cls.wg_client_peer_conf)
+        with profiler.span("render", "qr"):
+            sys.stdout.write(render_qr_ascii(client_conf_full))
 
-        wg_client_conf.seek(0)
-        sys.stdout.write(wg_client_conf.read())
+    # Writes the client's artifacts (See wgArtifacts.py) - Returns the writer for a rollback
+    @classmethod
+    def export_client_artifacts(cls, out_path, formats):
+        print("Generating client artifacts (" + ", ".join(formats) + ") - Path: " + out_path)
+        client_conf_full = cls.render_client_conf(cls.wg_client_intf_conf, cls.wg_client_peer_conf)
+        try:
+            with profiler.span("render", "artifacts", formats=",".join(formats)):
+                artifact_writer = wgArtifactWriter(out_path, formats)
+                artifact_writer.write([(cls.wg_cname, client_conf_full)])
+        except ValueError as err:
+            raise enrollError("Error: " + str(err), 10)
+        except EnvironmentError as err:
+            raise enrollError("Unable to write client artifacts (" + out_path + "): " + str(err), 6)
+        return artifact_writer
 
     # TODO :: Make this use file handlers if passed
     @classmethod
@@ -254,30 +390,269 @@ class enrollWireguardClient:
         for option_key in dictionary:
             sys.stdout.write(str(option_key) + " = " + str(dictionary[option_key]) + "\n")
 
+    @classmethod
+    def render_client_conf(cls, intf_conf, peer_conf):
+        client_conf_full = "# Auto-generated configuration\n[Interface]\n"
+        for inf_key in intf_conf:
+            client_conf_full += inf_key + " = " + str(intf_conf[inf_key]) + "\n"
+
+        client_conf_full += "\n[Peer]\n"
+        for inf_key in peer_conf:
+            client_conf_full += inf_key + " = " + str(peer_conf[inf_key]) + "\n"
+        return client_conf_full
+
+    @classmethod
+    def render_peer_block(cls, client_name, server_peer_conf):
+        peer_block = "# " + client_name + " :: Auto-generated peer\n[Peer]\n"
+        for inf_key in server_peer_conf:
+            peer_block += inf_key + " = " + str(server_peer_conf[inf_key]) + "\n"
+        return peer_block + "\n"   # Can have a final extra newline as a treat
+
+    # Replaces the server conf in one step - Readers only ever see the old or new file
+    @classmethod
+    def write_server_conf(cls, conf_path, conf_contents):
+        conf_dir = os.path.dirname(os.path.abspath(conf_path))
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=conf_dir, prefix="." + os.path.basename(conf_path) + ".")
+        try:
+            with os.fdopen(tmp_fd, "wb" if isinstance(conf_contents, bytes) else "w") as tmp_file:
+                tmp_file.write(conf_contents)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            try:
+                os.chmod(tmp_path, os.stat(conf_path).st_mode & 0o7777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, conf_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+# Enrolls every client of a manifest with a single parse of the server conf,
+#   one allocation pass, parallel key generation & a single atomic conf write
+class enrollWireguardBatch:
+    # Defaults
+    key_workers = False         # Key pool threads (Default: 1 in-process, up to 8 forking `wg`)
+    manifest_fields = ("name", "endpoint", "port", "allowed_ips", "dns", "keepalive")
+    artifact_writer = None
+    valid_name = enrollWireguardClient.valid_name
+
+    def __init__(self, manifest_path, out_dir, wg_server=False, wg_conf_path=False, wg_client_port=False):
+
+        # Assume kernel-land and check for root
+        if os.geteuid():
+            raise enrollError("Enrollment needs to be run as root", 2)
+
+        self.wg_path = wg_conf_path or enrollWireguardClient.wg_default_path    # Not an earlier enrollment's
+        if not os.path.isfile(self.wg_path):
+            raise enrollError("Wireguard .conf '" + self.wg_path + "' is not readable", 1)
+
+        self.out_dir = out_dir
+        self.clients = self.load_manifest(manifest_path)
+
+        # Held until the batch is committed (See enrollWireguardClient.commit_peer_confs)
+        self.wg_conf_lock = enrollWireguardClient.lock_server_conf(self.wg_path)
+        try:
+            # The server conf is parsed once for the whole batch
+            wg_conf = enrollWireguardClient.load_server_conf(self.wg_path)
+            self.validate_clients(wg_conf.enrolled_names())
+            if not wg_client_port:
+                wg_client_port = wg_conf.interface_get("ListenPort")
+
+            if not wg_server and not all(client.get("endpoint") for client in self.clients):
+                sys.stdout.write("No server address provided - Attempting to query manually\n")
+                wg_server = enrollWireguardClient.discover_wan_address(self.wg_path)
+                if not wg_server:
+                    raise enrollError("Server address unable to be queried", 5)
+            server_pubkey = enrollWireguardClient.query_interface_pubkey(wg_conf, self.wg_path)
+            if not server_pubkey:
+                raise enrollError("Unable to determine the server public key", 5)
+
+            # Allocate every client's address(es) in one pass - Nothing is written on failure
+            try:
+                self.wg_addr_pool = wgAddressPool.load(self.wg_path, wg_conf.interface_get("Address"), \
+                    wg_conf.peer_allowed_ips)
+                with profiler.span("allocate", "batch", clients=len(self.clients)):
+                    client_addrs = [self.wg_addr_pool.allocate() for client in self.clients]
+            except ValueError as err:
+                raise enrollError("Unable to allocate addresses for the batch: " + str(err), 7)
+
+            # Keypairs come from a pool filled in the background
+            key_pool = wgKeyPool(len(self.clients), self.key_workers)
+            try:
+                with profiler.span("keygen", "batch", clients=len(self.clients)):
+                    client_keys = [key_pool.get() for client in self.clients]
+            finally:
+                key_pool.close()
+
+            for client, addrs, (privkey, pubkey) in zip(self.clients, client_addrs, client_keys):
+                client["intf_conf"] = {"Address": ", ".join(addrs), "PrivateKey": privkey}
+                if client.get("dns"):
+                    client["intf_conf"]["DNS"] = client["dns"]
+                client["intf_conf"]["ListenPort"] = client.get("port") or wg_client_port
+
+                client["peer_conf"] = {"PublicKey": server_pubkey, \
+                    "Endpoint": wgEndpointDiscovery.format_endpoint(client.get("endpoint") or wg_server, \
+                    client.get("port") or wg_client_port), \
+                    "AllowedIPs": client.get("allowed_ips") or ", ".join( \
+                    "0.0.0.0/0" if ":" not in addr else "::/0" for addr in addrs)}
+                if client.get("keepalive"):
+                    client["peer_conf"]["PersistentKeepalive"] = client["keepalive"]
+
+                client["server_peer_conf"] = {"AllowedIPs": ", ".join(addrs), "PublicKey": pubkey}
+
+            print("Prepared " + str(len(self.clients)) + " client(s) for enrollment")
+        except BaseException:
+            os.close(self.wg_conf_lock)     # Nothing was committed - Let the next enrollment in
+            self.wg_conf_lock = None
+            raise
+
+    @classmethod
+    def load_manifest(cls, manifest_path):
+        try:
+            with profiler.span("config", manifest_path), open(manifest_path, "r", newline="") as manifest_file:
+                if manifest_path.lower().endswith(".json"):
+                    manifest = json.load(manifest_file)
+                    if isinstance(manifest, dict):
+                        manifest = manifest.get("clients", [])
+                else:
+                    manifest = list(csv.DictReader(manifest_file))
+        except (EnvironmentError, ValueError) as err:
+            raise enrollError("Unable to read manifest '" + manifest_path + "' (" + str(err) + ")", 3)
+
+        clients = []
+        for entry in manifest:
+            if isinstance(entry, str):
+                entry = {"name": entry}
+            clients.append({field: str(entry[field]).strip() for field in cls.manifest_fields \
+                if entry.get(field) not in (None, "")})
+        if not clients:
+            raise enrollError("Manifest '" + manifest_path + "' has no clients", 3)
+        return clients
+
+    def validate_clients(self, enrolled_names):
+        seen_names = set()
+        for client in self.clients:
+            client_name = client.get("name", "")
+            if not self.valid_name.match(client_name):
+                raise enrollError("Invalid client name '" + client_name + "' in manifest", 1)
+            if client_name in seen_names or client_name in enrolled_names:
+                raise enrollError("Client '" + client_name + "' is duplicated or already enrolled", 1)
+            if client.get("port") and not 1024 < int(client["port"]) < 65536:
+                raise enrollError("Invalid port provided '" + client["port"] + "' for " + client_name, 4)
+            seen_names.add(client_name)
+
+    # Every config is rendered once, QR codes are encoded across a process pool
+    def export_clients(self, formats=("conf",)):
+        try:
+            with profiler.span("render", "artifacts", formats=",".join(formats), clients=len(self.clients)):
+                self.artifact_writer = wgArtifactWriter(self.out_dir, formats)
+                self.artifact_writer.write([(client["name"], enrollWireguardClient.render_client_conf( \
+                    client["intf_conf"], client["peer_conf"])) for client in self.clients])
+        except ValueError as err:
+            raise enrollError("Error: " + str(err), 10)
+        except EnvironmentError as err:
+            if self.artifact_writer:
+                self.artifact_writer.remove()
+            raise enrollError("Unable to write client configurations (" + self.out_dir + "): " + str(err), 6)
+        print("Wrote " + str(len(self.clients)) + " client configuration(s) to " + self.out_dir)
+
+    # Every [Peer] block lands in one write - The conf never holds half a batch
+    def import_peer_confs(self):
+        print("Loading " + str(len(self.clients)) + " [Peer] configuration(s) into " + self.wg_path)
+        try:
+            committed = enrollWireguardClient.commit_peer_confs(self.wg_path, \
+                [(client["name"], client["server_peer_conf"]) for client in self.clients], \
+                self.wg_addr_pool, self.wg_conf_lock)
+        finally:
+            self.wg_conf_lock = None        # Released by the commit, whatever happened
+        if not committed:
+            self.remove_client_files()
+            raise enrollError("Batch was not enrolled", 8)
+        return True
+
+    # Rolls back client configs written for a batch that failed to commit
+    def remove_client_files(self):
+        if self.artifact_writer:
+            self.artifact_writer.remove()
+
+    # For batches abandoned before their commit
+    def release_conf_lock(self):
+        if self.wg_conf_lock is not None:
+            os.close(self.wg_conf_lock)
+            self.wg_conf_lock = None
+
 # Below is CLI only - Check namespace to confirm whether running standalone
 if __name__ == "__main__":
     # CLI ONLY :: Parameter handling
     WGE_ARGC = argparse.ArgumentParser(description="Enroll a new peer into Wireguard")
-    WGE_ARGC.add_argument('name', help='Uniquily identifable client name')
+    WGE_ARGC.add_argument('name', nargs='?', help='Uniquily identifable client name')
     WGE_ARGC.add_argument('--server', help='Server endpoint hostname/address')
     WGE_ARGC.add_argument('--conf', help="Wireguard conf path")
-    WGE_ARGC.add_argument('--port', default=False, required=False, help='Set client port')
+    WGE_ARGC.add_argument('--port', type=int, default=False, required=False, help='Set client port')
     WGE_ARGC.add_argument('--file', help='Export client configuration to file')
     WGE_ARGC.add_argument('--qr', help='Display as QR code', action="store_const", const=True)
+    WGE_ARGC.add_argument('--batch', help='Enroll every client in a CSV/JSON manifest')
+    WGE_ARGC.add_argument('--out-dir', default=".", \
+        help='Directory (Or .zip bundle) client artifacts are written to')
+    WGE_ARGC.add_argument('--format', dest="formats", \
+        help='Comma separated artifacts to write to --out-dir: conf, qr.txt, svg, png ' \
+        '(Default for --batch: conf, +qr.txt with --qr)')
+    WGE_ARGC.add_argument('--no-apply', dest="apply", action="store_false", \
+        help="Only update the conf, don't add peers to the running interface")
+    profiler.add_arguments(WGE_ARGC)
 
     WGE_ARGC = WGE_ARGC.parse_args()
-    WGE_OBJ = enrollWireguardClient(WGE_ARGC.name, WGE_ARGC.server, WGE_ARGC.conf, WGE_ARGC.port)
-
-    # CLI ONLY :: Client configuration output handling
-    if not WGE_ARGC.file:
-        if not WGE_ARGC.qr:
-            WGE_OBJ.export_client_stdout()          # [Default] Export to STDOUT
+    profiler.from_args(WGE_ARGC, "enrollWgClient")
+    enrollWireguardClient.wg_live_apply = WGE_ARGC.apply
+
+    if WGE_ARGC.qr and not qr_module:
+        sys.stderr.write("Error: QRcode not loaded - Cannot generate output (Run: pip3 install qrcode)\n")
+        sys.exit(10)
+
+    WGE_FORMATS = ["conf"] + (["qr.txt"] if WGE_ARGC.qr else [])
+    if WGE_ARGC.formats:
+        WGE_FORMATS = [out_format.strip() for out_format in WGE_ARGC.formats.split(",") if out_format.strip()]
+    try:
+        wgArtifactWriter.check_formats(WGE_FORMATS)
+    except ValueError as err:
+        sys.stderr.write("Error: " + str(err) + "\n")
+        sys.exit(10)
+
+    try:
+        # CLI ONLY :: Batch enrollment
+        if WGE_ARGC.batch:
+            WGB_OBJ = enrollWireguardBatch(WGE_ARGC.batch, WGE_ARGC.out_dir, WGE_ARGC.server, \
+                WGE_ARGC.conf, WGE_ARGC.port)
+            WGB_OBJ.export_clients(WGE_FORMATS)
+            WGB_OBJ.import_peer_confs()
+            sys.exit(0)
+
+        WGE_OBJ = enrollWireguardClient(WGE_ARGC.name, WGE_ARGC.server, WGE_ARGC.conf, WGE_ARGC.port)
+
+        # CLI ONLY :: Client configuration output handling
+        #   A client file is written before the server commit (And removed if it fails),
+        #   stdout & QR output only follow a successful commit
+        if WGE_ARGC.file:
+            WGE_OBJ.export_client_file(WGE_ARGC.file)   # Export to a file
+            try:
+                WGE_OBJ.import_peer_conf()
+            except enrollError:
+                os.remove(WGE_ARGC.file)
+                raise
+        elif WGE_ARGC.formats:
+            WGE_ARTIFACTS = WGE_OBJ.export_client_artifacts(WGE_ARGC.out_dir, WGE_FORMATS)
+            try:
+                WGE_OBJ.import_peer_conf()
+            except enrollError:
+                WGE_ARTIFACTS.remove()
+                raise
         else:
-            if not qr_module:
-                sys.stderr.write("Error: QRcode not loaded - Cannot generate output\n")
-                sys.exit(10)
+            WGE_OBJ.import_peer_conf()
+            if not WGE_ARGC.qr:
+                WGE_OBJ.export_client_stdout()          # [Default] Export to STDOUT
             else:
-                WGE_OBJ.export_client_qr_stdout()   # Export as QR code (On CLI)
-    else:
-        WGE_OBJ.export_client_file(WGE_ARGC.file)   # Export to a file
-    WGE_OBJ.import_peer_conf()  # TODO :: Ensure only runs if above is successful
+                WGE_OBJ.export_client_qr_stdout()       # Export as QR code (On CLI)
+    except enrollError as err:
+        sys.stderr.write(str(err) + "\n")
+        sys.exit(err.exit_code)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	manageWgPeers.py - Find, list & revoke the peers of a
+#   Wireguard server conf through its peer inventory
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Failures raised as peerError (No exits outside the CLI, see runJobs.py)
+#	    1.2 - Streaming NDJSON output, diagnostics on stderr with --json/--ndjson
+#
+#   - action: list | show | revoke | compact | sync
+#   - query: A peer name, public key or address
+#           (list: an optional name pattern, ie. 'laptop-%')
+#   - conf: Server .conf the inventory belongs to
+#   - json: Return results in JSON
+#   - ndjson: Stream results as NDJSON (One peer per line)
+#   - no-apply: Only update the conf, don't remove revoked
+#           peers from the running interface
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import subprocess
+
+from wgConf import wgConf
+from wgAddressPool import wgAddressPool
+from wgPeerInventory import wgPeerInventory
+from enrollWgClient import enrollWireguardClient, enrollError
+
+# Raised in place of exiting, so the class can be used in-process
+#   - exit_code: What the CLI exits with
+class peerError(Exception):
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+class manageWireguardPeers:
+
+    # Presets
+    output_type = "text"
+    live_apply = True
+    stream_chunk = 256                  # NDJSON peers written (& flushed) at a time
+
+    def __init__(self, action, query=False, wg_conf_path=False, output=False, live_apply=True):
+
+        valid_actions = {
+            "list": self.list_peers,
+            "show": self.show_peer,
+            "revoke": self.revoke_peer,
+            "compact": self.compact_conf,
+            "sync": self.sync_inventory
+        }
+
+        self.wg_path = wg_conf_path or enrollWireguardClient.wg_default_path   # Not an earlier enrollment's
+        if not os.path.isfile(self.wg_path):
+            raise peerError("Wireguard .conf '" + self.wg_path + "' is not readable")
+        if output:
+            self.output_type = output
+        self.live_apply = live_apply
+
+        if action not in valid_actions:
+            raise peerError("Unknown action '" + action + "'")
+        if action in ("show", "revoke") and not query:
+            raise peerError("A peer name, public key or address is required for '" + action + "'")
+
+        # Result of the action (Falsy if it failed)
+        self.inventory = None
+        try:
+            self.inventory = wgPeerInventory(self.wg_path)
+            self.result = valid_actions[action](query)
+        except sqlite3.Error as err:
+            raise peerError("Peer inventory error (" + self.wg_path + wgPeerInventory.db_suffix + "): " + \
+                str(err), 3)
+        finally:
+            if self.inventory:
+                self.inventory.close()
+
+    # Reads don't lock the conf - A stale inventory is simply rebuilt first
+    def list_peers(self, pattern=False):
+        self.inventory.sync()
+        if self.output_type == "json":
+            print(json.dumps(self.inventory.list_peers(pattern), indent=2))
+            return True
+        if self.output_type == "ndjson":
+            out_chunk = []
+            for peer in self.inventory.iter_peers(pattern):
+                out_chunk.append(json.dumps(peer, separators=(",", ":")) + "\n")
+                if len(out_chunk) >= self.stream_chunk:
+                    self.write_chunk(out_chunk)
+            self.write_chunk(out_chunk)
+            return True
+        peer_count = 0
+        for peer in self.inventory.iter_peers(pattern):
+            self.print_peer(peer)
+            peer_count += 1
+        print(str(peer_count) + " peer(s)")
+        return True
+
+    def show_peer(self, query):
+        self.inventory.sync()
+        peer = self.inventory.lookup(query)
+        if not peer:
+            sys.stderr.write("No peer matches '" + query + "'\n")
+            return False
+        if self.output_type == "json":
+            print(json.dumps(peer, indent=2))
+        elif self.output_type == "ndjson":
+            self.write_chunk([json.dumps(peer, separators=(",", ":")) + "\n"])
+        else:
+            self.print_peer(peer)
+        return True
+
+    @staticmethod
+    def write_chunk(out_chunk):
+        sys.stdout.write("".join(out_chunk))
+        sys.stdout.flush()
+        out_chunk.clear()
+
+    # Status & diagnostics - Kept off stdout while it carries JSON/NDJSON
+    def print_status(self, msg):
+        (sys.stdout if self.output_type == "text" else sys.stderr).write(msg + "\n")
+
+    def print_peer(self, peer):
+        enrolled = time.strftime("%Y-%m-%d %H:%M", time.localtime(peer["enrolled"])) if peer["enrolled"] else "-"
+        print("{:<24} {:<45} {:<17} {}".format(peer["name"] or "-", peer["pubkey"], enrolled, peer["allowed_ips"]))
+
+    # Removes the [Peer] block (And its name comment), frees its addresses for reuse
+    #   & drops it from the running interface
+    def revoke_peer(self, query):
+        conf_lock = enrollWireguardClient.lock_server_conf(self.wg_path)
+        try:
+            revoked_pubkey = self.revoke_locked(query)
+        finally:
+            os.close(conf_lock)                 # Closing releases the lock
+
+        if revoked_pubkey and self.live_apply:
+            self.remove_peers_live([revoked_pubkey])
+        return bool(revoked_pubkey)
+
+    # Returns the revoked peer's public key (Or False)
+    def revoke_locked(self, query):
+        wg_conf = enrollWireguardClient.load_server_conf(self.wg_path)
+        try:
+            return self.revoke_from(wg_conf, query)
+        finally:
+            wg_conf.close()
+
+    # The revoke itself, against the conf as loaded under the lock
+    def revoke_from(self, wg_conf, query):
+        self.inventory.sync(wg_conf)
+        peer = self.inventory.lookup(query)
+        if not peer:
+            sys.stderr.write("No peer matches '" + query + "'\n")
+            return False
+        peer_idx = wg_conf.find_peer(peer["pubkey"])
+        if peer_idx < 0:
+            sys.stderr.write("Peer " + peer["pubkey"] + " not found in " + self.wg_path + "\n")
+            return False
+
+        # The address index has to be loaded against the conf it was stamped with
+        prior_stamp = wgAddressPool.conf_stamp(self.wg_path)
+        addr_pool = wgAddressPool.load(self.wg_path, wg_conf.interface_get("Address"), wg_conf.peer_allowed_ips)
+        addr_pool.release(peer["allowed_ips"])
+
+        self.print_status("Revoking " + (peer["name"] or "unnamed peer") + " (" + peer["pubkey"] + ")")
+        try:
+            enrollWireguardClient.write_server_conf(self.wg_path, wg_conf.render_without([peer_idx]))
+        except EnvironmentError as err:
+            sys.stderr.write("Unable to update server conf file (" + self.wg_path + "): " + str(err) + "\n")
+            return False
+        self.save_indexes(addr_pool, prior_stamp, removed=[peer["pubkey"]])
+        return peer["pubkey"]
+
+    # Drops duplicate & keyless peers, evens out the spacing between blocks & rebuilds
+    #   both sidecar indexes from scratch
+    def compact_conf(self, query=False):
+        conf_lock = enrollWireguardClient.lock_server_conf(self.wg_path)
+        try:
+            return self.compact_locked()
+        finally:
+            os.close(conf_lock)
+
+    def compact_locked(self):
+        wg_conf = enrollWireguardClient.load_server_conf(self.wg_path)
+        conf_contents, dropped = wg_conf.render_compact()
+        if conf_contents != wg_conf.render():
+            try:
+                enrollWireguardClient.write_server_conf(self.wg_path, conf_contents)
+            except EnvironmentError as err:
+                sys.stderr.write("Unable to update server conf file (" + self.wg_path + "): " + str(err) + "\n")
+                return False
+            self.print_status("Compacted " + self.wg_path + " - " + str(len(dropped)) + " duplicate/invalid peer(s) dropped")
+        else:
+            self.print_status(self.wg_path + " is already compact")
+        wg_conf.close()
+
+        wg_conf = wgConf.load(self.wg_path)
+        addr_pool = wgAddressPool(wg_conf.interface_get("Address"))
+        for allowed_ips in wg_conf.peer_allowed_ips():
+            addr_pool.mark(allowed_ips)             # One peer's line at a time (ie. 'v4/32, v6/128')
+        try:
+            addr_pool.save(self.wg_path)
+        except EnvironmentError:
+            sys.stderr.write("Unable to save address index - It will be rebuilt next run\n")
+        self.inventory.rebuild(wg_conf)
+        self.inventory.vacuum()
+        wg_conf.close()
+        return True
+
+    def sync_inventory(self, query=False):
+        if self.inventory.sync():
+            self.print_status("Inventory rebuilt from " + self.wg_path)
+        else:
+            self.print_status("Inventory is up to date")
+        return True
+
+    def save_indexes(self, addr_pool, prior_stamp, added=(), removed=()):
+        try:
+            addr_pool.save(self.wg_path)
+        except EnvironmentError:
+            sys.stderr.write("Unable to save address index - It will be rebuilt next run\n")
+        self.inventory.apply_changes(prior_stamp, added, removed)
+
+    def remove_peers_live(self, pubkeys):
+        ifname = enrollWireguardClient.interface_name(self.wg_path)
+        try:
+            if subprocess.run(["wg", "show", ifname, "public-key"], capture_output=True).returncode:
+                return False
+            wg_set_cmd = ["wg", "set", ifname]
+            for pubkey in pubkeys:
+                wg_set_cmd += ["peer", pubkey, "remove"]
+            subprocess.run(wg_set_cmd, check=True, capture_output=True, text=True)
+        except FileNotFoundError:
+            return False
+        except subprocess.CalledProcessError as err:
+            sys.stderr.write("Unable to remove peer(s) from " + ifname + " (" + err.stderr.strip() + \
+                ") - Restart the interface to drop them\n")
+            return False
+        self.print_status("Removed " + str(len(pubkeys)) + " peer(s) from running interface " + ifname)
+        return True
+
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    MWP_ARGV = argparse.ArgumentParser( \
+        description="Find, list & revoke Wireguard peers")
+
+    MWP_ARGV.add_argument('action', help="Available actions: [list | show | revoke | compact | sync]")
+    MWP_ARGV.add_argument('query', nargs='?', \
+        help="Peer name, public key or address (list: a name pattern, ie. 'laptop-%%')")
+    MWP_ARGV.add_argument('--conf', help='Wireguard conf path')
+    MWP_ARGV.add_argument('--json', '-j', help='Return results in JSON', dest="ofmt", \
+        action="store_const", const="json")
+    MWP_ARGV.add_argument('--ndjson', help='Stream results as NDJSON (One peer per line)', dest="ofmt", \
+        action="store_const", const="ndjson")
+    MWP_ARGV.add_argument('--no-apply', dest="apply", action="store_false", \
+        help="Only update the conf, don't remove revoked peers from the running interface")
+
+    MWP_ARGV = MWP_ARGV.parse_args()
+    try:
+        MWP_OBJ = manageWireguardPeers(MWP_ARGV.action, MWP_ARGV.query, MWP_ARGV.conf, MWP_ARGV.ofmt, \
+            MWP_ARGV.apply)
+    except (peerError, enrollError) as err:
+        sys.stderr.write(str(err) + "\n")
+        sys.exit(err.exit_code)
+    except BrokenPipeError:
+        sys.exit(0)                 # Reader went away (ie. | head)
+    if not MWP_OBJ.result:
+        sys.exit(1)
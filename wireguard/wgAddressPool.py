@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgAddressPool.py - Peer address allocation for a
+#   Wireguard interface's subnet(s)
+#
+#   Each subnet keeps a bitmap of allocated host offsets
+#   up to its high-water mark plus a min-heap of the free
+#   runs below it, so the next free address is found in
+#   O(1) (extending the mark) or O(log n) (reusing a gap).
+#   One address is handed out per subnet, giving an IPv4
+#   + IPv6 pair on dual-stack interfaces
+#
+#   The index is persisted next to the server .conf and
+#   is only rebuilt from the peers when the .conf has been
+#   changed by something else since it was saved
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import heapq
+import base64
+import ipaddress
+
+class wgSubnetBitmap:
+    __slots__ = ("network", "hwm", "bitmap", "sparse", "gaps", "last_offset")
+
+    bitmap_limit = 1 << 20      # Offsets past this (Sparse IPv6 peers) are kept in a set instead
+
+    def __init__(self, network, hwm=0, bitmap=b"", sparse=()):
+        self.network = network
+        self.hwm = hwm                              # Highest offset handed out or marked
+        self.bitmap = bytearray(bitmap)
+        self.sparse = set(sparse)
+        self.gaps = []                              # Free (start, end) runs below hwm (min-heap)
+        self.last_offset = network.num_addresses - 1
+        if network.version == 4 and network.prefixlen < 31:
+            self.last_offset -= 1                   # Skip the broadcast address
+
+        self.set_bit(0)                             # The network address is never handed out
+
+        # Rebuild the free runs from the bitmap, skipping over fully allocated bytes
+        run_start = None
+        for byte_idx in range(min(len(self.bitmap), self.hwm // 8 + 1)):
+            byte_bits = self.bitmap[byte_idx]
+            if byte_bits == 0xff and run_start is None:
+                continue
+            for offset in range(byte_idx * 8, min(byte_idx * 8 + 8, self.hwm + 1)):
+                if not byte_bits & (1 << (offset % 8)):
+                    if run_start is None:
+                        run_start = offset
+                elif run_start is not None:
+                    self.gaps.append((run_start, offset - 1))
+                    run_start = None
+        if run_start is None and len(self.bitmap) * 8 <= self.hwm:
+            run_start = len(self.bitmap) * 8
+        if run_start is not None:
+            self.gaps.append((run_start, min(self.hwm, self.bitmap_limit - 1)))
+        heapq.heapify(self.gaps)
+
+    def test_bit(self, offset):
+        if offset >= self.bitmap_limit:
+            return offset in self.sparse
+        return offset // 8 < len(self.bitmap) and bool(self.bitmap[offset // 8] & (1 << (offset % 8)))
+
+    def set_bit(self, offset):
+        if offset >= self.bitmap_limit:
+            self.sparse.add(offset)
+            return
+        if offset // 8 >= len(self.bitmap):
+            self.bitmap.extend(bytes(offset // 8 + 1 - len(self.bitmap)))
+        self.bitmap[offset // 8] |= 1 << (offset % 8)
+
+    def clear_bit(self, offset):
+        if offset >= self.bitmap_limit:
+            self.sparse.discard(offset)
+        else:
+            self.bitmap[offset // 8] &= ~(1 << (offset % 8)) & 0xff
+
+    def mark(self, offset):
+        if offset < 0 or offset > self.last_offset:
+            return
+        if self.hwm < offset < self.bitmap_limit:
+            # Everything skipped over becomes one gap run
+            if offset > self.hwm + 1:
+                heapq.heappush(self.gaps, (self.hwm + 1, offset - 1))
+            self.hwm = offset
+        self.set_bit(offset)
+
+    def allocate(self):
+        # Lowest gap first - Offsets marked since the run was recorded are skipped
+        while self.gaps:
+            run_start, run_end = heapq.heappop(self.gaps)
+            while run_start <= run_end and self.test_bit(run_start):
+                run_start += 1
+            if run_start <= run_end:
+                if run_start < run_end:
+                    heapq.heappush(self.gaps, (run_start + 1, run_end))
+                self.set_bit(run_start)
+                return self.network.network_address + run_start
+        while self.hwm < self.last_offset:
+            self.hwm += 1
+            if not self.test_bit(self.hwm):
+                self.set_bit(self.hwm)
+                return self.network.network_address + self.hwm
+        return None
+
+    def release(self, offset):
+        if 0 < offset <= self.last_offset and self.test_bit(offset):
+            self.clear_bit(offset)
+            if offset <= self.hwm:
+                heapq.heappush(self.gaps, (offset, offset))
+
+class wgAddressPool:
+
+    # Presets
+    index_suffix = ".alloc"
+    index_version = 1
+    mark_limit = 65536          # Largest routed network (in addresses) expanded into the bitmap
+
+    def __init__(self, interface_addrs):
+        self.subnets = []
+        for intf_addr in self.split_addrs(interface_addrs):
+            intf_iface = ipaddress.ip_interface(intf_addr)
+            subnet = wgSubnetBitmap(intf_iface.network)
+            self.subnets.append(subnet)
+            self.mark(str(intf_iface.ip))          # The server's own address
+        if not self.subnets:
+            raise ValueError("Interface has no Address to allocate from")
+
+    # Loads the persisted index for 'conf_path', rebuilding it from 'peer_addrs'
+    #   (A callable returning every peer AllowedIPs value) if it is missing or stale
+    @classmethod
+    def load(cls, conf_path, interface_addrs, peer_addrs):
+        pool = cls(interface_addrs)
+        try:
+            with open(conf_path + cls.index_suffix, "r") as index_fh:
+                index = json.load(index_fh)
+            index_subnets = [subnet["network"] for subnet in index["subnets"]]
+            if index.get("version") == cls.index_version and index.get("stamp") == cls.conf_stamp(conf_path) \
+                and index_subnets == [str(subnet.network) for subnet in pool.subnets]:
+                pool.subnets = [wgSubnetBitmap(ipaddress.ip_network(subnet["network"]), subnet["hwm"], \
+                    base64.b64decode(subnet["bitmap"]), subnet.get("sparse", ())) \
+                    for subnet in index["subnets"]]
+                return pool
+        except FileNotFoundError:
+            pass
+        except (EnvironmentError, ValueError, KeyError):
+            sys.stderr.write("Address index for " + conf_path + " unreadable - Rebuilding\n")
+
+        for allowed_ips in peer_addrs():
+            pool.mark(allowed_ips)
+        return pool
+
+    def save(self, conf_path):
+        index = {"version": self.index_version, "stamp": self.conf_stamp(conf_path), \
+            "subnets": [{"network": str(subnet.network), "hwm": subnet.hwm, \
+            "bitmap": base64.b64encode(bytes(subnet.bitmap)).decode(), "sparse": sorted(subnet.sparse)} \
+            for subnet in self.subnets]}
+        tmp_path = conf_path + self.index_suffix + ".tmp"
+        with open(tmp_path, "w") as index_fh:
+            json.dump(index, index_fh, separators=(",", ":"))
+        os.replace(tmp_path, conf_path + self.index_suffix)
+
+    # Marks addresses or routed networks (ie. an AllowedIPs value) as in use
+    def mark(self, addrs):
+        for addr in self.split_addrs(addrs):
+            self.mark_network(ipaddress.ip_network(addr, strict=False))
+
+    def mark_network(self, peer_net):
+        for subnet in self.subnets:
+            if peer_net.version != subnet.network.version or not peer_net.subnet_of(subnet.network):
+                continue
+            first_offset = int(peer_net.network_address) - int(subnet.network.network_address)
+            for offset in range(first_offset, first_offset + min(peer_net.num_addresses, self.mark_limit)):
+                subnet.mark(offset)
+
+    # Returns one free host address per subnet (ie. an IPv4 + IPv6 pair)
+    def allocate(self):
+        allocated = []
+        for subnet in self.subnets:
+            host_addr = subnet.allocate()
+            if host_addr is None:
+                # Hand back anything already taken so a full subnet doesn't leak addresses
+                for taken_addr in allocated:
+                    self.release(str(taken_addr))
+                raise ValueError("Address pool " + str(subnet.network) + " is exhausted")
+            allocated.append(host_addr)
+        return [str(host_addr) + ("/32" if host_addr.version == 4 else "/128") for host_addr in allocated]
+
+    def release(self, addrs):
+        for addr in self.split_addrs(addrs):
+            peer_net = ipaddress.ip_network(addr, strict=False)
+            for subnet in self.subnets:
+                if peer_net.version == subnet.network.version and peer_net.subnet_of(subnet.network):
+                    subnet.release(int(peer_net.network_address) - int(subnet.network.network_address))
+
+    @staticmethod
+    def split_addrs(addr_list):
+        if addr_list is None:
+            return []                   # ie. No Address in [Interface] - Caught by __init__
+        if isinstance(addr_list, str):
+            addr_list = addr_list.split(",")
+        return [addr.strip() for addr in addr_list if addr.strip()]
+
+    @staticmethod
+    def conf_stamp(conf_path):
+        conf_stat = os.stat(conf_path)
+        return [conf_stat.st_mtime_ns, conf_stat.st_size]
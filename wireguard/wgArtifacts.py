@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgArtifacts.py - Renders client configurations into
+#   the files handed out to users: the .conf itself, an
+#   ASCII QR code & PNG/SVG QR images
+#
+#   Each client's config is rendered once & its QR matrix
+#   made once, with every format drawn from those. QR
+#   encoding is CPU bound, so larger runs are spread over
+#   a process pool. Artifacts land in a directory or a zip
+#   bundle (One folder per client)
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import io
+import os
+import zipfile
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+# For QR code output
+try:
+    import qrcode
+    import qrcode.image.svg
+    qr_module = True
+except ModuleNotFoundError:
+    qr_module = False
+
+artifact_formats = ("conf", "qr.txt", "svg", "png")
+
+# PNG images need Pillow, or pypng for the pure Python writer
+def png_image_factory():
+    try:
+        import PIL
+        return None                         # qrcode's default (PIL) factory
+    except ModuleNotFoundError:
+        pass
+    try:
+        import png
+        import qrcode.image.pure
+        return qrcode.image.pure.PyPNGImage
+    except ModuleNotFoundError:
+        return False
+
+# Every requested format for one client :: (name, conf contents, formats) -> (name, {format: bytes})
+#   Top-level so it can be handed to pool workers
+def render_artifacts(job):
+    client_name, client_conf_full, formats = job
+    artifacts = {}
+    if "conf" in formats:
+        artifacts["conf"] = client_conf_full.encode()
+    if not any(qr_format in formats for qr_format in ("qr.txt", "svg", "png")):
+        return client_name, artifacts
+
+    client_wg_qrcode = qrcode.QRCode()
+    client_wg_qrcode.add_data(client_conf_full)
+    client_wg_qrcode.make(fit=True)
+    if "qr.txt" in formats:
+        qr_ascii = io.StringIO()
+        client_wg_qrcode.print_ascii(out=qr_ascii)
+        artifacts["qr.txt"] = qr_ascii.getvalue().encode()
+    if "svg" in formats:
+        qr_image = io.BytesIO()
+        client_wg_qrcode.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(qr_image)
+        artifacts["svg"] = qr_image.getvalue()
+    if "png" in formats:
+        qr_image = io.BytesIO()
+        client_wg_qrcode.make_image(image_factory=png_image_factory()).save(qr_image)
+        artifacts["png"] = qr_image.getvalue()
+    return client_name, artifacts
+
+# Writes the artifacts of many clients to 'out_path' - A directory, or a bundle if it
+#   ends in .zip
+#   - formats: Any of artifact_formats
+#   - workers: Render processes (Default: one per CPU, only for QR formats)
+class wgArtifactWriter:
+
+    # Presets
+    pool_threshold = 8          # Fewer QR clients than this are rendered inline
+    pool_chunk = 16             # Clients handed to a worker at a time
+
+    def __init__(self, out_path, formats=("conf",), workers=False):
+        self.check_formats(formats)
+        self.out_path = out_path
+        self.formats = tuple(formats)
+        self.workers = workers or os.cpu_count() or 1
+        self.bundle = out_path.endswith(".zip")
+        self.written = []
+
+    # Raises ValueError for formats that are unknown or can't be produced on this system
+    @staticmethod
+    def check_formats(formats):
+        unknown_formats = [out_format for out_format in formats if out_format not in artifact_formats]
+        if unknown_formats:
+            raise ValueError("Unknown artifact format(s): " + ", ".join(unknown_formats))
+        if any(qr_format in formats for qr_format in ("qr.txt", "svg", "png")) and not qr_module:
+            raise ValueError("QRcode module not found on system (Run: pip3 install qrcode)")
+        if "png" in formats and png_image_factory() is False:
+            raise ValueError("PNG output needs Pillow or pypng (Run: pip3 install pillow)")
+
+    # clients: [(name, client conf contents)] - Returns the number of clients written
+    def write(self, clients):
+        jobs = [(client_name, client_conf_full, self.formats) for client_name, client_conf_full in clients]
+        qr_formats = any(qr_format in self.formats for qr_format in ("qr.txt", "svg", "png"))
+        if qr_formats and self.workers > 1 and len(jobs) >= self.pool_threshold:
+            with ProcessPoolExecutor(max_workers=self.workers) as render_pool:
+                self.store(render_pool.map(render_artifacts, jobs, chunksize=self.pool_chunk))
+        else:
+            self.store(map(render_artifacts, jobs))
+        return len(jobs)
+
+    def store(self, rendered):
+        if self.bundle:
+            self.store_bundle(rendered)
+            return
+        os.makedirs(self.out_path, mode=0o700, exist_ok=True)
+        for client_name, artifacts in rendered:
+            for out_format, contents in artifacts.items():
+                artifact_path = os.path.join(self.out_path, client_name + "." + out_format)
+                artifact_fd = os.open(artifact_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                self.written.append(artifact_path)
+                with os.fdopen(artifact_fd, "wb") as artifact_file:
+                    artifact_file.write(contents)
+
+    # The bundle is built beside its final path & renamed in once complete
+    def store_bundle(self, rendered):
+        bundle_dir = os.path.dirname(os.path.abspath(self.out_path))
+        os.makedirs(bundle_dir, mode=0o700, exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=bundle_dir, prefix="." + os.path.basename(self.out_path) + ".")
+        try:
+            with os.fdopen(tmp_fd, "wb") as tmp_file:
+                with zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_DEFLATED) as bundle:
+                    for client_name, artifacts in rendered:
+                        for out_format, contents in artifacts.items():
+                            # PNGs are already compressed
+                            bundle.writestr(client_name + "/" + client_name + "." + out_format, contents, \
+                                zipfile.ZIP_STORED if out_format == "png" else zipfile.ZIP_DEFLATED)
+            os.replace(tmp_path, self.out_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.written.append(self.out_path)
+
+    # Rolls back everything written by this writer
+    def remove(self):
+        for artifact_path in self.written:
+            try:
+                os.remove(artifact_path)
+            except FileNotFoundError:
+                pass
+        self.written = []
+
+# The ASCII QR code of a single configuration
+def render_qr_ascii(client_conf_full):
+    return render_artifacts(("", client_conf_full, ("qr.txt",)))[1]["qr.txt"].decode()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgConf.py - A single-pass reader for Wireguard .conf
+#   files that keeps the file exactly as written
+#
+#   The raw bytes are kept (memory-mapped for large files)
+#   and only the section boundaries are indexed, as parallel
+#   arrays of offsets. Peers are read on demand through
+#   small __slots__ views, and lookups across every peer
+#   (names, keys, addresses) are regex scans over the
+#   buffer. Comments, ordering & spacing round-trip byte
+#   for byte
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Peer lookup by public key, compaction
+#	    1.2 - Header kinds from the match itself, line checks only for indented headers
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import re
+import mmap
+import bisect
+from array import array
+
+# A view of one [Peer] block within a wgConf buffer
+#   - start: First byte of the block (Including the comments directly above it)
+#   - header: First byte of the [Peer] line
+#   - end: First byte after the block
+class wgConfPeer:
+    __slots__ = ("conf", "start", "header", "end")
+
+    def __init__(self, conf, start, header, end):
+        self.conf = conf
+        self.start = start
+        self.header = header
+        self.end = end
+
+    # From the '# name :: Auto-generated peer' comment above the block (Or None)
+    @property
+    def name(self):
+        marker = self.conf.marker_re.search(self.conf.buffer, self.start, self.header)
+        return marker.group(1).decode() if marker else None
+
+    def get(self, key, fallback=None):
+        return self.conf.section_options(self.header, self.end).get(key.lower(), fallback)
+
+    def text(self):
+        return bytes(self.conf.buffer[self.start:self.end]).decode()
+
+class wgConf:
+
+    # Presets
+    mmap_threshold = 1 << 20        # Files at least this size are memory-mapped rather than read
+    list_keys = ("address", "dns", "allowedips")    # Repeated lines of these are joined, not replaced
+
+    # A bracket anywhere - Only those opening a line are section headers. The kind comes
+    #   from which group matched (lastindex: 1 [Interface], 2 [Peer], None anything else)
+    section_re = re.compile(rb"\[(?:(interface)|(peer)|[a-z]+)\]", re.I)
+    option_re = re.compile(rb"^[ \t]*([A-Za-z]+)[ \t]*=[ \t]*([^#\r\n]*[^#\s])?", re.M)
+    marker_re = re.compile(rb"^# ([^\n]*?) :: Auto-generated peer[ \t]*\r?$", re.M)
+    marker_scan_re = re.compile(rb"\n# ([^\n]*?) :: Auto-generated peer(?=[ \t]*\r?(?:\n|$))")
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.section_offsets = array("q")           # Start of each section header line
+        self.section_kinds = bytearray()            # 1: [Interface], 2: [Peer], 0: Anything else
+        self.peer_sections = array("q")             # Peer number -> section number
+        self.interface = {}
+        self.parse()
+
+    @classmethod
+    def load(cls, conf_path):
+        with open(conf_path, "rb") as conf_file:
+            if os.fstat(conf_file.fileno()).st_size >= cls.mmap_threshold:
+                return cls(mmap.mmap(conf_file.fileno(), 0, access=mmap.ACCESS_READ))
+            return cls(conf_file.read())
+
+    # One pass indexing the section headers - Only [Interface] options are read up front,
+    #   everything per peer is resolved when asked for
+    def parse(self):
+        buffer = self.buffer
+        section_offsets, section_kinds = [], self.section_kinds
+        for header_match in self.section_re.finditer(buffer):
+            header_pos = header_match.start()
+            # The byte before settles nearly every header - Only indented (Or embedded)
+            #   brackets need their line checked
+            if header_pos and buffer[header_pos - 1] != 10:
+                line_start = buffer.rfind(b"\n", 0, header_pos) + 1
+                if buffer[line_start:header_pos].strip():
+                    continue                        # Inside a value or comment
+                header_pos = line_start
+            section_offsets.append(header_pos)
+            section_kinds.append(header_match.lastindex or 0)
+        self.section_offsets = array("q", section_offsets)
+        self.peer_sections = array("q", [section_idx for section_idx, section_kind \
+            in enumerate(section_kinds) if section_kind == 2])
+
+        if 1 in self.section_kinds:
+            section_idx = self.section_kinds.index(1)
+            self.interface = self.section_options(self.section_offsets[section_idx], \
+                self.section_end(section_idx))
+
+    def section_end(self, section_idx):
+        if section_idx + 1 < len(self.section_offsets):
+            return self.block_start(section_idx + 1)
+        return len(self.buffer)
+
+    # Comment lines directly above a header travel with its section
+    def block_start(self, section_idx):
+        block_start = self.section_offsets[section_idx]
+        while block_start:
+            line_start = self.buffer.rfind(b"\n", 0, block_start - 1) + 1
+            if not self.buffer[line_start:block_start].lstrip().startswith(b"#"):
+                break
+            block_start = line_start
+        return block_start
+
+    def section_options(self, section_start, section_end):
+        options = {}
+        for option_match in self.option_re.finditer(self.buffer, section_start, section_end):
+            key, value = option_match.group(1).decode().lower(), (option_match.group(2) or b"").decode()
+            if key in options and key in self.list_keys:
+                options[key] += ", " + value
+            else:
+                options[key] = value
+        return options
+
+    def interface_get(self, key, fallback=None):
+        return self.interface.get(key.lower(), fallback)
+
+    def __len__(self):
+        return len(self.peer_sections)
+
+    def peer(self, peer_idx):
+        section_idx = self.peer_sections[peer_idx]
+        return wgConfPeer(self, self.block_start(section_idx), self.section_offsets[section_idx], \
+            self.section_end(section_idx))
+
+    def peers(self):
+        for peer_idx in range(len(self.peer_sections)):
+            yield self.peer(peer_idx)
+
+    # Bulk lookups are a single scan over the [Peer] region of the buffer
+    def peer_option_values(self, key):
+        if not self.peer_sections:
+            return []
+        key_re = re.compile(rb"\n[ \t]*" + re.escape(key.encode()) + rb"[ \t]*=[ \t]*([^#\r\n]*[^#\s])", re.I)
+        region_end = self.section_end(self.peer_sections[-1])
+        return [value.decode() for value in key_re.findall(self.buffer, \
+            self.section_offsets[self.peer_sections[0]], region_end)]
+
+    # The peer (number) holding 'pubkey' - A buffer search & a bisect, no per-peer parsing
+    def find_peer(self, pubkey):
+        key_re = re.compile(rb"\n[ \t]*PublicKey[ \t]*=[ \t]*" + re.escape(pubkey.encode()) + rb"[ \t]*(?:#|\r?\n|$)", re.I)
+        for key_match in key_re.finditer(self.buffer):
+            section_idx = bisect.bisect_right(self.section_offsets, key_match.start()) - 1
+            if section_idx >= 0 and self.section_kinds[section_idx] == 2:
+                return bisect.bisect_left(self.peer_sections, section_idx)
+        return -1
+
+    def peer_allowed_ips(self):
+        return self.peer_option_values("AllowedIPs")
+
+    def peer_pubkeys(self):
+        return self.peer_option_values("PublicKey")
+
+    # Scans for a newline rather than '^' (Much faster), so the first line is checked apart
+    def enrolled_names(self):
+        peer_names = set(name.decode() for name in self.marker_scan_re.findall(self.buffer))
+        first_marker = self.marker_re.match(self.buffer)
+        if first_marker:
+            peer_names.add(first_marker.group(1).decode())
+        return peer_names
+
+    # The original bytes, with 'extra' blocks appended after a blank line
+    def render(self, extra=b""):
+        contents = bytes(self.buffer)
+        if extra and contents:
+            if not contents.endswith(b"\n"):
+                contents += b"\n"
+            if not contents.endswith(b"\n\n"):
+                contents += b"\n"
+        return contents + extra
+
+    # The original bytes with the given peer blocks (And their comments) cut out
+    def render_without(self, peer_idxs):
+        contents, last_end = [], 0
+        for peer_idx in sorted(set(peer_idxs)):
+            peer = self.peer(peer_idx)
+            contents.append(self.buffer[last_end:peer.start])
+            last_end = peer.end
+        contents.append(self.buffer[last_end:])
+        return b"".join(contents)
+
+    # Rewritten peer section :: Duplicate public keys (The last one wins, as with `wg`)
+    #   & peers without one are dropped, blocks are separated by a single blank line
+    #   Returns the contents & the public keys of the dropped peers
+    def render_compact(self):
+        if not self.peer_sections:
+            return bytes(self.buffer), []
+        dropped_sections, seen_pubkeys, dropped = set(), set(), []
+        for peer_idx in reversed(range(len(self.peer_sections))):
+            pubkey = self.peer(peer_idx).get("PublicKey")
+            if not pubkey or pubkey in seen_pubkeys:
+                dropped_sections.add(self.peer_sections[peer_idx])
+                dropped.append(pubkey)
+            seen_pubkeys.add(pubkey)
+
+        first_start = self.block_start(self.peer_sections[0])
+        contents = [bytes(self.buffer[:first_start]).rstrip(b"\n") + b"\n\n" if first_start else b""]
+        for section_idx in range(self.peer_sections[0], len(self.section_offsets)):
+            if section_idx not in dropped_sections:
+                contents.append(bytes(self.buffer[self.block_start(section_idx):self.section_end(section_idx)]) \
+                    .strip(b"\n") + b"\n\n")
+        return b"".join(contents), dropped
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgEndpoint.py - Works out the public address clients
+#   should connect to when no --server is given
+#
+#   Sources are tried cheapest first:
+#       1. A configured hostname (NIXKIT_WG_ENDPOINT, or
+#          '<conf>.endpoint' beside the server conf)
+#       2. A globally routable address on a local interface
+#       3. The last answer cached on disk (Within its TTL)
+#       4. External lookup services, raced in parallel with
+#          the first valid answer winning
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - A lookup failing at the HTTP level counts as no answer straight away
+#
+#   Environment:
+#       NIXKIT_WG_ENDPOINT: Hostname/address to always use
+#       NIXKIT_WAN_SERVICES: Comma separated lookup URLs
+#           (ie. a local stand-in for tests)
+#
+#   Stand-in: wgEndpoint.py --standin 203.0.113.7 --port 8099
+#       then NIXKIT_WAN_SERVICES=http://127.0.0.1:8099/
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import ipaddress
+import http.client
+import urllib.request
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+class wgEndpointDiscovery:
+
+    # Presets
+    cache_path = "~/.cache/nixkit/wan-endpoint.json"
+    cache_ttl = 3600                    # Seconds a looked up address is trusted for
+    lookup_timeout = 3.0
+    endpoint_suffix = ".endpoint"
+    lookup_services = (
+        "https://api.my-ip.io/ip",
+        "https://api.ipify.org",
+        "https://ifconfig.me/ip",
+        "https://icanhazip.com",
+    )
+
+    # Destinations used only to pick a source address - Nothing is sent to them
+    route_probes = (("8.8.8.8", socket.AF_INET), ("2001:4860:4860::8888", socket.AF_INET6))
+
+    def __init__(self, conf_path=False, cache_path=False, cache_ttl=False, lookup_services=False):
+        self.conf_path = conf_path
+        self.cache_path = os.path.expanduser(cache_path or self.cache_path)
+        if cache_ttl is not False:
+            self.cache_ttl = cache_ttl
+        if not lookup_services and os.environ.get("NIXKIT_WAN_SERVICES"):
+            lookup_services = [service.strip() for service in os.environ["NIXKIT_WAN_SERVICES"].split(",") \
+                if service.strip()]
+        if lookup_services:
+            self.lookup_services = tuple(lookup_services)
+        self.source = ""
+
+    # Returns the endpoint host (Or "" when nothing could be found)
+    def discover(self, refresh=False):
+        for source, lookup in (("configured", self.configured_endpoint), ("interface", self.interface_address), \
+            ("cache", lambda: "" if refresh else self.cached_address())):
+            endpoint = lookup()
+            if endpoint:
+                self.source = source
+                return endpoint
+
+        endpoint = self.race_lookups()
+        if endpoint:
+            self.source = "lookup"
+            self.store_cache(endpoint)
+        return endpoint
+
+    def configured_endpoint(self):
+        if os.environ.get("NIXKIT_WG_ENDPOINT"):
+            return os.environ["NIXKIT_WG_ENDPOINT"].strip()
+        if self.conf_path:
+            try:
+                with open(self.conf_path + self.endpoint_suffix, "r") as endpoint_file:
+                    return endpoint_file.read().strip()
+            except FileNotFoundError:
+                pass
+        return ""
+
+    # The source address the host routes out of - Only useful if it's public (ie. not NAT'd)
+    def interface_address(self):
+        for probe_addr, probe_family in self.route_probes:
+            try:
+                with socket.socket(probe_family, socket.SOCK_DGRAM) as probe_sock:
+                    probe_sock.connect((probe_addr, 53))
+                    local_addr = probe_sock.getsockname()[0]
+            except OSError:
+                continue
+            if self.valid_address(local_addr, global_only=True):
+                return local_addr
+        return ""
+
+    def cached_address(self):
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                cached = json.load(cache_file)
+            if time.time() - cached["time"] < self.cache_ttl and self.valid_address(cached["address"]):
+                return cached["address"]
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+        return ""
+
+    def store_cache(self, address):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"address": address, "time": time.time()}, cache_file)
+            os.replace(tmp_path, self.cache_path)
+        except EnvironmentError:
+            pass                        # Only a cache - Looked up again next run
+
+    # Every service is asked at once, the first valid answer is used - Lookups are
+    #   daemon threads so the slower services are never waited on
+    def race_lookups(self):
+        answers = queue.Queue()
+        for service in self.lookup_services:
+            threading.Thread(target=lambda service_url: answers.put(self.query_service(service_url)), \
+                args=(service,), daemon=True).start()
+        deadline = time.monotonic() + self.lookup_timeout + 1
+        for lookup in self.lookup_services:
+            try:
+                endpoint = answers.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if endpoint:
+                return endpoint
+        return ""
+
+    # Any failure is an empty answer, so the race moves on rather than waiting out the deadline
+    #   (ie. RemoteDisconnected & BadStatusLine are HTTPExceptions, not OSErrors)
+    def query_service(self, service_url):
+        try:
+            with urllib.request.urlopen(service_url, timeout=self.lookup_timeout) as lookup_resp:
+                answer = lookup_resp.read(64).decode().strip()
+        except (OSError, http.client.HTTPException, ValueError):
+            return ""
+        return answer if self.valid_address(answer) else ""
+
+    # Lookup answers are taken as given, local addresses have to be public to be of use
+    @staticmethod
+    def valid_address(address, global_only=False):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return address.is_global if global_only else not address.is_unspecified
+
+    # host:port - IPv6 addresses are bracketed
+    @staticmethod
+    def format_endpoint(host, port):
+        if ":" in host and not host.startswith("["):
+            host = "[" + host + "]"
+        return host + ":" + str(port)
+
+# A fixed-answer lookup service for tests
+def serve_standin(address, port=8099, bind="127.0.0.1"):
+    class standinHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.end_headers()
+            self.wfile.write((address + "\n").encode())
+
+        def log_message(self, *args):
+            pass
+
+    print("Answering lookups with " + address + " on http://" + bind + ":" + str(port) + "/")
+    HTTPServer((bind, port), standinHandler).serve_forever()
+
+if __name__ == "__main__":
+    # CLI ONLY :: Parameter handling
+    WEP_ARGV = argparse.ArgumentParser(description="Discover the Wireguard server's public endpoint")
+    WEP_ARGV.add_argument('--conf', help="Wireguard conf path (For a '<conf>.endpoint' override)")
+    WEP_ARGV.add_argument('--refresh', action="store_true", help="Ignore the cached answer")
+    WEP_ARGV.add_argument('--standin', metavar="ADDRESS", help="Serve a stand-in lookup service answering ADDRESS")
+    WEP_ARGV.add_argument('--port', type=int, default=8099, help="Stand-in port")
+
+    WEP_ARGV = WEP_ARGV.parse_args()
+    if WEP_ARGV.standin:
+        try:
+            serve_standin(WEP_ARGV.standin, WEP_ARGV.port)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+    WEP_OBJ = wgEndpointDiscovery(WEP_ARGV.conf)
+    WEP_ENDPOINT = WEP_OBJ.discover(WEP_ARGV.refresh)
+    if not WEP_ENDPOINT:
+        sys.stderr.write("Unable to discover a public endpoint\n")
+        sys.exit(1)
+    print(WEP_ENDPOINT + " (" + WEP_OBJ.source + ")")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgKeys.py - Wireguard (Curve25519) key generation &
+#   derivation without forking `wg` for every key
+#
+#   Keys are made in-process through the 'cryptography'
+#   package, falling back to `wg genkey`/`wg pubkey` when
+#   it isn't installed. wgKeyPool keeps a queue of
+#   keypairs topped up by background workers for bulk
+#   enrollments
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import queue
+import base64
+import hashlib
+import threading
+import subprocess
+
+# In-process Curve25519 - Falls back to the wg binary without it
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives import serialization
+    crypto_module = True
+except ModuleNotFoundError:
+    crypto_module = False
+
+class wgKeys:
+
+    # Presets
+    pubkey_cache_suffix = ".pubkey"
+
+    # Interface public keys already resolved this run :: {private key digest: public key}
+    interface_pubkeys = {}
+
+    @staticmethod
+    def generate_privkey():
+        if not crypto_module:
+            privkey = subprocess.run(["wg", "genkey"], check=True, capture_output=True, text=True)
+            return privkey.stdout.strip()
+
+        # Clamped the same way `wg genkey` does
+        key_bytes = bytearray(os.urandom(32))
+        key_bytes[0] &= 248
+        key_bytes[31] = (key_bytes[31] & 127) | 64
+        return base64.b64encode(bytes(key_bytes)).decode()
+
+    @staticmethod
+    def derive_pubkey(privkey):
+        if not crypto_module:
+            pubkey = subprocess.run(["wg", "pubkey"], input=privkey, check=True, capture_output=True, text=True)
+            return pubkey.stdout.strip()
+
+        key_bytes = base64.b64decode(privkey.strip())
+        if len(key_bytes) != 32:
+            raise ValueError("Wireguard private keys are 32 bytes")
+        pubkey = X25519PrivateKey.from_private_bytes(key_bytes).public_key()
+        return base64.b64encode(pubkey.public_bytes(encoding=serialization.Encoding.Raw, \
+            format=serialization.PublicFormat.Raw)).decode()
+
+    @classmethod
+    def generate_keypair(cls):
+        privkey = cls.generate_privkey()
+        return privkey, cls.derive_pubkey(privkey)
+
+    # The interface public key never changes while its private key doesn't, so
+    #   it's resolved once per run & cached on disk (keyed on the private key)
+    #   - privkey: The [Interface] PrivateKey from the server conf (if known)
+    #   - conf_path: Server conf the disk cache sits next to
+    #   - ifname: Interface to ask `wg show` as a last resort
+    @classmethod
+    def interface_pubkey(cls, privkey=False, conf_path=False, ifname="wg0"):
+        cache_key = hashlib.sha256(privkey.strip().encode()).hexdigest()[:16] if privkey else ifname
+        if cache_key in cls.interface_pubkeys:
+            return cls.interface_pubkeys[cache_key]
+
+        cache_path = conf_path + cls.pubkey_cache_suffix if conf_path else False
+        pubkey = cls.read_pubkey_cache(cache_path, cache_key)
+        if not pubkey:
+            try:
+                if privkey:
+                    pubkey = cls.derive_pubkey(privkey)
+                else:
+                    pubkey = subprocess.run(["wg", "show", ifname, "public-key"], check=True, \
+                        capture_output=True, text=True).stdout.strip()
+            except (OSError, subprocess.CalledProcessError) as err:
+                sys.stderr.write("Unable to resolve the interface public key (" + str(err) + ")\n")
+                return ""
+            cls.write_pubkey_cache(cache_path, cache_key, pubkey)
+
+        cls.interface_pubkeys[cache_key] = pubkey
+        return pubkey
+
+    @staticmethod
+    def read_pubkey_cache(cache_path, cache_key):
+        if not cache_path:
+            return ""
+        try:
+            with open(cache_path, "r") as cache_file:
+                cached_key, pubkey = cache_file.read().split()
+            return pubkey if cached_key == cache_key else ""
+        except (EnvironmentError, ValueError):
+            return ""
+
+    @staticmethod
+    def write_pubkey_cache(cache_path, cache_key, pubkey):
+        if not cache_path or not pubkey:
+            return
+        try:
+            with open(cache_path, "w") as cache_file:
+                cache_file.write(cache_key + " " + pubkey + "\n")
+        except EnvironmentError:
+            pass                    # Only a cache - Resolved again next run
+
+# A queue of pre-generated keypairs kept topped up by background workers
+#   - size: Keypairs to keep ready
+#   - workers: Threads generating keys (Only useful when forking `wg`)
+class wgKeyPool:
+
+    def __init__(self, size=32, workers=False):
+        if not workers:
+            workers = 1 if crypto_module else min(8, os.cpu_count() or 1)
+        self.keypairs = queue.Queue(maxsize=size)
+        self.stopping = threading.Event()
+        self.workers = [threading.Thread(target=self.fill, daemon=True) for worker in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def fill(self):
+        while not self.stopping.is_set():
+            try:
+                keypair = wgKeys.generate_keypair()
+            except (OSError, subprocess.CalledProcessError) as err:
+                sys.stderr.write("Key pool worker stopped (" + str(err) + ")\n")
+                return
+            while not self.stopping.is_set():
+                try:
+                    self.keypairs.put(keypair, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    # Waits on the workers while any are running, otherwise generates inline
+    def get(self):
+        while any(worker.is_alive() for worker in self.workers):
+            try:
+                return self.keypairs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        try:
+            return self.keypairs.get_nowait()
+        except queue.Empty:
+            return wgKeys.generate_keypair()
+
+    def close(self):
+        self.stopping.set()
+        for worker in self.workers:
+            worker.join()
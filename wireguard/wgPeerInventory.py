@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# ------------------------------------------------------
+#
+#	wgPeerInventory.py - An indexed inventory of the peers
+#   in a Wireguard server conf
+#
+#   Kept as an SQLite database next to the conf (ie.
+#   wg0.conf.peers.db) mapping names, public keys & each
+#   AllowedIPs network to its peer. Like the address index
+#   it is stamped against the conf & rebuilt from it when
+#   the conf was changed by something else
+#
+#	            Written: James Varoutsos
+#	    Date: 19-Oct-2026        Version: 1.0
+#
+#	    1.0 - Initial
+#	    1.1 - Peers iterated straight off the cursor
+#	    1.2 - Read-only opening, for readers that don't hold the conf lock
+#
+# ------------------------------------------------------
+
+# Standard libraries
+import os
+import sys
+import json
+import time
+import sqlite3
+import ipaddress
+
+from urllib.parse import quote
+from wgConf import wgConf
+from wgAddressPool import wgAddressPool
+
+class wgPeerInventory:
+
+    # Presets
+    db_suffix = ".peers.db"
+    schema_version = 1
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS peers (pubkey TEXT PRIMARY KEY, name TEXT, " \
+            "allowed_ips TEXT NOT NULL, enrolled INTEGER)",
+        "CREATE INDEX IF NOT EXISTS peers_name ON peers (name)",
+        "CREATE TABLE IF NOT EXISTS addrs (network TEXT PRIMARY KEY, pubkey TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS addrs_pubkey ON addrs (pubkey)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    # read_only: Queries only - Nothing is created, synced or written (The database
+    #   must already exist)
+    def __init__(self, conf_path, read_only=False):
+        self.conf_path = conf_path
+        if read_only:
+            self.db = sqlite3.connect("file:" + quote(conf_path + self.db_suffix) + "?mode=ro", uri=True)
+            self.db.row_factory = sqlite3.Row
+            return
+        self.db = sqlite3.connect(conf_path + self.db_suffix)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            for statement in self.schema:
+                self.db.execute(statement)
+        try:
+            os.chmod(conf_path + self.db_suffix, 0o600)     # Holds the same keys as the conf
+        except OSError:
+            pass
+
+    def close(self):
+        self.db.close()
+
+    def stored_stamp(self):
+        stamp_row = self.db.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+        return json.loads(stamp_row[0]) if stamp_row else None
+
+    def store_stamp(self):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stamp', ?), ('version', ?)", \
+            (json.dumps([self.schema_version] + wgAddressPool.conf_stamp(self.conf_path)), self.schema_version))
+
+    # Whether the inventory was last stamped against the conf as it is now
+    def is_current(self):
+        return self.stored_stamp() == [self.schema_version] + wgAddressPool.conf_stamp(self.conf_path)
+
+    # Rebuilds from the conf when it has changed since the inventory was last stamped
+    #   Returns True if a rebuild was needed
+    def sync(self, wg_conf=None):
+        if self.is_current():
+            return False
+        self.rebuild(wg_conf)
+        return True
+
+    def rebuild(self, wg_conf=None):
+        close_conf = wg_conf is None
+        if close_conf:
+            wg_conf = wgConf.load(self.conf_path)
+        enrolled = dict(self.db.execute("SELECT pubkey, enrolled FROM peers").fetchall())
+        peers = []
+        for peer in wg_conf.peers():
+            peer_options = wg_conf.section_options(peer.header, peer.end)
+            if peer_options.get("publickey"):
+                peers.append((peer.name, peer_options["publickey"], peer_options.get("allowedips", ""), \
+                    enrolled.get(peer_options["publickey"])))
+        if close_conf:
+            wg_conf.close()
+
+        with self.db:
+            self.db.execute("DELETE FROM peers")
+            self.db.execute("DELETE FROM addrs")
+            self.insert_peers(peers)
+            self.store_stamp()
+
+    # Records peers just appended to / removed from the conf - 'prior_stamp' is the
+    #   conf stamp from before the change, so a conf edited elsewhere in the meantime
+    #   is picked up by a full rebuild instead
+    def apply_changes(self, prior_stamp, added=(), removed=()):
+        if self.stored_stamp() != [self.schema_version] + prior_stamp:
+            self.rebuild()
+            return
+        with self.db:
+            for pubkey in removed:
+                self.db.execute("DELETE FROM peers WHERE pubkey = ?", (pubkey,))
+                self.db.execute("DELETE FROM addrs WHERE pubkey = ?", (pubkey,))
+            self.insert_peers([(name, pubkey, allowed_ips, int(time.time())) \
+                for name, pubkey, allowed_ips in added])
+            self.store_stamp()
+
+    def insert_peers(self, peers):
+        self.db.executemany("INSERT OR REPLACE INTO peers (name, pubkey, allowed_ips, enrolled) " \
+            "VALUES (?, ?, ?, ?)", peers)
+        self.db.executemany("INSERT OR REPLACE INTO addrs (network, pubkey) VALUES (?, ?)", \
+            [(network, pubkey) for name, pubkey, allowed_ips, enrolled in peers \
+            for network in self.split_networks(allowed_ips)])
+
+    # A name, public key or address (ie. 10.8.0.57) - Addresses inside a routed
+    #   network fall back to a containment scan
+    def lookup(self, query):
+        peer_row = self.db.execute("SELECT * FROM peers WHERE pubkey = ?", (query,)).fetchone() \
+            or self.db.execute("SELECT * FROM peers WHERE name = ?", (query,)).fetchone()
+        if peer_row:
+            return dict(peer_row)
+
+        try:
+            query_net = ipaddress.ip_network(query, strict=False)
+        except ValueError:
+            return None
+        peer_row = self.db.execute("SELECT peers.* FROM addrs JOIN peers USING (pubkey) " \
+            "WHERE addrs.network = ?", (str(query_net),)).fetchone()
+        if peer_row:
+            return dict(peer_row)
+        for network, pubkey in self.db.execute("SELECT network, pubkey FROM addrs"):
+            peer_net = ipaddress.ip_network(network)
+            if peer_net.version == query_net.version and query_net.subnet_of(peer_net):
+                return dict(self.db.execute("SELECT * FROM peers WHERE pubkey = ?", (pubkey,)).fetchone())
+        return None
+
+    # Every peer (Or those whose name matches a SQL LIKE pattern) in enrollment order
+    def list_peers(self, pattern=False):
+        return list(self.iter_peers(pattern))
+
+    # Rows are read off the cursor as they're used - Nothing is held for the whole table
+    def iter_peers(self, pattern=False):
+        if pattern:
+            peer_rows = self.db.execute("SELECT * FROM peers WHERE name LIKE ? ORDER BY rowid", (pattern,))
+        else:
+            peer_rows = self.db.execute("SELECT * FROM peers ORDER BY rowid")
+        for peer_row in peer_rows:
+            yield dict(peer_row)
+
+    def vacuum(self):
+        self.db.execute("VACUUM")
+
+    @staticmethod
+    def split_networks(allowed_ips):
+        networks = []
+        for addr in wgAddressPool.split_addrs(allowed_ips):
+            try:
+                networks.append(str(ipaddress.ip_network(addr, strict=False)))
+            except ValueError:
+                sys.stderr.write("Skipping unparsable AllowedIPs entry '" + addr + "'\n")
+        return networks